@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'shp',
     'tiff',
     'note',
@@ -87,7 +88,10 @@ DATABASES = {
         'USER': 'postgres',
         'PASSWORD': '123456',
         'HOST': 'localhost',
-        'PORT': '5432'
+        'PORT': '5432',
+        # Keep Django's connection open between requests instead of reconnecting each time
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -134,3 +138,91 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR,'geoApp/static')]
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Claimants of the data/villages JSON corpus kept parsed in each process (shp.village_cache);
+# files past the bound are parsed on every read and the scheme frame is not kept
+VILLAGE_CORPUS_CACHE_MAX_CLAIMANTS = 200000
+
+# Worker processes of each web process's pool for shapefile ingestion and raster optimization
+INGEST_MAX_WORKERS = 2
+
+# Ingest jobs running at once across all web processes. A running job records a heartbeat
+# every INGEST_HEARTBEAT_INTERVAL seconds, one without a heartbeat for INGEST_JOB_STALE_AFTER
+# seconds was lost with its worker and is marked failed
+INGEST_MAX_CONCURRENT = 2
+INGEST_HEARTBEAT_INTERVAL = 30
+INGEST_JOB_STALE_AFTER = 300
+
+# Features per COPY batch when loading uploaded layers into PostGIS
+INGEST_BATCH_SIZE = 10000
+
+# Browser cache lifetime (seconds) of the /tiles/ vector tiles, re-uploads change layers in place
+VECTOR_TILE_MAX_AGE = 300
+
+# GeoServer WMS that the /wms/ tile proxy renders cache misses with
+GEOSERVER_WMS_URL = 'http://127.0.0.1:8080/geoserver/wms'
+GEOSERVER_TIMEOUT = 30
+
+# GeoServer REST credentials and keep-alive connections per process (shp.connections)
+GEOSERVER_URL = 'http://127.0.0.1:8080/geoserver'
+GEOSERVER_USER = 'admin'
+GEOSERVER_PASSWORD = 'geoserver'
+GEOSERVER_POOL_SIZE = 4
+
+# SQLAlchemy pool used for COPY/DDL during ingestion, per process
+DB_POOL_SIZE = 5
+DB_POOL_MAX_OVERFLOW = 5
+DB_POOL_RECYCLE = 1800
+
+# Disk cache of rendered WMS tiles, least recently used tiles are evicted past the size limit
+TILE_CACHE_DIR = os.path.join(BASE_DIR, 'tile_cache')
+TILE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Browser cache lifetime (seconds) of tiles served by /wms/
+WMS_TILE_MAX_AGE = 300
+
+# Rasters with more pixels are summarized from their COG overviews when computing statistics
+RASTER_STATS_MAX_PIXELS = 50_000_000
+
+# Per-parcel zonal statistics (shp.zonal_store): worker processes of manage.py compute_zonal_stats
+# and of the refreshes after an ingest or raster publish, and the classes of the forest cover
+# rasters that count as forest
+ZONAL_MAX_WORKERS = 4
+ZONAL_FOREST_VALUES = [1]
+
+# State that the district/taluka/village Location hierarchy of the claimant data sits under
+DEFAULT_STATE = 'Maharashtra'
+
+# Versioned claimant API responses and their data versions (shp.api_cache). The cache is
+# shared by the web workers and management commands, so a populate_claimants run invalidates
+# what the web processes serve; use Redis or Memcached here when running on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'api_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+API_CACHE_ALIAS = 'api'
+API_CACHE_TIMEOUT = 24 * 3600
+# Larger responses are served but not cached
+API_CACHE_MAX_BODY = 16 * 1024 * 1024
+
+# Largest ?limit= page of /api/claimants/
+CLAIMANTS_MAX_PAGE_SIZE = 5000
+
+# /api/claimants/search/: results per query (default and largest), minimum pg_trgm word
+# similarity of a name match and the statement timeout of one search
+CLAIMANT_SEARCH_RESULTS = 20
+CLAIMANT_SEARCH_MAX_RESULTS = 100
+CLAIMANT_SEARCH_THRESHOLD = 0.4
+CLAIMANT_SEARCH_TIMEOUT_MS = 500
+
+# POST /api/claimants/codes/: codes per request and claimants returned in total
+CLAIMANT_CODE_LOOKUP_MAX_CODES = 5000
+CLAIMANT_CODE_LOOKUP_MAX_RESULTS = 10000
+
+# Highlight sets neither created nor drawn for this many seconds are deleted
+HIGHLIGHT_SET_TTL = 30 * 24 * 3600
@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from shp.views import index, get_claimants_data, get_available_villages, analytics, pm_kisan_details, mgnrega_details, pm_jai_jeevan_details, pm_ayushman_details, pm_kaushal_details, digital_india_details, startup_india_details
+from shp.views import index, get_claimants_data, get_available_villages, analytics, pm_kisan_details, mgnrega_details, pm_jai_jeevan_details, pm_ayushman_details, pm_kaushal_details, digital_india_details, startup_india_details, get_scheme_statistics, get_ingest_jobs, get_ingest_job, get_layer_tile, wms_proxy, create_highlight, get_connection_stats, get_parcel_statistics, get_locations, search_claimants, lookup_claimant_codes
 from note.views import note
 
 urlpatterns = [
@@ -32,5 +32,16 @@ urlpatterns = [
     path('digital-india-details/', digital_india_details, name='digital_india_details'),
     path('startup-india-details/', startup_india_details, name='startup_india_details'),
     path('api/claimants/', get_claimants_data, name='get_claimants_data'),
-    path('api/villages/', get_available_villages, name='get_available_villages')
+    path('api/claimants/search/', search_claimants, name='search_claimants'),
+    path('api/claimants/codes/', lookup_claimant_codes, name='lookup_claimant_codes'),
+    path('api/villages/', get_available_villages, name='get_available_villages'),
+    path('api/locations/', get_locations, name='get_locations'),
+    path('api/schemes/<str:scheme>/', get_scheme_statistics, name='get_scheme_statistics'),
+    path('api/parcel-statistics/', get_parcel_statistics, name='get_parcel_statistics'),
+    path('api/ingest-jobs/', get_ingest_jobs, name='get_ingest_jobs'),
+    path('api/ingest-jobs/<int:job_id>/', get_ingest_job, name='get_ingest_job'),
+    path('api/highlights/', create_highlight, name='create_highlight'),
+    path('api/connections/', get_connection_stats, name='get_connection_stats'),
+    path('wms/', wms_proxy, name='wms_proxy'),
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt', get_layer_tile, name='get_layer_tile'),
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Shp, Claimant
+from .models import Shp, Claimant, IngestJob, Location, ParcelStatistics, VillageExtent
 
 # Register your models here.
 admin.site.register(Shp)
@@ -7,6 +7,34 @@ admin.site.register(Shp)
 @admin.register(Claimant)
 class ClaimantAdmin(admin.ModelAdmin):
     list_display = ['serial_number', 'claimant_name', 'code_13_digit', 'claim_number', 'area', 'village_name']
-    list_filter = ['village_name', 'taluka', 'district']
-    search_fields = ['claimant_name', 'code_13_digit', 'claim_number']
-    ordering = ['serial_number']
\ No newline at end of file
+    list_filter = ['village_name', 'taluka', 'district', 'code_valid']
+    # Served by the trigram and code prefix indexes of Claimant
+    search_fields = ['claimant_name', '^code_13_digit', 'claim_number']
+    ordering = ['serial_number']
+    readonly_fields = ['location', 'code_district', 'code_taluka', 'code_village', 'code_initials', 'code_suffix',
+                       'code_valid']
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'level', 'parent', 'vill_name']
+    list_filter = ['level']
+    search_fields = ['name']
+    readonly_fields = ['extent', 'centroid']
+
+@admin.register(VillageExtent)
+class VillageExtentAdmin(admin.ModelAdmin):
+    list_display = ['layer', 'vill_name', 'feature_count', 'extent', 'centroid']
+    list_filter = ['layer']
+    search_fields = ['vill_name']
+
+@admin.register(IngestJob)
+class IngestJobAdmin(admin.ModelAdmin):
+    list_display = ['layer_name', 'status', 'stage', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['shp', 'layer_name', 'status', 'stage', 'stages', 'error', 'created_at', 'started_at', 'heartbeat_at', 'finished_at']
+
+@admin.register(ParcelStatistics)
+class ParcelStatisticsAdmin(admin.ModelAdmin):
+    list_display = ['layer', 'vill_name', 'patta_id', 'claimant', 'forest_cover_fraction', 'mean_elevation', 'mean_slope', 'computed_at']
+    list_filter = ['layer', 'vill_name']
+    readonly_fields = ['claimant', 'sources', 'geometry_hash', 'rasters', 'computed_at']
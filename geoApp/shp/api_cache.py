@@ -0,0 +1,161 @@
+import functools
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+# Bump when the JSON of the cached endpoints changes shape, old entries are never served again
+RESPONSE_FORMAT = 2
+
+GLOBAL_SCOPE = '*'
+# Bumped when the Location tree itself changes, location scoped responses depend on it
+LOCATIONS_SCOPE = 'locations'
+# Bumped when Location nodes are renamed, moved or deleted, ids looked up by name are stale
+LOCATION_IDS_SCOPE = 'location-ids'
+
+
+####################################################################################
+# Data versions of the claimant data, bumped on every change
+####################################################################################
+def _cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _version_key(scope):
+    digest = hashlib.sha1(scope.encode('utf-8')).hexdigest()
+    return f'claimants:version:{digest}'
+
+
+def data_version(scope=GLOBAL_SCOPE):
+    """
+    Version of the claimants of one village (or of all of them), a nanosecond timestamp.
+    A version missing from the cache starts at the current time, which can only make
+    clients and cached responses refetch, never serve stale data.
+    """
+    cache = _cache()
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def location_scope(location_id):
+    """Scope of the claimants below one Location, bumped with the villages under it"""
+    return f'location:{location_id}'
+
+
+def _locations_above(villages):
+    # Village nodes of the names and their taluka, district and state, one query
+    from .models import Location
+    rows = Location.objects.filter(level=Location.VILLAGE, name__in=villages).values_list(
+        'pk', 'parent', 'parent__parent', 'parent__parent__parent')
+    return {location_id for row in rows for location_id in row if location_id is not None}
+
+
+def bump_versions(villages, locations=False, location_ids=False):
+    """
+    New versions for the given villages, the locations above them and the global one.
+    locations=True when the Location tree changed, for every location scope at once,
+    location_ids=True when existing nodes were renamed, moved or deleted.
+    """
+    scopes = set(villages) | {GLOBAL_SCOPE} | {location_scope(pk) for pk in _locations_above(villages)}
+    if locations:
+        scopes.add(LOCATIONS_SCOPE)
+    if location_ids:
+        scopes.add(LOCATION_IDS_SCOPE)
+    now = time.time_ns()
+    _cache().set_many({_version_key(scope): now for scope in scopes}, timeout=None)
+
+
+def bump_on_commit(*villages, locations=False, location_ids=False):
+    """Bump once the current transaction commits, responses cached before that are from the old data"""
+    transaction.on_commit(lambda: bump_versions(villages, locations, location_ids))
+
+
+####################################################################################
+# Conditional, versioned JSON responses
+####################################################################################
+def _store(key, content_type, body):
+    if len(body) <= getattr(settings, 'API_CACHE_MAX_BODY', 16 * 1024 * 1024):
+        _cache().set(key, (content_type, body), timeout=getattr(settings, 'API_CACHE_TIMEOUT', 24 * 3600))
+
+
+def _store_stream(chunks, key, content_type):
+    """Pass a streamed body through, caching it once it has been sent in full"""
+    parts, size = [], 0
+    limit = getattr(settings, 'API_CACHE_MAX_BODY', 16 * 1024 * 1024)
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= limit:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+    # An interrupted download never gets here, only complete bodies are stored
+    if parts is not None:
+        _store(key, content_type, b''.join(parts))
+
+
+def versioned_response(scope_func):
+    """
+    Cache a GET JSON view per query string and data version, with ETag/Last-Modified.
+    `scope_func(request)` names the data the response depends on: a village name, a
+    location_scope(), GLOBAL_SCOPE or a list of them, the latest version counts. A matching If-None-Match/If-Modified-Since gets a 304 and a known version
+    is served from the cache, both without a database query.
+    """
+    def decorator(view):
+        def _state(request):
+            # Computed once per request, shared by the condition checks and the view
+            if not hasattr(request, '_api_cache_state'):
+                scopes = scope_func(request)
+                version = max(map(data_version, [scopes] if isinstance(scopes, str) else scopes))
+                # Every value of repeated parameters, escaped so that '&' or '=' in a value cannot collide
+                query = urlencode(sorted(request.GET.lists()), doseq=True)
+                etag = hashlib.sha1(f'{RESPONSE_FORMAT}:{request.path}?{query}:{version}'.encode()).hexdigest()
+                request._api_cache_state = (version, etag)
+            return request._api_cache_state
+
+        def etag(request, *args, **kwargs):
+            return _state(request)[1]
+
+        def last_modified(request, *args, **kwargs):
+            return datetime.fromtimestamp(_state(request)[0] / 1e9, tz=timezone.utc)
+
+        @functools.wraps(view)
+        def cached(request, *args, **kwargs):
+            _, key = _state(request)
+            cache = _cache()
+            entry = cache.get(f'claimants:response:{key}')
+            if entry is not None:
+                response = HttpResponse(entry[1], content_type=entry[0])
+                response['X-Api-Cache'] = 'HIT'
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and response.streaming:
+                    response.streaming_content = _store_stream(
+                        response.streaming_content, f'claimants:response:{key}', response['Content-Type'])
+                elif response.status_code == 200:
+                    _store(f'claimants:response:{key}', response['Content-Type'], response.content)
+                response['X-Api-Cache'] = 'MISS'
+            return response
+
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(cached)
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Browsers keep the body and revalidate it with If-None-Match on every use, 304s included
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,162 @@
+import json
+import tempfile
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Claimant
+
+# Claimant columns /api/claimants/ can return, serial_number is the key and the page cursor
+FIELDS = ['serial_number', 'claimant_name', 'code_13_digit', 'claim_number', 'gat_number', 'area']
+FORMATS = ['rows', 'columnar']
+
+# Parameters of the paginated API, a request with none of them gets the original response
+PARAMETERS = ['fields', 'format', 'after', 'limit']
+
+# Rows fetched from the server side cursor and encoded per chunk
+STREAM_CHUNK = 2000
+
+# Encoded columns of a columnar page wait in memory up to this size each, then on disk
+COLUMN_SPOOL_SIZE = 1024 * 1024
+
+
+def _dumps(value):
+    # Compact and UTF-8, Devanagari names are a third of the size of their \u escapes
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def _integer(params, name, minimum):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer: {value!r}')
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    return value
+
+
+####################################################################################
+# Query string of /api/claimants/
+####################################################################################
+def parse_query(params):
+    """
+    {'fields', 'format', 'after', 'limit', 'legacy'} of the query string, raises ValueError
+    on unknown fields or formats and bad numbers. serial_number is always the first field.
+    """
+    fields = FIELDS
+    if params.get('fields'):
+        names = [name.strip() for name in params['fields'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in FIELDS]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}, expected some of {", ".join(FIELDS)}')
+        fields = ['serial_number'] + [name for name in dict.fromkeys(names) if name != 'serial_number']
+
+    file_format = params.get('format') or 'rows'
+    if file_format not in FORMATS:
+        raise ValueError(f'Unknown format: {file_format!r}, expected one of {", ".join(FORMATS)}')
+
+    limit = _integer(params, 'limit', 1)
+    max_limit = getattr(settings, 'CLAIMANTS_MAX_PAGE_SIZE', 5000)
+    return {
+        'fields': fields,
+        'format': file_format,
+        'after': _integer(params, 'after', 0),
+        'limit': min(limit, max_limit) if limit else None,
+        'legacy': not any(name in params for name in PARAMETERS),
+    }
+
+
+####################################################################################
+# Streaming JSON encoders, one chunk of rows at a time
+####################################################################################
+def _page(village, fields, after, limit):
+    """Chunks of value tuples in serial number order and the cursor state they update"""
+    claimants = Claimant.objects.filter(village_name=village)
+    if after is not None:
+        claimants = claimants.filter(serial_number__gt=after)
+    # Keyset pagination on shp_claim_village_cover_idx, one row past the page tells if there is more
+    claimants = claimants.order_by('serial_number').values_list(*fields)
+    if limit:
+        claimants = claimants[:limit + 1]
+    rows = claimants.iterator(chunk_size=STREAM_CHUNK)
+
+    state = {'count': 0, 'last': None, 'next': None}
+
+    def chunks():
+        for chunk in iter(lambda: list(islice(rows, STREAM_CHUNK)), []):
+            more = limit is not None and state['count'] + len(chunk) > limit
+            if more:
+                chunk = chunk[:limit - state['count']]
+            if chunk:
+                state['count'] += len(chunk)
+                state['last'] = chunk[-1][0]
+                yield chunk
+            if more:
+                # The next page starts after the last serial number of this one
+                state['next'] = state['last']
+                return
+    return chunks(), state
+
+
+def _legacy_chunks(village, fields):
+    """{'village_name', 'serial_numbers', 'claimants'}, what the map used before pagination"""
+    chunks, _ = _page(village, fields, None, None)
+    serial_numbers = []
+    yield '{"village_name":' + _dumps(village) + ',"claimants":['
+    separator = ''
+    for chunk in chunks:
+        serial_numbers.extend(row[0] for row in chunk)
+        yield separator + _dumps([dict(zip(fields, row)) for row in chunk])[1:-1]
+        separator = ','
+    yield '],"serial_numbers":' + _dumps(serial_numbers) + '}'
+
+
+def _rows_chunks(village, fields, after, limit):
+    chunks, state = _page(village, fields, after, limit)
+    yield '{"village_name":' + _dumps(village) + ',"fields":' + _dumps(fields) + ',"claimants":['
+    separator = ''
+    for chunk in chunks:
+        yield separator + _dumps([dict(zip(fields, row)) for row in chunk])[1:-1]
+        separator = ','
+    yield '],"count":' + _dumps(state['count']) + ',"next":' + _dumps(state['next']) + '}'
+
+
+def _columnar_chunks(village, fields, after, limit):
+    # The first column streams with the rows, the others are only complete after the last
+    # row and are encoded into spool files meanwhile, never held as lists of values
+    chunks, state = _page(village, fields, after, limit)
+    spools = [tempfile.SpooledTemporaryFile(max_size=COLUMN_SPOOL_SIZE, mode='w+', encoding='utf-8')
+              for _ in fields[1:]]
+    try:
+        yield ('{"village_name":' + _dumps(village) + ',"fields":' + _dumps(fields) + ',"columns":{'
+               + _dumps(fields[0]) + ':[')
+        separator = ''
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            yield separator + _dumps(columns[0])[1:-1]
+            for spool, values in zip(spools, columns[1:]):
+                spool.write(separator + _dumps(values)[1:-1])
+            separator = ','
+        yield ']'
+        for field, spool in zip(fields[1:], spools):
+            spool.seek(0)
+            yield ',' + _dumps(field) + ':['
+            yield from iter(lambda: spool.read(COLUMN_SPOOL_SIZE), '')
+            yield ']'
+        yield '},"count":' + _dumps(state['count']) + ',"next":' + _dumps(state['next']) + '}'
+    finally:
+        for spool in spools:
+            spool.close()
+
+
+def claimant_chunks(village, query):
+    """JSON of the claimants of a village for the parse_query() options, as str chunks"""
+    if query['legacy']:
+        return _legacy_chunks(village, FIELDS)
+    if query['format'] == 'columnar':
+        return _columnar_chunks(village, query['fields'], query['after'], query['limit'])
+    return _rows_chunks(village, query['fields'], query['after'], query['limit'])
@@ -0,0 +1,158 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+####################################################################################
+# code_13_digit: district, taluka, village, claimant initials and a final digit
+####################################################################################
+# 0203PIM01SSD0 -> 02 | 03 | PIM01 | SSD | 0, D is a digit and L a letter at each position
+CODE_LAYOUT = 'DDDDLLLDDLLLD'
+CODE_LENGTH = len(CODE_LAYOUT)
+
+# (Claimant field, first position, end position) of each component, in code order
+CODE_PARTS = [
+    ('code_district', 0, 2),
+    ('code_taluka', 2, 4),
+    ('code_village', 4, 9),
+    ('code_initials', 9, 12),
+    ('code_suffix', 12, 13),
+]
+CODE_FIELDS = [field for field, _, _ in CODE_PARTS] + ['code_valid']
+
+_EXPECTED = {'D': ('a digit', str.isdigit), 'L': ('a letter', lambda c: c.isascii() and c.isalpha())}
+
+
+def normalize_code(code):
+    return ''.join(str(code).split()).upper() if code is not None else ''
+
+
+def code_problem(code, prefix=False):
+    """Why a code (or with prefix=True, the start of one) is malformed, None when it is fine"""
+    code = normalize_code(code)
+    if not code:
+        return 'missing'
+    if len(code) > CODE_LENGTH or (len(code) < CODE_LENGTH and not prefix):
+        return f'{len(code)} characters, expected {CODE_LENGTH}'
+    for position, (char, kind) in enumerate(zip(code, CODE_LAYOUT), 1):
+        name, check = _EXPECTED[kind]
+        if not check(char):
+            return f'position {position}: expected {name}, found {char!r}'
+    return None
+
+
+def code_parts(code):
+    """{Claimant code field: value} of a code, blank components and code_valid False when malformed"""
+    normalized = normalize_code(code)
+    if code_problem(normalized) is not None:
+        return {**{field: '' for field, _, _ in CODE_PARTS}, 'code_valid': False}
+    return {**{field: normalized[start:end] for field, start, end in CODE_PARTS}, 'code_valid': True}
+
+
+def prefix_filter(prefix):
+    """Q on the code component columns for a normalized, well formed code prefix"""
+    q = Q()
+    for field, start, end in CODE_PARTS:
+        part = prefix[start:end]
+        if not part:
+            break
+        # Whole components are equalities on shp_claim_code_parts_idx, the last one a range on it
+        q &= Q(**{field: part}) if len(part) == end - start else Q(**{f'{field}__startswith': part})
+    return q
+
+
+def reparse_codes(claimants, batch_size=2000):
+    """Parse the codes of a Claimant queryset into their components again, returns the rows changed"""
+    changed = []
+    for claimant in claimants.only('pk', 'code_13_digit', *CODE_FIELDS).iterator(chunk_size=batch_size):
+        parts = code_parts(claimant.code_13_digit)
+        if any(getattr(claimant, field) != value for field, value in parts.items()):
+            for field, value in parts.items():
+                setattr(claimant, field, value)
+            changed.append(claimant)
+    # bulk_update skips the save signals, the codes themselves do not change
+    claimants.model.objects.bulk_update(changed, CODE_FIELDS, batch_size=batch_size)
+    return len(changed)
+
+
+####################################################################################
+# Validation report and bulk lookups
+####################################################################################
+def validation_report(claimants, max_listed=None):
+    """
+    Malformed codes of a Claimant queryset: {'checked', 'valid', 'malformed', 'reasons',
+    'villages', 'problems'}. Well formed codes whose village component differs from the rest
+    of their village are listed too, as a likely typo.
+    """
+    max_listed = max_listed or getattr(settings, 'CLAIMANT_CODE_REPORT_MAX', 1000)
+    report = {'checked': 0, 'valid': 0, 'malformed': 0, 'reasons': Counter(), 'villages': Counter(), 'problems': []}
+    rows = claimants.order_by('village_name', 'serial_number').values_list(
+        'pk', 'village_name', 'serial_number', 'code_13_digit', 'code_village')
+
+    def add(pk, village_name, serial_number, code, reason):
+        report['reasons'][reason.split(':')[0]] += 1
+        report['villages'][village_name] += 1
+        if len(report['problems']) < max_listed:
+            report['problems'].append({'id': pk, 'village_name': village_name, 'serial_number': serial_number,
+                                       'code_13_digit': code, 'problem': reason})
+
+    village_codes = {}
+    for village_name, code_village in (claimants.exclude(code_village='').values_list('village_name', 'code_village')
+                                       .iterator(chunk_size=2000)):
+        village_codes.setdefault(village_name, Counter())[code_village] += 1
+    # The village component most codes of a village agree on
+    usual = {village_name: codes.most_common(1)[0][0] for village_name, codes in village_codes.items()}
+
+    for pk, village_name, serial_number, code, code_village in rows.iterator(chunk_size=2000):
+        report['checked'] += 1
+        problem = code_problem(code)
+        if problem is not None:
+            report['malformed'] += 1
+            add(pk, village_name, serial_number, code, problem)
+            continue
+        report['valid'] += 1
+        if code_village != usual.get(village_name, code_village):
+            add(pk, village_name, serial_number, code,
+                f'village component {code_village}: most of {village_name} uses {usual[village_name]}')
+    report['reasons'] = dict(report['reasons'])
+    report['villages'] = dict(report['villages'])
+    return report
+
+
+def lookup_codes(codes, fields):
+    """
+    Resolve codes and code prefixes in one query, returns ([{'code', 'match', 'problem',
+    'claimants'}] in input order, truncated). Well formed prefixes go through the component
+    columns, anything else is matched exactly so that malformed stored codes are found too.
+    """
+    from .models import Claimant
+
+    lookups, exact, prefixes = [], {}, {}
+    for code in dict.fromkeys(str(code) for code in codes):
+        normalized = normalize_code(code)
+        problem = code_problem(normalized, prefix=True)
+        lookup = {'code': code, 'match': 'exact', 'problem': problem, 'claimants': []}
+        if problem is None and len(normalized) < CODE_LENGTH:
+            lookup['match'] = 'prefix'
+            prefixes.setdefault(normalized, []).append(lookup)
+        elif normalized:
+            exact.setdefault(normalized, []).append(lookup)
+        lookups.append(lookup)
+    if not exact and not prefixes:
+        return lookups, False
+
+    matches = Q(code_upper__in=list(exact))
+    for prefix in prefixes:
+        matches |= prefix_filter(prefix)
+    limit = getattr(settings, 'CLAIMANT_CODE_LOOKUP_MAX_RESULTS', 10000)
+    rows = list(Claimant.objects.annotate(code_upper=Upper('code_13_digit')).filter(matches)
+                .order_by('code_13_digit', 'village_name', 'serial_number').values(*fields)[:limit + 1])
+
+    for row in rows[:limit]:
+        code = normalize_code(row['code_13_digit'])
+        # A claimant answers its exact code and each of its prefixes, CODE_LENGTH lookups per row
+        for matched in [exact.get(code, [])] + [prefixes.get(code[:end], []) for end in range(1, CODE_LENGTH)]:
+            for lookup in matched:
+                lookup['claimants'].append(row)
+    return lookups, len(rows) > limit
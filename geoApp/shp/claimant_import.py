@@ -0,0 +1,261 @@
+import csv
+import gzip
+import json
+import os
+import re
+import time
+
+from django.db import connection, transaction
+
+from .claimant_codes import CODE_FIELDS, code_parts
+from .models import Claimant
+
+# Columns of a flat claimant record, as exported by the digitization team
+COLUMNS = ['serial_number', 'claimant_name', 'code_13_digit', 'claim_number', 'gat_number', 'area',
+           'village_name', 'taluka', 'district']
+REQUIRED = {'serial_number', 'claimant_name', 'code_13_digit', 'area', 'village_name'}
+# Staged and merged: the record plus the components parsed from its code
+STAGED_COLUMNS = COLUMNS + CODE_FIELDS
+UPDATE_COLUMNS = [column for column in STAGED_COLUMNS if column not in ('serial_number', 'village_name')]
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+STAGING_TABLE = 'claimant_import'
+
+# Rejected records reported back, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# COPY text format escapes, only applied to the rare values that need them
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+_NEEDS_ESCAPE = re.compile(r'[\\\t\n\r]')
+
+
+def _copy_text(value):
+    if value is None:
+        return '\\N'
+    value = str(value)
+    return value.translate(_ESCAPES) if _NEEDS_ESCAPE.search(value) else value
+
+
+####################################################################################
+# Streaming readers, one record at a time
+####################################################################################
+def detect_format(path):
+    """csv or ndjson from the file extension, a trailing .gz is ignored"""
+    name = path[:-3] if path.endswith('.gz') else path
+    return FORMATS.get(os.path.splitext(name)[1].lower())
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def read_csv(path):
+    """Yield (line number, record) with lower-cased header names"""
+    with _open(path) as f:
+        reader = csv.DictReader(f)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for record in reader:
+            yield reader.line_num, record
+
+
+def read_ndjson(path):
+    """Yield (line number, record), one JSON object per line"""
+    with _open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError('Not a JSON object')
+                continue
+            yield line_number, {str(name).strip().lower(): value for name, value in record.items()}
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+####################################################################################
+# Validation against the Claimant columns
+####################################################################################
+def column_max_lengths():
+    """{column: max_length} of the Claimant text columns, for clean_record()"""
+    return {column: Claimant._meta.get_field(column).max_length for column in COLUMNS
+            if column != 'serial_number'}
+
+
+def clean_record(record, max_lengths):
+    """Claimant column values of one record, raises ValueError when it cannot be loaded"""
+    values = {}
+    for column in COLUMNS:
+        value = record.get(column)
+        value = '' if value is None else str(value).strip()
+        if not value:
+            if column in REQUIRED:
+                raise ValueError(f'{column} is missing')
+            # Optional columns are NULL, taluka and district empty like populate_claimants
+            values[column] = None if column in ('claim_number', 'gat_number') else ''
+            continue
+        if column == 'serial_number':
+            try:
+                number = float(value)
+            except ValueError:
+                raise ValueError(f'serial_number is not a number: {value!r}')
+            if not number.is_integer():
+                raise ValueError(f'serial_number is not a whole number: {value!r}')
+            values[column] = int(number)
+        elif len(value) > max_lengths[column]:
+            raise ValueError(f'{column} is longer than {max_lengths[column]} characters')
+        else:
+            values[column] = value
+    values.update(code_parts(values['code_13_digit']))
+    return values
+
+
+def copy_lines(records, report):
+    """
+    COPY text lines (line number first) of the valid records. Rejected records are counted
+    in report['rejected'] and the first ones described in report['errors'], records with a
+    malformed code_13_digit in report['malformed_codes'].
+    """
+    max_lengths = column_max_lengths()
+    for line_number, record in records:
+        report['read'] += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            values = clean_record(record, max_lengths)
+        except ValueError as e:
+            report['rejected'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append(f'line {line_number}: {e}')
+            continue
+        if not values['code_valid']:
+            # Loaded anyway, validate_claimant_codes lists them
+            report['malformed_codes'] += 1
+        fields = [str(line_number)] + [_copy_text(values[column]) for column in STAGED_COLUMNS]
+        yield '\t'.join(fields) + '\n'
+
+
+class LineStream:
+    """Read-only file object over an iterator of lines, what copy_expert pulls from"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._rest = ''
+
+    def read(self, size=-1):
+        parts, length = [self._rest], len(self._rest)
+        for line in self._lines:
+            parts.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = ''.join(parts)
+        if size < 0:
+            self._rest = ''
+            return data
+        self._rest = data[size:]
+        return data[:size]
+
+
+####################################################################################
+# COPY into a staging table, then one merge into Claimant
+####################################################################################
+def _merge_sql(table):
+    columns = ', '.join(STAGED_COLUMNS)
+    updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in UPDATE_COLUMNS)
+    current = ', '.join(f'{table}.{column}' for column in UPDATE_COLUMNS)
+    excluded = ', '.join(f'EXCLUDED.{column}' for column in UPDATE_COLUMNS)
+    # The last record of a claimant in the file wins, unchanged rows are not rewritten
+    return (
+        f'WITH merged AS ('
+        f'INSERT INTO {table} ({columns}) '
+        f'SELECT DISTINCT ON (village_name, serial_number) {columns} FROM {STAGING_TABLE} '
+        f'ORDER BY village_name, serial_number, line DESC '
+        f'ON CONFLICT (serial_number, village_name) DO UPDATE SET {updates} '
+        f'WHERE ({current}) IS DISTINCT FROM ({excluded}) '
+        f'RETURNING village_name, (xmax = 0) AS inserted) '
+        f'SELECT village_name, count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) '
+        f'FROM merged GROUP BY village_name'
+    )
+
+
+def _prune(cursor, table):
+    """Delete the claimants of the imported villages that are not in the file, returns {village: count}"""
+    cursor.execute(
+        f'SELECT c.id, c.village_name FROM {table} c '
+        f'WHERE c.village_name IN (SELECT DISTINCT village_name FROM {STAGING_TABLE}) '
+        f'AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} i '
+        f'WHERE i.village_name = c.village_name AND i.serial_number = c.serial_number)')
+    missing = cursor.fetchall()
+    for start in range(0, len(missing), 1000):
+        # Through the ORM so that eligibility rows and parcel links are cleaned up too
+        Claimant.objects.filter(pk__in=[pk for pk, _ in missing[start:start + 1000]]).delete()
+    pruned = {}
+    for _, village_name in missing:
+        pruned[village_name] = pruned.get(village_name, 0) + 1
+    return pruned
+
+
+def _set_locations(cursor, table):
+    """Point the imported claimants at their village Location, by the last record of each village"""
+    from .locations import village_location_ids
+
+    cursor.execute(f'SELECT DISTINCT ON (village_name) village_name, taluka, district FROM {STAGING_TABLE} '
+                   f'ORDER BY village_name, line DESC')
+    for (village_name, _, _), location_id in village_location_ids(cursor.fetchall()).items():
+        cursor.execute(f'UPDATE {table} SET location_id = %s '
+                       f'WHERE village_name = %s AND location_id IS DISTINCT FROM %s',
+                       [location_id, village_name, location_id])
+
+
+def import_claimants(path, file_format=None, prune=False):
+    """
+    Stream a flat CSV or NDJSON file (optionally .gz) into Claimant in one transaction:
+    records are validated one by one and COPYed into a temporary staging table, which is
+    then merged with INSERT ... ON CONFLICT. Memory use does not depend on the file size.
+    Returns a report with the read, rejected, staged, inserted, updated and pruned counts,
+    per village too, and the seconds spent streaming the file and merging it.
+    """
+    file_format = file_format or detect_format(path)
+    if file_format not in READERS:
+        raise ValueError(f'Unsupported claimant file format: {path}')
+
+    report = {'read': 0, 'rejected': 0, 'errors': [], 'staged': 0, 'malformed_codes': 0,
+              'inserted': 0, 'updated': 0, 'pruned': 0, 'villages': {}}
+    table = Claimant._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {STAGING_TABLE} (line bigint, serial_number integer, '
+            f'claimant_name text, code_13_digit text, claim_number text, gat_number text, area text, '
+            f'village_name text, taluka text, district text, code_district text, code_taluka text, '
+            f'code_village text, code_initials text, code_suffix text, code_valid boolean) ON COMMIT DROP')
+        start = time.perf_counter()
+        lines = copy_lines(READERS[file_format](path), report)
+        cursor.copy_expert(f'COPY {STAGING_TABLE} (line, {", ".join(STAGED_COLUMNS)}) FROM STDIN',
+                           LineStream(lines))
+        report['staged'] = report['read'] - report['rejected']
+        cursor.execute(f'ANALYZE {STAGING_TABLE}')
+        report['copy_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cursor.execute(_merge_sql(table))
+        for village_name, inserted, updated in cursor.fetchall():
+            report['villages'][village_name] = {'inserted': inserted, 'updated': updated, 'pruned': 0}
+            report['inserted'] += inserted
+            report['updated'] += updated
+        _set_locations(cursor, table)
+        if prune:
+            for village_name, count in _prune(cursor, table).items():
+                report['villages'].setdefault(village_name, {'inserted': 0, 'updated': 0, 'pruned': 0})
+                report['villages'][village_name]['pruned'] = count
+                report['pruned'] += count
+        report['merge_seconds'] = time.perf_counter() - start
+    return report
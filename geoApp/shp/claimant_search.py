@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+
+from .models import Claimant
+
+RESULT_FIELDS = ['serial_number', 'claimant_name', 'code_13_digit', 'claim_number', 'gat_number', 'area',
+                 'village_name', 'taluka', 'district', 'location_id']
+
+# Shorter queries match too many trigrams to rank usefully
+MIN_QUERY_LENGTH = 2
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+####################################################################################
+# Fuzzy claimant search on the pg_trgm indexes of Claimant
+####################################################################################
+def search_claimants(query, location_id=None, limit=None):
+    """
+    Top `limit` claimants for `query`, best first, optionally below one Location.
+    Names match by trigram word similarity, so transliterations (Valvi/Walvi) and a single
+    name out of the full name are found; codes match by prefix and claim numbers exactly
+    or by substring. Each query runs under CLAIMANT_SEARCH_TIMEOUT_MS, a slower one raises
+    django.db.OperationalError. Raises ValueError for a query that is too short.
+    Returns the results and the milliseconds the query took.
+    """
+    from .locations import village_ids_below
+
+    query = ' '.join(query.split())
+    if len(query) < MIN_QUERY_LENGTH:
+        raise ValueError(f'Search for at least {MIN_QUERY_LENGTH} characters')
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be at least 1')
+    limit = min(limit or _setting('CLAIMANT_SEARCH_RESULTS', 20), _setting('CLAIMANT_SEARCH_MAX_RESULTS', 100))
+    term = query.upper()
+
+    # Upper() matches the expressions of the trigram and prefix indexes (shp_claim_*_idx)
+    claimants = Claimant.objects.annotate(
+        name_upper=Upper('claimant_name'), code_upper=Upper('code_13_digit'), claim_upper=Upper('claim_number'))
+    matches = Q(name_upper__trigram_word_similar=term) | Q(name_upper__contains=term)
+    scores = [TrigramWordSimilarity(Value(term), 'name_upper')]
+    if ' ' not in term:
+        matches |= Q(code_upper__startswith=term) | Q(claim_upper__contains=term)
+        scores += [
+            Case(When(code_upper__startswith=term, then=Value(1.0)), default=Value(0.0), output_field=FloatField()),
+            Case(When(claim_upper=term, then=Value(1.0)), When(claim_upper__contains=term, then=Value(0.5)),
+                 default=Value(0.0), output_field=FloatField()),
+        ]
+    claimants = claimants.filter(matches)
+    if location_id is not None:
+        claimants = claimants.filter(location_id__in=village_ids_below(location_id))
+    claimants = claimants.annotate(score=Greatest(*scores) if len(scores) > 1 else scores[0]).order_by(
+        '-score', 'village_name', 'serial_number').values(*RESULT_FIELDS, 'score')[:limit]
+
+    start = time.perf_counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Both settings end with the transaction
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true), "
+                       "set_config('statement_timeout', %s, true)",
+                       [str(_setting('CLAIMANT_SEARCH_THRESHOLD', 0.4)),
+                        str(_setting('CLAIMANT_SEARCH_TIMEOUT_MS', 500))])
+        results = list(claimants)
+    for result in results:
+        result['score'] = round(result['score'], 3)
+    return results, round((time.perf_counter() - start) * 1000, 1)
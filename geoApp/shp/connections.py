@@ -0,0 +1,180 @@
+import functools
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+# geoserver-rest (GDAL, matplotlib, seaborn), SQLAlchemy and requests are imported on first
+# use so that importing the models stays as cheap as plain Django
+
+
+####################################################################################
+# Keep-alive GeoServer REST client
+####################################################################################
+@functools.cache
+def _pooled_geoserver_class():
+    from geo.Geoserver import Geoserver
+
+    class PooledGeoserver(Geoserver):
+        """geoserver-rest client whose requests reuse one keep-alive HTTP session"""
+
+        def __init__(self, *args, pool_maxsize=4, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.session = _session(pool_maxsize)
+            self.session.auth = (self.username, self.password)
+
+        def _requests(self, method, url, **kwargs):
+            return self.session.request(method, url, **kwargs)
+
+        def upload_sld(self, name, sld_body, workspace=None):
+            """Create or replace a style from an SLD string (upload_style only takes a file path)"""
+            url = (f'{self.service_url}/rest/workspaces/{workspace}/styles' if workspace
+                   else f'{self.service_url}/rest/styles')
+            # Fails harmlessly when the style exists already, the PUT replaces its body
+            self.session.post(url, data=f'<style><name>{name}</name><filename>{name}.sld</filename></style>',
+                              headers={'content-type': 'text/xml'})
+            r = self.session.put(f'{url}/{name}', data=sld_body.encode('utf-8'),
+                                 headers={'content-type': 'application/vnd.ogc.sld+xml'})
+            r.raise_for_status()
+            return r.status_code
+
+    return PooledGeoserver
+
+
+def _session(pool_maxsize):
+    import requests
+    import requests.adapters
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+####################################################################################
+# One lazily created set of database and GeoServer clients per process
+####################################################################################
+class ConnectionManager:
+    """
+    Owns the pooled SQLAlchemy engine used for raw psycopg2 work (COPY, DDL), the
+    GeoServer REST client, the HTTP session to GeoServer WMS and Django's connection for
+    the same database. Nothing connects until first use, and a forked child gets its own
+    pools instead of sharing the parent's sockets.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._pid = None
+        self._engine = None
+        self._geoserver = None
+        self._http = None
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            if self._engine is not None:
+                # Leave the parent's connections alone, just forget them
+                self._engine.dispose(close=False)
+            self._engine = self._geoserver = self._http = None
+            self._pid = os.getpid()
+
+    def database_url(self):
+        from sqlalchemy.engine import URL
+
+        database = settings.DATABASES[self.alias]
+        return URL.create(
+            'postgresql+psycopg2',
+            username=database.get('USER') or None,
+            password=database.get('PASSWORD') or None,
+            host=database.get('HOST') or None,
+            port=int(database['PORT']) if database.get('PORT') else None,
+            database=database.get('NAME'),
+        )
+
+    @property
+    def engine(self):
+        with self._lock:
+            self._check_pid()
+            if self._engine is None:
+                from sqlalchemy import create_engine
+                self._engine = create_engine(
+                    self.database_url(),
+                    pool_size=getattr(settings, 'DB_POOL_SIZE', 5),
+                    max_overflow=getattr(settings, 'DB_POOL_MAX_OVERFLOW', 5),
+                    pool_recycle=getattr(settings, 'DB_POOL_RECYCLE', 1800),
+                    pool_pre_ping=True,
+                )
+            return self._engine
+
+    def raw_connection(self):
+        """Pooled DB-API connection, close() hands it back to the pool"""
+        return self.engine.raw_connection()
+
+    @property
+    def geoserver(self):
+        with self._lock:
+            self._check_pid()
+            if self._geoserver is None:
+                self._geoserver = _pooled_geoserver_class()(
+                    getattr(settings, 'GEOSERVER_URL', 'http://127.0.0.1:8080/geoserver'),
+                    username=getattr(settings, 'GEOSERVER_USER', 'admin'),
+                    password=getattr(settings, 'GEOSERVER_PASSWORD', 'geoserver'),
+                    pool_maxsize=getattr(settings, 'GEOSERVER_POOL_SIZE', 4),
+                )
+            return self._geoserver
+
+    @property
+    def http(self):
+        """Anonymous keep-alive session for WMS requests"""
+        with self._lock:
+            self._check_pid()
+            if self._http is None:
+                self._http = _session(getattr(settings, 'GEOSERVER_POOL_SIZE', 4))
+            return self._http
+
+    @property
+    def django(self):
+        return connections[self.alias]
+
+    def stats(self):
+        """Pool usage of every client created so far in this process"""
+        stats = {'pid': os.getpid(), 'engine': None, 'geoserver': None, 'http': None}
+        if self._engine is not None:
+            pool = self._engine.pool
+            stats['engine'] = {
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+            }
+        for name, session in [('geoserver', self._geoserver and self._geoserver.session),
+                              ('http', self._http)]:
+            if session is not None:
+                pools = session.get_adapter('http://').poolmanager.pools
+                pools = [pools[key] for key in pools.keys()]
+                # requests well above connections_opened means keep-alive is working
+                stats[name] = {
+                    'hosts': len(pools),
+                    'connections_opened': sum(pool.num_connections for pool in pools),
+                    'requests': sum(pool.num_requests for pool in pools),
+                }
+        django = self.django
+        stats['django'] = {
+            'connected': django.connection is not None,
+            'conn_max_age': django.settings_dict.get('CONN_MAX_AGE', 0),
+        }
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            for session in [self._geoserver and self._geoserver.session, self._http]:
+                if session is not None:
+                    session.close()
+            self._engine = self._geoserver = self._http = None
+
+
+connection_manager = ConnectionManager()
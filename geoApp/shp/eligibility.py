@@ -0,0 +1,263 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .village_cache import village_corpus
+
+
+####################################################################################
+# Shared eligibility rules
+####################################################################################
+# Surname patterns used as a proxy for SC/ST communities
+SC_ST_INDICATORS = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad',
+                    'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
+# Name endings used as a proxy for women claimants
+WOMEN_INDICATORS = ('bai', 'ya', 'i')
+
+SMALL_LANDHOLDING = 2.0       # hectares
+VERY_SMALL_LANDHOLDING = 1.0  # hectares
+
+CLAIMANT_FIELDS = ['serial_number', 'claimant_name', 'code_13_digit',
+                   'claim_number', 'gat_number', 'area']
+
+_SC_ST_PATTERN = '|'.join(re.escape(indicator) for indicator in SC_ST_INDICATORS)
+
+
+######################################################################################
+# Columnar claimant frame
+######################################################################################
+def _is_missing(values):
+    """True where a claim/gat number is empty, None or the literal 'null'"""
+    text = values.fillna('').astype(str)
+    return (text == '') | (text == 'null')
+
+
+def area_hectares(values):
+    """
+    Parse areas to floats, unparseable areas ("Illegible", None) count as zero hectares.
+    A "nan" area stays NaN, like float() made it, and so is within no area threshold.
+    """
+    values = pd.Series(values, dtype=object)
+    areas = pd.to_numeric(values, errors='coerce')
+    nan = values.map(str).str.strip().str.lower().isin(['nan', '+nan', '-nan'])
+    return areas.where(areas.notna() | nan, 0.0).astype(float)
+
+
+def serial_numbers(values):
+    """Parse serial numbers like int(): numbers are truncated, strings must be whole numbers, NaN otherwise"""
+    values = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(values, errors='coerce')
+    text = values.map(lambda value: isinstance(value, str))
+    whole = values.map(str).str.fullmatch(r'\s*[+-]?\d+\s*')
+    numbers = numbers.where((~text | whole) & np.isfinite(numbers.astype(float)))
+    return np.trunc(numbers.astype(float))
+
+
+def build_claimant_frame(documents):
+    """Flatten village documents into one DataFrame with the shared indicator columns"""
+    records = []
+    village_index = []
+    for index, document in enumerate(documents):
+        for claimant in document.get('claimants', []):
+            village_index.append(index)
+            records.append(claimant)
+    return claimant_frame(records, village_index)
+
+
+def claimant_frame(records, village_index=None):
+    """Build the indicator frame from claimant dicts (JSON records or Claimant.values())"""
+    columns = {field: [record.get(field) for record in records] for field in CLAIMANT_FIELDS}
+    frame = pd.DataFrame({field: pd.Series(values, dtype=object)
+                          for field, values in columns.items()})
+    if village_index is None:
+        village_index = np.zeros(len(records))
+    frame['village_index'] = np.asarray(village_index, dtype=np.int64)
+
+    frame['area'] = area_hectares(frame['area'])
+    frame['serial'] = serial_numbers(frame['serial_number'])
+
+    name_lower = frame['claimant_name'].fillna('').astype(str).str.lower()
+    frame['is_sc_st'] = name_lower.str.contains(_SC_ST_PATTERN, regex=True).to_numpy(dtype=bool)
+    frame['is_woman'] = name_lower.str.endswith(WOMEN_INDICATORS).to_numpy(dtype=bool)
+    frame['small_holding'] = frame['area'].to_numpy() <= SMALL_LANDHOLDING
+    frame['very_small_holding'] = frame['area'].to_numpy() <= VERY_SMALL_LANDHOLDING
+    frame['no_claim_number'] = _is_missing(frame['claim_number']).to_numpy(dtype=bool)
+    frame['no_gat_number'] = _is_missing(frame['gat_number']).to_numpy(dtype=bool)
+    return frame
+
+
+######################################################################################
+# Scheme rules, evaluated as array predicates over the whole frame
+######################################################################################
+def _pm_kisan(frame):
+    # PM Kisan eligibility: up to 2 hectares
+    return pd.DataFrame({'eligible': frame['small_holding']})
+
+
+def _mgnrega(frame):
+    # All FRA claimants are rural residents; priority for small landholders,
+    # SC/ST communities and women
+    return pd.DataFrame({
+        'eligible': np.ones(len(frame), dtype=bool),
+        'priority': frame['small_holding'] | frame['is_sc_st'] | frame['is_woman'],
+    })
+
+
+def _pm_jai_jeevan(frame):
+    # Priority for water-scarce (small) holdings; high priority for SC/ST,
+    # women, very small holdings and holdings without a gat number
+    return pd.DataFrame({
+        'eligible': np.ones(len(frame), dtype=bool),
+        'priority': frame['small_holding'],
+        'high_priority': (frame['is_sc_st'] | frame['is_woman']
+                          | frame['very_small_holding'] | frame['no_gat_number']),
+    })
+
+
+def _pm_ayushman(frame):
+    # Priority for economically weaker (small) holdings; high priority for SC/ST,
+    # women, very small holdings and claimants without a claim number
+    family_size = np.select(
+        [frame['very_small_holding'], frame['small_holding']], [6, 5], default=4)
+    return pd.DataFrame({
+        'eligible': np.ones(len(frame), dtype=bool),
+        'priority': frame['small_holding'],
+        'high_priority': (frame['is_sc_st'] | frame['is_woman']
+                          | frame['very_small_holding'] | frame['no_claim_number']),
+        # Larger families in smaller holdings, SC/ST families tend to be larger
+        'estimated_family_size': family_size + frame['is_sc_st'].astype(int),
+    })
+
+
+def _pm_kaushal(frame):
+    # Age is estimated from the serial number and name patterns, 15-45 are eligible
+    serial = frame['serial'].fillna(1).astype(int)
+    estimated_age = np.select(
+        [frame['is_sc_st'], frame['is_woman']],
+        [24 + serial % 19, 22 + serial % 18],
+        default=25 + serial % 20)
+    eligible = (estimated_age >= 15) & (estimated_age <= 45)
+    young_adult = (estimated_age >= 18) & (estimated_age <= 30)
+    return pd.DataFrame({
+        'estimated_age': estimated_age,
+        'eligible': eligible,
+        'priority': eligible & frame['small_holding'],
+        'high_priority': eligible & (frame['is_sc_st'] | frame['is_woman']
+                                     | frame['very_small_holding'] | young_adult),
+    })
+
+
+def _digital_india(frame):
+    # Universal access; readiness grows with landholding and community need
+    high_priority = (frame['is_sc_st'] | frame['is_woman'] | frame['very_small_holding']
+                     | frame['no_claim_number'] | frame['no_gat_number'])
+    readiness = np.select(
+        [frame['is_sc_st'] | frame['very_small_holding'] | frame['no_claim_number'],
+         frame['small_holding'] | frame['is_woman'] | frame['no_gat_number']],
+        ['High - Priority for Digital Inclusion', 'Medium - Ready for Digital Services'],
+        default='Basic - Needs Digital Literacy')
+    return pd.DataFrame({
+        'eligible': np.ones(len(frame), dtype=bool),
+        'priority': frame['small_holding'],
+        'high_priority': high_priority,
+        'digital_readiness': readiness,
+    })
+
+
+def _startup_age(serial):
+    # Younger serial numbers are assumed to be older claimants
+    age = np.select(
+        [serial <= 50, serial <= 100],
+        [50 - serial * 0.4, 40 - (serial - 50) * 0.3],
+        default=35 - (serial - 100) * 0.2)
+    age = np.clip(np.trunc(age), 18, 65)
+    # Serial numbers that are not integers fall back to a default age
+    return np.where(np.isnan(serial), 35, age).astype(int)
+
+
+def _startup_india(frame):
+    # Age 18-45 have startup potential; small holdings, SC/ST, women, young
+    # adults and claimants without a claim number get priority
+    estimated_age = _startup_age(frame['serial'].to_numpy(dtype=float))
+    eligible = (estimated_age >= 18) & (estimated_age <= 45)
+    young_adult = (estimated_age >= 18) & (estimated_age <= 30)
+    excellent = eligible & (frame['is_sc_st'] | frame['very_small_holding']
+                            | young_adult | frame['no_claim_number'])
+    good = eligible & (frame['small_holding'] | frame['is_woman'])
+    return pd.DataFrame({
+        'estimated_age': estimated_age,
+        'eligible': eligible,
+        'priority': eligible & frame['small_holding'],
+        'high_priority': excellent | (eligible & frame['is_woman']),
+        'startup_potential': np.select(
+            [excellent, good],
+            ['Excellent - High Startup Potential', 'Good - Agri-Tech & Rural Business Potential'],
+            default='Limited - Focus on Traditional Skills'),
+        'age_group': np.select(
+            [estimated_age <= 30, estimated_age <= 40, estimated_age <= 45],
+            ['Young Adult', 'Adult', 'Experienced'], default='Senior'),
+        'startup_phase': np.select(
+            [estimated_age <= 30, estimated_age <= 40, estimated_age <= 45],
+            ['Early Stage', 'Growth Stage', 'Expansion Stage'], default='Mature'),
+    })
+
+
+SCHEMES = {
+    'pm_kisan': _pm_kisan,
+    'mgnrega': _mgnrega,
+    'pm_jai_jeevan': _pm_jai_jeevan,
+    'pm_ayushman': _pm_ayushman,
+    'pm_kaushal': _pm_kaushal,
+    'digital_india': _digital_india,
+    'startup_india': _startup_india,
+}
+
+
+def evaluate_scheme(frame, scheme):
+    """Return the claimant fields joined with the flags of one scheme"""
+    flags = SCHEMES[scheme](frame)
+    flags.index = frame.index
+    for flag in ('priority', 'high_priority'):
+        if flag not in flags:
+            flags[flag] = False
+    return pd.concat([frame[CLAIMANT_FIELDS + ['village_index']], flags], axis=1)
+
+
+def evaluate_records(records, scheme):
+    """Evaluate one scheme over a handful of claimant dicts, e.g. the page being shown"""
+    result = evaluate_scheme(claimant_frame(records), scheme)
+    return result.drop(columns='village_index').to_dict('records')
+
+
+def corpus_scheme_page(scheme):
+    """
+    Per-village counts of one scheme over the data/villages corpus and a
+    rows(village, offset, limit) function for one village's rows, evaluated once for both
+    """
+    documents, frame = village_corpus.frame(build_claimant_frame)
+    result = evaluate_scheme(frame, scheme)
+    counts = result.groupby('village_index')[['eligible', 'priority', 'high_priority']].sum()
+    sizes = result.groupby('village_index').size()
+
+    villages = []
+    for index, document in enumerate(documents):
+        details = document['document_details']
+        villages.append({
+            'village_name': details['village_name'],
+            'taluka': details['taluka'],
+            'district': details['district'],
+            'total_claimants': int(sizes.get(index, 0)),
+            'eligible_claimants': int(counts['eligible'].get(index, 0)),
+            'priority_claimants': int(counts['priority'].get(index, 0)),
+            'high_priority_claimants': int(counts['high_priority'].get(index, 0)),
+        })
+    names = [v['village_name'] for v in villages]
+
+    def rows(village, offset=0, limit=None):
+        if village not in names:
+            return []
+        selected = result[result['village_index'].to_numpy() == names.index(village)]
+        end = None if limit is None else offset + limit
+        return selected.iloc[offset:end].drop(columns='village_index').to_dict('records')
+    return villages, rows
@@ -0,0 +1,109 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+from .eligibility import CLAIMANT_FIELDS, SCHEMES, claimant_frame, evaluate_scheme
+from .models import Claimant, ClaimantEligibility
+
+FLAG_FIELDS = ['eligible', 'priority', 'high_priority']
+ESTIMATE_FIELDS = ['estimated_family_size', 'estimated_age']
+
+_state = threading.local()
+
+
+####################################################################################
+# Materialized ClaimantEligibility refresh
+####################################################################################
+def eligibility_rows(records):
+    """Evaluate every scheme for Claimant.values('id', ...) records"""
+    frame = claimant_frame(records)
+    claimant_ids = [record['id'] for record in records]
+    rows = []
+    for scheme in SCHEMES:
+        result = evaluate_scheme(frame, scheme)
+        detail_fields = [column for column in result.columns
+                         if column not in CLAIMANT_FIELDS + FLAG_FIELDS + ESTIMATE_FIELDS + ['village_index']]
+        for claimant_id, values in zip(claimant_ids, result.to_dict('records')):
+            rows.append(ClaimantEligibility(
+                claimant_id=claimant_id,
+                scheme=scheme,
+                eligible=values['eligible'],
+                priority=values['priority'],
+                high_priority=values['high_priority'],
+                estimated_family_size=values.get('estimated_family_size'),
+                estimated_age=values.get('estimated_age'),
+                details={field: values[field] for field in detail_fields},
+            ))
+    return rows
+
+
+def refresh_village(village_name):
+    """Recompute the eligibility rows of one village"""
+    records = list(Claimant.objects.filter(village_name=village_name).values('id', *CLAIMANT_FIELDS))
+    rows = eligibility_rows(records)
+    with transaction.atomic():
+        ClaimantEligibility.objects.filter(claimant__village_name=village_name).delete()
+        ClaimantEligibility.objects.bulk_create(rows, batch_size=1000)
+    return len(records)
+
+
+def refresh_all():
+    """Recompute the eligibility rows of every village, one village at a time"""
+    villages = Claimant.objects.values_list('village_name', flat=True).distinct()
+    return {village: refresh_village(village) for village in villages}
+
+
+def schedule_refresh(village_name):
+    """
+    Refresh a village once the current transaction commits, or at the end of deferred_refresh().
+    A transaction that saves or deletes many claimants of a village refreshes it once.
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.add(village_name)
+        return
+    if not connection.in_atomic_block:
+        refresh_village(village_name)
+        return
+    # One hook and village set per transaction, a commit or rollback clears the hooks
+    scheduled = getattr(_state, 'scheduled', None)
+    if scheduled is None or not any(hook[1] is scheduled[1] for hook in connection.run_on_commit):
+        villages = set()
+
+        def refresh():
+            if getattr(_state, 'scheduled', None) is scheduled:
+                _state.scheduled = None
+            for name in sorted(villages):
+                refresh_village(name)
+        scheduled = _state.scheduled = (villages, refresh)
+        transaction.on_commit(refresh)
+    scheduled[0].add(village_name)
+
+
+@contextmanager
+def deferred_refresh(pending=None):
+    """
+    Collect the villages touched inside the block and refresh each of them once on exit.
+    Yields the set of villages. Worker threads join it with deferred_refresh(pending), the
+    block that made the set refreshes them.
+    """
+    current = getattr(_state, 'pending', None)
+    if current is not None:
+        yield current
+        return
+    if pending is not None:
+        _state.pending = pending
+        try:
+            yield pending
+        finally:
+            _state.pending = None
+        return
+
+    _state.pending = set()
+    try:
+        yield _state.pending
+    finally:
+        villages, _state.pending = _state.pending, None
+        for village_name in sorted(villages):
+            refresh_village(village_name)
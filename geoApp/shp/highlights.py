@@ -0,0 +1,88 @@
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Claimant, HighlightSet
+
+# Query parameter of /wms/ carrying a HighlightSet key
+HIGHLIGHT_PARAMETER = 'highlight'
+# HighlightSet.used_at is only rewritten once it is older than this
+USE_RESOLUTION = datetime.timedelta(hours=1)
+
+
+####################################################################################
+# Server-side highlight sets for the WMS layers
+####################################################################################
+def shapefile_village_name(village):
+    """Default vill_name of a claimant village in the layers, as index.html derives it"""
+    return ''.join(village.lower().split())
+
+
+def _cql_literal(value):
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def highlight_set(villages, patta_ids=None):
+    """
+    Get or create the HighlightSet of the claimants of `villages`, a list of
+    {'village': Claimant.village_name, 'vill_name': name used in the layers}.
+    With `patta_ids` only those parcels are highlighted instead of every claimant.
+    """
+    names = {v['village']: v.get('vill_name') or shapefile_village_name(v['village']) for v in villages}
+    serials = {village: set() for village in names}
+    if patta_ids is None:
+        for village, serial in (Claimant.objects.filter(village_name__in=names)
+                                .values_list('village_name', 'serial_number')):
+            serials[village].add(serial)
+    else:
+        for village in serials:
+            serials[village] = {int(patta_id) for patta_id in patta_ids}
+
+    parcels = {}
+    for village, vill_name in names.items():
+        parcels.setdefault(vill_name, set()).update(serials[village])
+    parcels = [[vill_name, sorted(ids)] for vill_name, ids in sorted(parcels.items())]
+    key = hashlib.sha1(json.dumps(parcels).encode()).hexdigest()
+    highlight, created = HighlightSet.objects.get_or_create(key=key, defaults={'parcels': parcels})
+    if created:
+        prune_highlight_sets()
+    else:
+        _mark_used(highlight)
+    return highlight
+
+
+def _mark_used(highlight):
+    now = timezone.now()
+    if highlight.used_at < now - USE_RESOLUTION:
+        HighlightSet.objects.filter(pk=highlight.pk).update(used_at=now)
+        highlight.used_at = now
+
+
+def prune_highlight_sets(ttl=None):
+    """Delete the HighlightSets not created or drawn for HIGHLIGHT_SET_TTL seconds"""
+    if ttl is None:
+        ttl = getattr(settings, 'HIGHLIGHT_SET_TTL', 30 * 24 * 3600)
+    expired = timezone.now() - datetime.timedelta(seconds=ttl)
+    count, _ = HighlightSet.objects.filter(used_at__lt=expired).delete()
+    return count
+
+
+def highlight_cql(highlight):
+    """CQL filter selecting the parcels of a HighlightSet"""
+    clauses = [f"(vill_name = {_cql_literal(vill_name)} AND patta_id IN ({','.join(str(i) for i in ids)}))"
+               for vill_name, ids in highlight.parcels if ids]
+    return ' OR '.join(clauses) or 'EXCLUDE'
+
+
+def resolve_highlight(query):
+    """Replace ?highlight=<key> of a WMS query by the CQL filter of the set"""
+    upstream = query.copy()
+    name = next(name for name in upstream if name.lower() == HIGHLIGHT_PARAMETER)
+    key = upstream.pop(name)[-1]
+    highlight = HighlightSet.objects.get(key=key)
+    _mark_used(highlight)
+    upstream['cql_filter'] = highlight_cql(highlight)
+    return upstream
@@ -0,0 +1,220 @@
+import os
+import time
+import zipfile
+
+from django.conf import settings
+
+from .loader import (DEFAULT_BATCH_SIZE, copy_layer, drop_table, finalize_table, index_renames, staging_name,
+                     swap_table)
+from .connections import connection_manager
+from .models import Shp
+from .tile_cache import tile_cache
+
+# Create a proper red highlighting SLD
+HIGHLIGHTED_SLD = """<?xml version="1.0" encoding="UTF-8"?>
+<StyledLayerDescriptor version="1.0.0" xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <NamedLayer>
+    <Name>highlighted_layer</Name>
+    <UserStyle>
+      <Title>Red Highlighted Features</Title>
+      <FeatureTypeStyle>
+        <Rule>
+          <Title>Red Highlight</Title>
+          <PolygonSymbolizer>
+            <Fill>
+              <CssParameter name="fill">#FF0000</CssParameter>
+              <CssParameter name="fill-opacity">0.7</CssParameter>
+            </Fill>
+            <Stroke>
+              <CssParameter name="stroke">#CC0000</CssParameter>
+              <CssParameter name="stroke-width">2</CssParameter>
+            </Stroke>
+          </PolygonSymbolizer>
+        </Rule>
+      </FeatureTypeStyle>
+    </UserStyle>
+  </NamedLayer>
+</StyledLayerDescriptor>"""
+
+# Blue style for the single parcel selected from the claimant dropdown
+SELECTED_SLD = """<?xml version="1.0" encoding="UTF-8"?>
+<StyledLayerDescriptor version="1.0.0" xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <NamedLayer>
+    <Name>selected_layer</Name>
+    <UserStyle>
+      <Title>Blue Selected Feature</Title>
+      <FeatureTypeStyle>
+        <Rule>
+          <Title>Blue Highlight</Title>
+          <PolygonSymbolizer>
+            <Fill>
+              <CssParameter name="fill">#0066FF</CssParameter>
+              <CssParameter name="fill-opacity">0.8</CssParameter>
+            </Fill>
+            <Stroke>
+              <CssParameter name="stroke">#0044CC</CssParameter>
+              <CssParameter name="stroke-width">3</CssParameter>
+            </Stroke>
+          </PolygonSymbolizer>
+        </Rule>
+      </FeatureTypeStyle>
+    </UserStyle>
+  </NamedLayer>
+</StyledLayerDescriptor>"""
+
+
+####################################################################################
+# Shapefile ingestion stages, run by shp.jobs in a worker process
+####################################################################################
+def _is_resource_fork(member):
+    # macOS archives carry __MACOSX/ folders and ._name AppleDouble entries
+    parts = member.split('/')
+    return '__MACOSX' in parts or parts[-1].startswith('._')
+
+
+def find_layer_member(names):
+    """Pick the .shp member of an archive listing, preferring one with its .dbf and .shx"""
+    names = [name for name in names if not _is_resource_fork(name)]
+    lowered = {name.lower() for name in names}
+    candidates = sorted(name for name in names if name.lower().endswith('.shp'))
+    for candidate in candidates:
+        stem = candidate[:-4].lower()
+        if f'{stem}.dbf' in lowered and f'{stem}.shx' in lowered:
+            return candidate
+    return candidates[0] if candidates else None
+
+
+def inspect(context):
+    """Locate the layer inside the uploaded archive, it is read in place through /vsizip/"""
+    file = context['file']
+    with zipfile.ZipFile(file, 'r') as zip_ref:
+        member = find_layer_member(zip_ref.namelist())
+    if member is None:
+        raise ValueError(f"No .shp file found in {os.path.basename(file)}")
+    context['shp_file'] = f'/vsizip/{file}/{member}'
+
+
+# Attempts at taking the short rename lock before the swap stage gives up
+SWAP_ATTEMPTS = 5
+
+# Attribute columns the map filters on (CQL vill_name = ... AND patta_id IN (...))
+INDEXED_ATTRIBUTES = ['patta_id', 'vill_name']
+
+
+def _indexed_attributes():
+    return getattr(settings, 'INGEST_INDEXED_ATTRIBUTES', INDEXED_ATTRIBUTES)
+
+
+def load(context):
+    """Stream the layer into the staging table data.<name>__staging in bounded COPY batches"""
+    context['staging_table'] = staging_name(context['name'])
+    # The live names the swap stage gives the indexes built on the staging table
+    context['index_renames'] = index_renames(context['staging_table'], context['name'], _indexed_attributes())
+    connection = connection_manager.raw_connection()
+    try:
+        context['feature_count'] = copy_layer(
+            context['shp_file'], connection, 'data', context['staging_table'],
+            batch_size=getattr(settings, 'INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def finalize(context):
+    """Index, cluster and analyze the staging table before it goes live"""
+    connection = connection_manager.raw_connection()
+    try:
+        context['layer_stats'] = finalize_table(
+            connection, 'data', context['staging_table'], _indexed_attributes())
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        drop_table(connection, 'data', context['staging_table'])
+        connection.commit()
+        raise
+    finally:
+        connection.close()
+
+
+def swap(context):
+    """Swap the staging table in for data.<name> with a transactional rename"""
+    connection = connection_manager.raw_connection()
+    try:
+        for attempt in range(1, SWAP_ATTEMPTS + 1):
+            try:
+                swap_table(connection, 'data', context['staging_table'], context['name'], context['index_renames'])
+                connection.commit()
+                break
+            except Exception as e:
+                connection.rollback()
+                # 55P03: lock_not_available, map traffic is holding the live table
+                if getattr(e, 'pgcode', None) != '55P03' or attempt == SWAP_ATTEMPTS:
+                    drop_table(connection, 'data', context['staging_table'])
+                    connection.commit()
+                    raise
+                time.sleep(attempt)
+    finally:
+        connection.close()
+
+    # update() so recording the stats does not trigger another ingest
+    Shp.objects.filter(pk=context['shp_id']).update(**context['layer_stats'])
+    # Tiles rendered from the old table while the upload was loading are stale now
+    tile_cache.invalidate(context['name'])
+
+
+def publish(context):
+    """Publish data.<name> to the geoserver using geoserver-rest"""
+    geo = connection_manager.geoserver
+    database = connection_manager.django.settings_dict
+    geo.create_featurestore(store_name='geoApp', workspace='geoapp', db=database['NAME'],
+                            host=database['HOST'] or 'localhost', pg_user=database['USER'],
+                            pg_password=database['PASSWORD'], schema='data')
+    geo.publish_featurestore(
+        workspace='geoapp', store_name='geoApp', pg_table=context['name'])
+
+
+def style(context):
+    """Outline style for the layer plus the shared red and blue highlight styles"""
+    geo = connection_manager.geoserver
+    geo.create_outline_featurestyle('geoApp_shp', workspace='geoapp')
+
+    # Named highlight styles, used with ?highlight= sets instead of inline sld_body
+    for style_name, sld in [('geoApp_shp_highlighted', HIGHLIGHTED_SLD), ('geoApp_shp_selected', SELECTED_SLD)]:
+        try:
+            geo.upload_sld(style_name, sld, workspace='geoapp')
+        except Exception as e:
+            print(f"Warning: Could not create {style_name} style: {e}")
+
+    geo.publish_style(
+        layer_name=context['name'], style_name='geoApp_shp', workspace='geoapp')
+
+
+def extents(context):
+    """Extent and centroid of each village of the layer, rolled up into the location tree"""
+    from .locations import refresh_layer_extents
+    context['extents'] = refresh_layer_extents(context['name'])
+
+
+def zonal(context):
+    """Forest cover and DEM statistics of the parcels that are new or changed in this upload"""
+    from .zonal_store import refresh_layer
+    # Spread over ZONAL_MAX_WORKERS processes of its own, like compute_zonal_stats
+    context['zonal'] = refresh_layer(context['name'])
+
+
+STAGES = [
+    ('inspect', inspect),
+    ('load', load),
+    ('finalize', finalize),
+    ('swap', swap),
+    ('publish', publish),
+    ('style', style),
+    ('extents', extents),
+    ('zonal', zonal),
+]
+
+# A failure in one of these stages means the upload itself is unusable
+LOAD_STAGES = {'inspect', 'load', 'finalize', 'swap'}
@@ -0,0 +1,212 @@
+import functools
+import logging
+import multiprocessing
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import IngestJob, Shp
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+####################################################################################
+# Local worker pool for shapefile ingestion and raster optimization
+####################################################################################
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _get_executor():
+    """
+    Process pool of this web process, sized by INGEST_MAX_WORKERS. Every web process has its
+    own, INGEST_MAX_CONCURRENT bounds the ingests running in all of them together.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'INGEST_MAX_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker)
+        return _executor
+
+
+def submit(fn, *args):
+    """Run fn(*args) in the pool, fn must be importable by the spawned workers"""
+    global _executor
+    try:
+        return _get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died, start a fresh pool and retry once
+        with _executor_lock:
+            _executor = None
+        return _get_executor().submit(fn, *args)
+
+
+def enqueue_ingest(instance, replaces_layer=False):
+    """Record an ingest job for a Shp upload and hand it to the pool once the save commits"""
+    from .ingest import STAGES
+
+    job = IngestJob.objects.create(
+        shp=instance,
+        layer_name=instance.name,
+        replaces_layer=replaces_layer,
+        stages={stage: {'status': IngestJob.QUEUED} for stage, _ in STAGES},
+    )
+    transaction.on_commit(lambda: submit(run_ingest_job, job.pk).add_done_callback(
+        functools.partial(_job_done, job.pk)))
+    return job
+
+
+def _job_done(job_id, future):
+    """Done callback of a pooled ingest: a worker that raised or died leaves the queue to this process"""
+    if future.cancelled() or future.exception() is None:
+        return
+    # Callbacks run on the pool's own thread, which must not wait on the database or the pool
+    threading.Thread(target=_recover, args=(job_id, future.exception()), daemon=True).start()
+
+
+def _recover(job_id, error):
+    logger.error('Ingest worker of job %s failed: %r', job_id, error)
+    if job_id is None:
+        # The restart below failed as well, the next upload or process_ingest_jobs retries
+        return
+    try:
+        # Pickling errors and broken pools never reached the job's own error handling
+        IngestJob.objects.filter(pk=job_id, status__in=[IngestJob.QUEUED, IngestJob.RUNNING]).update(
+            status=IngestJob.FAILED, error=f'Ingest worker failed: {error!r}', finished_at=timezone.now())
+        # The jobs that waited for this one would otherwise wait for the next upload
+        submit(run_ingest_job, None).add_done_callback(functools.partial(_job_done, None))
+    finally:
+        connection.close()
+
+
+def _set_stage(job, stage, status, error=''):
+    entry = job.stages.setdefault(stage, {})
+    entry['status'] = status
+    entry['started_at' if status == IngestJob.RUNNING else 'finished_at'] = timezone.now().isoformat()
+    if error:
+        entry['error'] = error
+    job.stage = stage
+    job.save(update_fields=['stage', 'stages'])
+
+
+####################################################################################
+# Job claims, bounded across every web process by INGEST_MAX_CONCURRENT
+####################################################################################
+def _claim(job_id=None):
+    """
+    Mark the oldest queued job (or job_id only) running and return its id, None when nothing
+    can start because INGEST_MAX_CONCURRENT jobs are running already. Jobs of one layer run
+    one at a time in upload order, they share its staging table.
+    """
+    limit = getattr(settings, 'INGEST_MAX_CONCURRENT', 2)
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'INGEST_JOB_STALE_AFTER', 300))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Claims take turns until they commit, so no two see the same free slot
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('shp.ingest_jobs'))")
+        # A running job without a recent heartbeat was lost with its worker, it frees its slot
+        IngestJob.objects.filter(status=IngestJob.RUNNING).filter(
+            Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True, started_at__lt=stale)).update(
+            status=IngestJob.FAILED, error='The ingest worker stopped responding', finished_at=now)
+        running = IngestJob.objects.filter(status=IngestJob.RUNNING)
+        if running.count() >= limit:
+            return None
+        earlier = IngestJob.objects.filter(status=IngestJob.QUEUED, layer_name=OuterRef('layer_name'),
+                                           pk__lt=OuterRef('pk'))
+        queued = (IngestJob.objects.filter(status=IngestJob.QUEUED)
+                  .exclude(layer_name__in=running.values('layer_name')).exclude(Exists(earlier)))
+        if job_id is not None:
+            queued = queued.filter(pk=job_id)
+        job_id = queued.order_by('pk').values_list('pk', flat=True).first()
+        if job_id is not None:
+            IngestJob.objects.filter(pk=job_id).update(status=IngestJob.RUNNING, started_at=now, heartbeat_at=now)
+        return job_id
+
+
+def run_ingest_job(job_id):
+    """
+    Run the job if a slot is free, then the jobs left queued while none was. A job that
+    cannot start stays queued for the next job to finish anywhere.
+    """
+    close_old_connections()
+    job_id = _claim(job_id)
+    while job_id is not None:
+        _run_job_with_heartbeat(job_id)
+        job_id = _claim()
+
+
+def _heartbeat(job_id, stopped):
+    interval = getattr(settings, 'INGEST_HEARTBEAT_INTERVAL', 30)
+    try:
+        while not stopped.wait(interval):
+            IngestJob.objects.filter(pk=job_id, status=IngestJob.RUNNING).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def _run_job_with_heartbeat(job_id):
+    """Run a claimed job while a thread records that its worker is alive"""
+    stopped = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job_id, stopped), daemon=True)
+    beat.start()
+    try:
+        _run_job(job_id)
+    finally:
+        stopped.set()
+        beat.join()
+
+
+def _run_job(job_id):
+    """Run every ingestion stage of a claimed job, recording progress on the IngestJob row"""
+    from .ingest import LOAD_STAGES, STAGES
+
+    job = IngestJob.objects.select_related('shp').get(pk=job_id)
+    if job.shp is None:
+        job.status, job.error, job.finished_at = IngestJob.FAILED, 'Upload was deleted', timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return
+
+    context = {'shp_id': job.shp_id, 'file': job.shp.file.path, 'name': job.layer_name}
+    for stage, run in STAGES:
+        _set_stage(job, stage, IngestJob.RUNNING)
+        try:
+            run(context)
+        except Exception as e:
+            _set_stage(job, stage, IngestJob.FAILED, error=str(e))
+            job.status, job.error, job.finished_at = IngestJob.FAILED, traceback.format_exc(), timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            print("There is problem during shp upload: ", e)
+            if stage in LOAD_STAGES and not job.replaces_layer:
+                # Nothing usable was loaded for a new upload, drop it as before
+                Shp.objects.filter(pk=job.shp_id).delete()
+            return
+        _set_stage(job, stage, IngestJob.SUCCEEDED)
+
+    job.status, job.finished_at = IngestJob.SUCCEEDED, timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+
+
+def process_queued_jobs():
+    """Run queued jobs in this process, e.g. the ones left over from a restart"""
+    count = 0
+    job_id = _claim()
+    while job_id is not None:
+        _run_job_with_heartbeat(job_id)
+        count += 1
+        job_id = _claim()
+    return count
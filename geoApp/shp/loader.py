@@ -0,0 +1,256 @@
+import hashlib
+import io
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyogrio
+import pyogrio.raw
+import shapely
+from pyproj import CRS
+
+logger = logging.getLogger(__name__)
+
+####################################################################################
+# Streaming vector layer -> PostGIS loader (bounded batches + COPY)
+####################################################################################
+# Features read and copied per batch, peak memory is proportional to this
+DEFAULT_BATCH_SIZE = 10000
+
+GEOMETRY_COLUMN = 'geometry'
+
+_PG_TYPES = {
+    'bool': 'boolean',
+    'int8': 'smallint',
+    'int16': 'smallint',
+    'int32': 'integer',
+    'int64': 'bigint',
+    'uint8': 'smallint',
+    'uint16': 'integer',
+    'uint32': 'bigint',
+    'float32': 'real',
+    'float64': 'double precision',
+    'datetime64[D]': 'date',
+    'datetime64[ms]': 'timestamp',
+}
+
+# COPY text format escapes
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def quote_ident(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def index_name(*parts):
+    """
+    '_'.join(parts) as an index name. PostgreSQL cuts names past 63 bytes silently, longer
+    ones are cut here and end in a hash of the full name so that they stay distinct.
+    """
+    name = '_'.join(parts)
+    if len(name.encode('utf-8')) <= 63:
+        return name
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return f"{name.encode('utf-8')[:54].decode('utf-8', 'ignore')}_{digest}"
+
+
+def geometry_index_name(table):
+    return index_name('idx', table, GEOMETRY_COLUMN)
+
+
+def attribute_index_name(table, attribute):
+    return index_name(table, attribute.lower(), 'idx')
+
+
+def layer_srid(crs):
+    """EPSG code of the layer CRS, 0 when unknown"""
+    if not crs:
+        return 0
+    try:
+        return CRS.from_user_input(crs).to_epsg() or 0
+    except Exception:
+        return 0
+
+
+def _column_sql(fields, dtypes):
+    return [f'{quote_ident(name)} {_PG_TYPES.get(str(dtype), "text")}'
+            for name, dtype in zip(fields, dtypes)]
+
+
+def _copy_values(values):
+    """Render one column of a batch in COPY text format"""
+    if values.dtype.kind == 'M':
+        values = np.datetime_as_string(values)
+        return ['\\N' if value == 'NaT' else value for value in values]
+    if values.dtype.kind == 'f':
+        return ['\\N' if np.isnan(value) else repr(float(value)) for value in values]
+    if values.dtype.kind == 'b':
+        return ['t' if value else 'f' for value in values]
+    if values.dtype.kind in 'iu':
+        return [str(int(value)) for value in values]
+    return ['\\N' if value is None else str(value).translate(_ESCAPES) for value in values]
+
+
+def _arrow_values(column):
+    """(numpy values, null mask or None) of an Arrow column, nulls hold a filler value"""
+    if not column.null_count:
+        return column.to_numpy(zero_copy_only=False), None
+    nulls = column.is_null().to_numpy(zero_copy_only=False)
+    # to_numpy turns integers with nulls into floats, fill them so they render as integers
+    if pa.types.is_integer(column.type):
+        column = column.fill_null(0)
+    elif pa.types.is_boolean(column.type):
+        column = column.fill_null(False)
+    return column.to_numpy(zero_copy_only=False), nulls
+
+
+def iter_batches(path, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+    """
+    Yield (geometry_wkb, columns) for bounded slices of the layer, read in one pass over one
+    open dataset. columns holds the (values, nulls) of each attribute field in layer order.
+    """
+    with pyogrio.raw.open_arrow(path, use_pyarrow=True, batch_size=batch_size, **kwargs) as (meta, reader):
+        geometry_name = meta['geometry_name'] or 'wkb_geometry'
+        for batch in reader:
+            columns = [_arrow_values(batch.column(name)) for name in meta['fields']]
+            yield batch.column(geometry_name).to_numpy(zero_copy_only=False), columns
+
+
+def copy_layer(path, connection, schema, table, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+    """
+    Create schema.table from the layer at `path` and fill it with COPY, one batch at a time.
+    `connection` is a DB-API (psycopg2) connection, the caller owns the transaction.
+    Returns the number of features loaded.
+    """
+    info = pyogrio.read_info(path, **kwargs)
+    srid = layer_srid(info.get('crs'))
+    fields = list(info['fields'])
+    columns = _column_sql(fields, info['dtypes'])
+    target = f'{quote_ident(schema)}.{quote_ident(table)}'
+
+    cursor = connection.cursor()
+    cursor.execute(f'DROP TABLE IF EXISTS {target}')
+    cursor.execute(
+        f'CREATE TABLE {target} ({", ".join(columns + [f"{GEOMETRY_COLUMN} geometry(Geometry, {srid})"])})')
+
+    copy_sql = 'COPY {} ({}) FROM STDIN'.format(
+        target, ', '.join([quote_ident(name) for name in fields] + [GEOMETRY_COLUMN]))
+    loaded = 0
+    for geometry, field_data in iter_batches(path, batch_size, **kwargs):
+        geometries = shapely.from_wkb(geometry)
+        if srid:
+            geometries = shapely.set_srid(geometries, srid)
+        ewkb = shapely.to_wkb(geometries, hex=True, include_srid=bool(srid))
+        rendered = []
+        for values, nulls in field_data:
+            column = _copy_values(values)
+            if nulls is not None:
+                column = ['\\N' if null else value for value, null in zip(column, nulls)]
+            rendered.append(column)
+        rendered.append(['\\N' if value is None else value for value in ewkb])
+
+        buffer = io.StringIO()
+        for row in zip(*rendered):
+            buffer.write('\t'.join(row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+        loaded += len(geometry)
+
+    cursor.execute(
+        f'CREATE INDEX {quote_ident(geometry_index_name(table))} ON {target} USING gist ({GEOMETRY_COLUMN})')
+    cursor.close()
+    return loaded
+
+
+def staging_name(table):
+    return f'{table}__staging'
+
+
+def index_renames(staging, table, attribute_columns=()):
+    """{staging index: live index} of the indexes copy_layer and finalize_table build on staging"""
+    renames = {geometry_index_name(staging): geometry_index_name(table)}
+    for attribute in attribute_columns:
+        renames[attribute_index_name(staging, attribute)] = attribute_index_name(table, attribute)
+    return renames
+
+
+def drop_table(connection, schema, table):
+    cursor = connection.cursor()
+    cursor.execute(f'DROP TABLE IF EXISTS {quote_ident(schema)}.{quote_ident(table)}')
+    cursor.close()
+
+
+def swap_table(connection, schema, staging, table, renames, lock_timeout='5s'):
+    """
+    Replace schema.table with the fully loaded and indexed schema.staging by renaming, the
+    staging indexes get their live names from `renames` (index_renames()).
+    Run inside one transaction: readers see either the old table or the new one.
+    """
+    old = f'{table}__old'
+    cursor = connection.cursor()
+    # Never queue behind long map queries for long, the caller retries instead
+    cursor.execute('SET LOCAL lock_timeout = %s', [lock_timeout])
+    cursor.execute(f'DROP TABLE IF EXISTS {quote_ident(schema)}.{quote_ident(old)}')
+    cursor.execute(f'ALTER TABLE IF EXISTS {quote_ident(schema)}.{quote_ident(table)} RENAME TO {quote_ident(old)}')
+    cursor.execute(f'ALTER TABLE {quote_ident(schema)}.{quote_ident(staging)} RENAME TO {quote_ident(table)}')
+    cursor.execute(f'DROP TABLE IF EXISTS {quote_ident(schema)}.{quote_ident(old)}')
+    # Give the new indexes the names the live table's indexes had, dropping the old table freed them
+    for staging_index, live_index in renames.items():
+        cursor.execute(f'ALTER INDEX IF EXISTS {quote_ident(schema)}.{quote_ident(staging_index)} '
+                       f'RENAME TO {quote_ident(live_index)}')
+    cursor.close()
+
+
+def finalize_table(connection, schema, table, attribute_columns=()):
+    """
+    B-tree index the given attribute columns (matched case-insensitively), CLUSTER on the
+    GiST index and ANALYZE. Returns the feature count, extent and SRID of the table.
+    """
+    target = f'{quote_ident(schema)}.{quote_ident(table)}'
+    cursor = connection.cursor()
+
+    cursor.execute('SELECT column_name FROM information_schema.columns '
+                   'WHERE table_schema = %s AND table_name = %s', [schema, table])
+    columns = {row[0].lower(): row[0] for row in cursor.fetchall()}
+    for attribute in attribute_columns:
+        column = columns.get(attribute.lower())
+        if column is None:
+            continue
+        # Single-column indexes on the column already, e.g. from an attribute listed twice
+        cursor.execute('SELECT index_class.relname FROM pg_index '
+                       'JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid '
+                       'JOIN pg_attribute ON pg_attribute.attrelid = pg_index.indrelid '
+                       'AND pg_attribute.attnum = pg_index.indkey[0] '
+                       'WHERE pg_index.indrelid = %s::regclass AND pg_index.indnatts = 1 '
+                       'AND pg_attribute.attname = %s', [target, column])
+        existing = cursor.fetchone()
+        if existing is not None:
+            logger.debug('Not indexing %s.%s for %s: already indexed by %s', table, column, attribute, existing[0])
+            continue
+        index = attribute_index_name(table, attribute)
+        cursor.execute(f'CREATE INDEX {quote_ident(index)} ON {target} ({quote_ident(column)})')
+
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s AND tablename = %s "
+                   "AND indexdef ILIKE '%%USING gist%%'", [schema, table])
+    gist = cursor.fetchone()
+    if gist is None:
+        index = geometry_index_name(table)
+        cursor.execute(f'CREATE INDEX {quote_ident(index)} ON {target} USING gist ({GEOMETRY_COLUMN})')
+        gist = (index,)
+    # Physically order rows by the spatial index so tile queries read neighbouring pages
+    cursor.execute(f'CLUSTER {target} USING {quote_ident(gist[0])}')
+    cursor.execute(f'ANALYZE {target}')
+
+    extent = f'ST_Extent({GEOMETRY_COLUMN})'
+    cursor.execute(f'SELECT count(*), ST_XMin({extent}), ST_YMin({extent}), ST_XMax({extent}), '
+                   f'ST_YMax({extent}) FROM {target}')
+    count, xmin, ymin, xmax, ymax = cursor.fetchone()
+    cursor.execute('SELECT Find_SRID(%s, %s, %s)', [schema, table, GEOMETRY_COLUMN])
+    srid = cursor.fetchone()[0]
+    cursor.close()
+    return {
+        'feature_count': count,
+        'extent': None if xmin is None else [xmin, ymin, xmax, ymax],
+        'srid': srid,
+    }
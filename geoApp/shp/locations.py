@@ -0,0 +1,217 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+
+from .highlights import shapefile_village_name
+from .models import Claimant, Location, Shp, VillageExtent
+
+
+####################################################################################
+# Location hierarchy (state > district > taluka > village)
+####################################################################################
+def default_state():
+    return getattr(settings, 'DEFAULT_STATE', 'Maharashtra')
+
+
+# (village_name, taluka, district, state): id of the village node, valid for one version of the
+# Location tree (api_cache.LOCATION_IDS_SCOPE), bumped for every process when nodes are renamed,
+# moved or deleted
+_village_ids = {}
+_village_ids_version = None
+
+
+def village_location_id(village_name, taluka='', district='', state=None):
+    """
+    Id of the village node under state > district > taluka, creating missing levels.
+    Remembered in the process until existing nodes change, so repeated saves of a
+    village's claimants do not walk the hierarchy again.
+    """
+    from .api_cache import LOCATION_IDS_SCOPE, data_version
+    global _village_ids_version
+
+    version = data_version(LOCATION_IDS_SCOPE)
+    if version != _village_ids_version:
+        _village_ids.clear()
+        _village_ids_version = version
+    key = (village_name, taluka or '', district or '', state or default_state())
+    if key in _village_ids:
+        return _village_ids[key]
+    parent = None
+    for level, name in [(Location.STATE, key[3]), (Location.DISTRICT, key[2]),
+                        (Location.TALUKA, key[1]), (Location.VILLAGE, village_name)]:
+        parent, _ = Location.objects.get_or_create(parent=parent, level=level, name=name)
+    # A rolled back transaction may have created the nodes, only committed ids are kept,
+    # and only while the tree is still at the version they were looked up in
+    location_id = parent.pk
+
+    def remember():
+        if _village_ids_version == version:
+            _village_ids[key] = location_id
+
+    transaction.on_commit(remember)
+    return location_id
+
+
+def forget_village_location_ids():
+    _village_ids.clear()
+
+
+def village_location_ids(villages):
+    """{(village_name, taluka, district): location id} for many villages, one lookup chain each"""
+    return {village: village_location_id(*village) for village in set(villages)}
+
+
+def village_ids_below(location_id):
+    """Ids of the village nodes at or below a location, one query on the parent chain"""
+    return list(Location.objects.filter(level=Location.VILLAGE).filter(
+        Q(pk=location_id) | Q(parent=location_id) | Q(parent__parent=location_id)
+        | Q(parent__parent__parent=location_id)).values_list('pk', flat=True))
+
+
+def available_villages():
+    """
+    Villages that have claimants with their taluka, district and state, in name order.
+    Reads the village nodes (one index probe each), not the Claimant table.
+    """
+    return list(
+        Location.objects.filter(level=Location.VILLAGE)
+        .filter(Exists(Claimant.objects.filter(location=OuterRef('pk'))))
+        .order_by('name')
+        .values(village_name=F('name'), taluka=F('parent__name'), district=F('parent__parent__name'),
+                state=F('parent__parent__parent__name'))
+    )
+
+
+def _villages_with_claimants():
+    return Location.objects.filter(level=Location.VILLAGE).filter(
+        Exists(Claimant.objects.filter(location=OuterRef('pk'))))
+
+
+def location_tree():
+    """
+    Nested {'id', 'name', 'level', 'extent', 'centroid', 'children'} nodes from the states
+    down to the villages that have claimants, villages carry their layer vill_name instead
+    of children. Two queries, whatever the size of the tree.
+    """
+    villages = set(_villages_with_claimants().values_list('pk', flat=True))
+    nodes, children = {}, defaultdict(list)
+    for location in Location.objects.order_by('name'):
+        node = {'id': location.pk, 'name': location.name, 'level': location.level,
+                'extent': location.extent, 'centroid': location.centroid}
+        if location.level == Location.VILLAGE:
+            node['vill_name'] = location.layer_vill_name()
+        nodes[location.pk] = node
+        children[location.parent_id].append(location.pk)
+
+    def build(pk):
+        node = nodes[pk]
+        if node['level'] == Location.VILLAGE:
+            return node if pk in villages else None
+        node['children'] = [child for child in map(build, children[pk]) if child]
+        return node if node['children'] else None
+    return [node for node in map(build, children[None]) if node]
+
+
+####################################################################################
+# Village extents from the ingested layers, rolled up the hierarchy
+####################################################################################
+def layer_village_extents(layer):
+    """
+    {vill_name: (extent, centroid, area, feature count)} of data.<layer> in EPSG:4326,
+    None when the layer has no vill_name attribute
+    """
+    # The loader pulls in numpy/pyogrio/shapely, claimant saves import this module
+    from .loader import GEOMETRY_COLUMN, quote_ident
+    from .zonal_store import table_srid
+
+    if not Shp.objects.filter(name=layer).exists():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT column_name FROM information_schema.columns '
+                       'WHERE table_schema = %s AND table_name = %s', ['data', layer])
+        columns = {name.lower(): name for name, in cursor.fetchall()}
+        if 'vill_name' not in columns or GEOMETRY_COLUMN not in columns:
+            return None
+        vill_name = f't.{quote_ident(columns["vill_name"])}'
+        srid = table_srid(cursor, layer)
+        cursor.execute(
+            f'SELECT vill_name, ST_XMin(extent), ST_YMin(extent), ST_XMax(extent), ST_YMax(extent), '
+            f'ST_X(centroid), ST_Y(centroid), area, features FROM ('
+            f'SELECT vill_name, ST_Extent(geom) AS extent, ST_Centroid(ST_Collect(geom)) AS centroid, '
+            f'sum(ST_Area(geom)) AS area, count(*) AS features FROM ('
+            f'SELECT btrim({vill_name}::text) AS vill_name, '
+            f'ST_Transform(ST_SetSRID(t.{GEOMETRY_COLUMN}, {srid}), 4326) AS geom '
+            f'FROM {quote_ident("data")}.{quote_ident(layer)} t '
+            f'WHERE {vill_name} IS NOT NULL AND NOT ST_IsEmpty(t.{GEOMETRY_COLUMN})) f '
+            f"WHERE vill_name <> '' GROUP BY vill_name) v")
+        return {row[0]: (list(row[1:5]), list(row[5:7]), row[7] or 0, row[8]) for row in cursor.fetchall()}
+
+
+def _merge(parts):
+    """(extent, centroid, weight) of [(extent, centroid, weight)], centroids weighted by area"""
+    if not parts:
+        return None, None, 0
+    extent = [min(part[0][0] for part in parts), min(part[0][1] for part in parts),
+              max(part[0][2] for part in parts), max(part[0][3] for part in parts)]
+    weight = sum(part[2] for part in parts)
+    # Point and line layers have no area, their centroids count equally
+    weights = [part[2] for part in parts] if weight > 0 else [1] * len(parts)
+    centroid = [sum(part[1][axis] * w for part, w in zip(parts, weights)) / sum(weights) for axis in (0, 1)]
+    return [round(value, 6) for value in extent], [round(value, 6) for value in centroid], weight
+
+
+def update_location_extents():
+    """Recompute Location.extent and Location.centroid from the VillageExtent rows of all layers"""
+    from .api_cache import bump_versions
+
+    by_name = defaultdict(list)
+    for row in VillageExtent.objects.all():
+        by_name[shapefile_village_name(row.vill_name)].append((row.extent, row.centroid, row.area))
+
+    locations = {location.pk: location for location in Location.objects.all()}
+    children = defaultdict(list)
+    for location in locations.values():
+        children[location.parent_id].append(location)
+
+    changed = []
+
+    def roll_up(location):
+        if location.level == Location.VILLAGE:
+            parts = by_name.get(location.layer_vill_name(), [])
+        else:
+            parts = [part for part in map(roll_up, children[location.pk]) if part[0]]
+        extent, centroid, weight = _merge(parts)
+        if (location.extent, location.centroid) != (extent, centroid):
+            location.extent, location.centroid = extent, centroid
+            changed.append(location)
+        return extent, centroid, weight
+
+    for location in children[None]:
+        roll_up(location)
+    # bulk_update sends no post_save, the location tree gets its new version here
+    Location.objects.bulk_update(changed, ['extent', 'centroid'], batch_size=1000)
+    if changed:
+        transaction.on_commit(lambda: bump_versions([]))
+    return len(changed)
+
+
+def refresh_layer_extents(layer):
+    """Record the village extents of one ingested layer, returns {'villages', 'locations'}"""
+    extents = layer_village_extents(layer) or {}
+    with transaction.atomic():
+        VillageExtent.objects.filter(layer=layer).delete()
+        VillageExtent.objects.bulk_create([
+            VillageExtent(layer=layer, vill_name=vill_name, extent=extent, centroid=centroid,
+                          area=area, feature_count=features)
+            for vill_name, (extent, centroid, area, features) in extents.items()])
+        updated = update_location_extents()
+    return {'villages': len(extents), 'locations': updated}
+
+
+def delete_layer_extents(layer):
+    """Drop the extents of a deleted layer, locations fall back to the remaining layers"""
+    with transaction.atomic():
+        if VillageExtent.objects.filter(layer=layer).delete()[0]:
+            update_location_extents()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from shp.locations import refresh_layer_extents
+from shp.models import Shp
+
+
+class Command(BaseCommand):
+    help = 'Record the extent and centroid of every village of the ingested layers and roll them up the location tree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layer', action='append', help='Only refresh this layer (repeatable)')
+
+    def handle(self, *args, **options):
+        layers = options.get('layer') or Shp.objects.order_by('name').values_list('name', flat=True).distinct()
+        for layer in layers:
+            counts = refresh_layer_extents(layer)
+            self.stdout.write(f"{layer}: {counts['villages']} villages, {counts['locations']} locations updated")
+        self.stdout.write(self.style.SUCCESS('Village extents are up to date'))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from shp.zonal_store import refresh
+
+
+class Command(BaseCommand):
+    help = 'Compute forest cover, elevation and slope per parcel, only for new or changed parcels and rasters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layer', action='append', help='Only refresh this layer (repeatable)')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'ZONAL_MAX_WORKERS', 4),
+                            help='Worker processes reading the rasters')
+        parser.add_argument('--full', action='store_true', help='Recompute every parcel')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        refreshed = refresh(layers=options.get('layer'), workers=options['workers'], full=options['full'])
+
+        for layer, counts in refreshed.items():
+            self.stdout.write(f"{layer}: {counts['computed']} of {counts['parcels']} parcels computed, "
+                              f"{counts['deleted']} removed")
+        computed = sum(counts['computed'] for counts in refreshed.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed {computed} parcels in {len(refreshed)} layers in {time.perf_counter() - start:.1f}s'))
@@ -1,10 +1,28 @@
 from django.core.management.base import BaseCommand
-from shp.models import Claimant
+from django.db import connections, transaction
+from shp.models import Claimant, ClaimantSource
+from shp.eligibility_store import deferred_refresh, schedule_refresh
+from shp.locations import village_location_id
+from shp.api_cache import bump_versions
+from shp.claimant_codes import CODE_FIELDS
+from shp.claimant_import import clean_record, column_max_lengths
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 import os
+import threading
+import time
 from django.conf import settings
 import glob
 
+# Rows per INSERT ... ON CONFLICT statement
+BATCH_SIZE = 1000
+
+# Columns rewritten when a claimant already exists in the village
+UPDATE_FIELDS = ['claimant_name', 'code_13_digit', 'claim_number', 'gat_number', 'area', 'taluka', 'district',
+                 'location'] + CODE_FIELDS
+
+
 class Command(BaseCommand):
     help = 'Populate claimants data from JSON files'
 
@@ -12,40 +30,97 @@ class Command(BaseCommand):
         parser.add_argument('--village', type=str, help='Specific village name')
         parser.add_argument('--json-file', type=str, help='Path to specific JSON file')
         parser.add_argument('--load-all', action='store_true', help='Load all village JSON files')
+        parser.add_argument('--workers', type=int, default=4, help='Files loaded in parallel by --load-all')
+        parser.add_argument('--force', action='store_true', help='Reload files whose content did not change')
+        parser.add_argument('--import-file', type=str,
+                            help='Stream a flat CSV or NDJSON file (optionally .gz) of claimants of any villages')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Format of --import-file, default from the extension')
+        parser.add_argument('--prune', action='store_true',
+                            help='With --import-file, delete claimants of the imported villages that are not in the file')
 
     def handle(self, *args, **options):
-        if options.get('load_all'):
-            self.load_all_villages()
-        elif options.get('json_file'):
-            self.load_from_file(options['json_file'])
-        elif options.get('village'):
-            self.load_village(options['village'])
-        else:
-            # Default: load hardcoded Pimpalgaon data
-            self.load_hardcoded_pimpalgaon()
+        self.force = options.get('force', False)
+        self.loaded_villages = set()
+        self.output_lock = threading.Lock()
+        # Eligibility of every loaded village is refreshed once, after its claimants are in
+        with deferred_refresh() as self.pending_refresh:
+            if options.get('import_file'):
+                self.import_flat_file(options['import_file'], options.get('format'), options.get('prune', False))
+            elif options.get('load_all'):
+                self.load_all_villages(options.get('workers') or 1)
+            elif options.get('json_file'):
+                self.load_from_file(options['json_file'])
+            elif options.get('village'):
+                self.load_village(options['village'])
+            else:
+                # Default: load hardcoded Pimpalgaon data
+                self.load_hardcoded_pimpalgaon()
+            # Bulk upserts send no post_save signals, schedule the refresh explicitly
+            for village_name in self.loaded_villages:
+                schedule_refresh(village_name)
+        # ... and do not bump the cached API responses either
+        if self.loaded_villages:
+            bump_versions(self.loaded_villages)
 
-    def load_all_villages(self):
-        """Load all JSON files from the villages directory"""
+    def write(self, message):
+        with self.output_lock:
+            self.stdout.write(message)
+
+    def load_all_villages(self, workers=1):
+        """Load all JSON files from the villages directory, several files at a time"""
         villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
         if not os.path.exists(villages_dir):
             self.stdout.write(self.style.ERROR(f'Villages directory not found: {villages_dir}'))
             return
 
-        json_files = glob.glob(os.path.join(villages_dir, '*.json'))
+        json_files = sorted(glob.glob(os.path.join(villages_dir, '*.json')))
         if not json_files:
             self.stdout.write(self.style.WARNING('No JSON files found in villages directory'))
             return
 
-        total_loaded = 0
-        for json_file in json_files:
-            try:
-                loaded_count = self.load_from_file(json_file)
-                total_loaded += loaded_count
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error loading {json_file}: {e}'))
+        # Every village is upserted in its own transaction, on the thread's own connection
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(json_files)))) as executor:
+            total_loaded = sum(executor.map(self.load_file_in_thread, json_files))
 
         self.stdout.write(self.style.SUCCESS(f'Successfully loaded {total_loaded} total claimants from {len(json_files)} villages'))
 
+    def load_file_in_thread(self, json_file):
+        try:
+            # The deferral is per thread, the workers add their villages to the command's one
+            with deferred_refresh(self.pending_refresh):
+                return self.load_from_file(json_file)
+        finally:
+            # Connections are per thread, do not leave the worker's one open
+            connections.close_all()
+
+    def import_flat_file(self, path, file_format=None, prune=False):
+        """Load a state-scale CSV/NDJSON export through COPY and one merge, reporting the throughput"""
+        from shp.claimant_import import import_claimants
+
+        start = time.perf_counter()
+        report = import_claimants(path, file_format, prune=prune)
+        elapsed = time.perf_counter() - start
+
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f'Rejected {error}'))
+        if report['rejected'] > len(report['errors']):
+            self.stdout.write(self.style.WARNING(f'... {report["rejected"] - len(report["errors"])} more rejected records'))
+        if report['malformed_codes']:
+            self.stdout.write(self.style.WARNING(
+                f'{report["malformed_codes"]} records have a malformed code_13_digit, see validate_claimant_codes'))
+        for village_name, counts in sorted(report['villages'].items()):
+            self.stdout.write(f'{village_name}: {counts["inserted"]} inserted, {counts["updated"]} updated, '
+                              f'{counts["pruned"]} removed')
+            self.loaded_villages.add(village_name)
+
+        rate = report['read'] / report['copy_seconds'] if report['copy_seconds'] else 0
+        self.stdout.write(f'Streamed {report["read"]} records ({report["rejected"]} rejected) in '
+                          f'{report["copy_seconds"]:.1f}s, {rate:,.0f} rows/s; merged in {report["merge_seconds"]:.1f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report["staged"]} claimants from {path} in {elapsed:.1f}s '
+            f'({report["staged"] / elapsed if elapsed else 0:,.0f} rows/s): {report["inserted"]} inserted, '
+            f'{report["updated"]} updated, {report["pruned"]} removed'))
+
     def load_village(self, village_name):
         """Load specific village by name"""
         villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
@@ -60,19 +135,31 @@ class Command(BaseCommand):
         self.load_from_file(json_file)
 
     def load_from_file(self, json_file):
-        """Load claimants data from a JSON file"""
+        """Load claimants data from a JSON file, unless it is unchanged since the last load"""
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                claimants_data = json.load(f)
-            
-            return self.create_claimants(claimants_data, json_file)
+            with open(json_file, 'rb') as f:
+                content = f.read()
+            source = os.path.relpath(os.path.abspath(json_file), settings.BASE_DIR)
+            digest = hashlib.sha256(content).hexdigest()
+            if not self.force and self.is_unchanged(source, digest):
+                self.write(f'Skipped {json_file}, unchanged since the last load')
+                return 0
+
+            claimants_data = json.loads(content.decode('utf-8'))
+            return self.create_claimants(claimants_data, json_file, source=source, digest=digest)
         except json.JSONDecodeError as e:
-            self.stdout.write(self.style.ERROR(f'Invalid JSON in {json_file}: {e}'))
+            self.write(self.style.ERROR(f'Invalid JSON in {json_file}: {e}'))
             return 0
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error reading {json_file}: {e}'))
+            self.write(self.style.ERROR(f'Error reading {json_file}: {e}'))
             return 0
 
+    def is_unchanged(self, source, digest):
+        """Same content as the last load, and the village still has the rows it loaded"""
+        loaded = ClaimantSource.objects.filter(path=source, sha256=digest).first()
+        return (loaded is not None and
+                Claimant.objects.filter(village_name=loaded.village_name).count() == loaded.claimant_count)
+
     def load_hardcoded_pimpalgaon(self):
         claimants_data = {
             "document_details": {
@@ -366,39 +453,56 @@ class Command(BaseCommand):
         }
 
         
-        self.create_claimants(claimants_data, "hardcoded")
-
-    def create_claimants(self, claimants_data, source):
-        """Create claimant records from data"""
-        village_name = claimants_data['document_details']['village_name']
-        
-        # Clear existing data for this village
-        existing_count = Claimant.objects.filter(village_name=village_name).count()
-        Claimant.objects.filter(village_name=village_name).delete()
-        
-        if existing_count > 0:
-            self.stdout.write(f'Cleared {existing_count} existing records for {village_name}')
+        claimants_json = json.dumps(claimants_data, sort_keys=True).encode('utf-8')
+        digest = hashlib.sha256(claimants_json).hexdigest()
+        if not self.force and self.is_unchanged('hardcoded', digest):
+            self.stdout.write('Skipped hardcoded data, unchanged since the last load')
+            return
+        self.create_claimants(claimants_data, "hardcoded", source='hardcoded', digest=digest)
 
-        # Create new claimant records
-        created_count = 0
+    def claimant_rows(self, claimants_data):
+        """Claimant objects of a JSON document, one per serial number (the last one wins)"""
+        details = claimants_data['document_details']
+        location_id = village_location_id(details['village_name'], details.get('taluka', ''), details.get('district', ''))
+        village = {'village_name': details['village_name'], 'taluka': details.get('taluka', ''),
+                   'district': details.get('district', '')}
+        max_lengths = column_max_lengths()
+        rows = {}
         for claimant_data in claimants_data['claimants']:
+            # Rejected here rather than by the database, which would roll back the whole village
             try:
-                claimant = Claimant.objects.create(
-                    serial_number=claimant_data['serial_number'],
-                    claimant_name=claimant_data['claimant_name'],
-                    code_13_digit=claimant_data['code_13_digit'],
-                    claim_number=claimant_data.get('claim_number'),
-                    gat_number=claimant_data.get('gat_number'),
-                    area=str(claimant_data['area']),
-                    village_name=claimants_data['document_details']['village_name'],
-                    taluka=claimants_data['document_details'].get('taluka', ''),
-                    district=claimants_data['document_details'].get('district', '')
-                )
-                created_count += 1
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error creating claimant {claimant_data.get("serial_number", "unknown")}: {e}'))
+                values = clean_record({**claimant_data, **village}, max_lengths)
+            except ValueError as e:
+                self.write(self.style.ERROR(f'Error creating claimant {claimant_data.get("serial_number", "unknown")}: {e}'))
+                continue
+            claimant = Claimant(location_id=location_id, **values)
+            if claimant.serial_number in rows:
+                self.write(self.style.WARNING(f'Duplicate serial number {claimant.serial_number} in {details["village_name"]}, keeping the last one'))
+            rows[claimant.serial_number] = claimant
+        return list(rows.values())
+
+    def create_claimants(self, claimants_data, source_label, source=None, digest=None):
+        """Upsert the claimant records of a village in one transaction"""
+        village_name = claimants_data['document_details']['village_name']
+        rows = self.claimant_rows(claimants_data)
+
+        # Readers see either the previous or the new village, never a partial one
+        with transaction.atomic():
+            Claimant.objects.bulk_create(
+                rows, batch_size=BATCH_SIZE, update_conflicts=True,
+                unique_fields=['serial_number', 'village_name'], update_fields=UPDATE_FIELDS)
+            _, deleted = (Claimant.objects.filter(village_name=village_name)
+                          .exclude(serial_number__in=[row.serial_number for row in rows]).delete())
+            removed = deleted.get('shp.Claimant', 0)
+            if source is not None:
+                ClaimantSource.objects.update_or_create(
+                    path=source,
+                    defaults={'village_name': village_name, 'sha256': digest, 'claimant_count': len(rows)})
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully created {created_count} claimant records for {village_name} from {source}')
+        self.loaded_villages.add(village_name)
+        if removed:
+            self.write(f'Removed {removed} records for {village_name} that are no longer in {source_label}')
+        self.write(
+            self.style.SUCCESS(f'Successfully loaded {len(rows)} claimant records for {village_name} from {source_label}')
         )
-        return created_count
+        return len(rows)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from shp.jobs import process_queued_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued shapefile ingest jobs in this process (e.g. after a restart)'
+
+    def handle(self, *args, **options):
+        count = process_queued_jobs()
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} queued ingest jobs'))
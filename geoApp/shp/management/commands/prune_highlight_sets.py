@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shp.highlights import prune_highlight_sets
+
+
+class Command(BaseCommand):
+    help = 'Delete highlight sets that have not been created or drawn for HIGHLIGHT_SET_TTL seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, help='Expire sets unused for this many seconds instead')
+
+    def handle(self, *args, **options):
+        count = prune_highlight_sets(options.get('ttl'))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} highlight sets'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from shp.eligibility_store import refresh_all, refresh_village
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized scheme eligibility of claimants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--village', type=str, help='Only refresh this village')
+
+    def handle(self, *args, **options):
+        if options.get('village'):
+            refreshed = {options['village']: refresh_village(options['village'])}
+        else:
+            refreshed = refresh_all()
+
+        for village_name, count in refreshed.items():
+            self.stdout.write(f'Refreshed eligibility of {count} claimants for {village_name}')
+        self.stdout.write(self.style.SUCCESS(f'Refreshed eligibility for {len(refreshed)} villages'))
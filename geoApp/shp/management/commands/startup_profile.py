@@ -0,0 +1,69 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# "import time: self [us] | cumulative | imported package", nesting shown by indentation
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$')
+
+# Run in a fresh interpreter. -X importtime does not see the app modules that django.setup()
+# loads through importlib, so the setup and each import are also timed as a whole.
+STARTUP_CODE = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+timings = [('django.setup()', time.perf_counter() - start)]
+for module in {modules!r}:
+    start = time.perf_counter()
+    __import__(module)
+    timings.append((module, time.perf_counter() - start))
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure the cold import time of django.setup() plus the URLconf, per module (python -X importtime)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', action='append', default=[],
+                            help='Also import this module, e.g. shp.ingest (repeatable)')
+        parser.add_argument('--limit', type=int, default=25, help='Number of modules to list')
+        parser.add_argument('--project', action='store_true', help='Only list the project apps and settings')
+
+    def handle(self, *args, **options):
+        modules = [settings.ROOT_URLCONF] + options['module']
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'geoApp.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE.format(modules=modules)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+
+        rows = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match:
+                self_us, cumulative_us, name = match.groups()
+                rows.append((int(cumulative_us), int(self_us), name))
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if not IMPORT_TIME.match(line)]
+            raise CommandError('Startup failed:\n' + '\n'.join(errors[-20:]))
+
+        for phase, seconds in json.loads(result.stdout.strip().splitlines()[-1]):
+            self.stdout.write(f'{seconds * 1000:>9.1f} ms  {phase}')
+        self.stdout.write('')
+
+        total, count = sum(self_us for _, self_us, _ in rows), len(rows)
+        if options['project']:
+            apps = {app.split('.')[0] for app in settings.INSTALLED_APPS if not app.startswith('django.')}
+            apps.add(settings.ROOT_URLCONF.split('.')[0])
+            rows = [row for row in rows if row[2].split('.')[0] in apps]
+
+        self.stdout.write(f'{"cumulative ms":>14} {"self ms":>9}  module')
+        for cumulative_us, self_us, name in sorted(rows, reverse=True)[:options['limit']]:
+            self.stdout.write(f'{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Import time seen by -X importtime: {total / 1000:.1f} ms over {count} modules'))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+from shp.claimant_codes import reparse_codes, validation_report
+from shp.models import Claimant
+
+
+class Command(BaseCommand):
+    help = 'Report claimants whose code_13_digit is malformed or names another village'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--village', action='append', help='Only check this village (repeatable)')
+        parser.add_argument('--reparse', action='store_true',
+                            help='Parse the stored codes into their component columns again first')
+        parser.add_argument('--json', type=str, help='Also write the full report to this JSON file')
+
+    def handle(self, *args, **options):
+        claimants = Claimant.objects.all()
+        if options.get('village'):
+            claimants = claimants.filter(village_name__in=options['village'])
+        if options['reparse']:
+            self.stdout.write(f'Re-parsed the codes of {reparse_codes(claimants)} claimants')
+
+        report = validation_report(claimants)
+        for problem in report['problems']:
+            self.stdout.write(self.style.WARNING(
+                f"{problem['village_name']} #{problem['serial_number']}: {problem['code_13_digit']!r} - {problem['problem']}"))
+        for reason, count in sorted(report['reasons'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'{count:6d}  {reason}')
+        if options.get('json'):
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Report written to {options['json']}")
+
+        problems = sum(report['reasons'].values())
+        style = self.style.SUCCESS if not problems else self.style.WARNING
+        self.stdout.write(style(f"Checked {report['checked']} codes: {report['valid']} well formed, "
+                                f"{report['malformed']} malformed, {problems} problems"))
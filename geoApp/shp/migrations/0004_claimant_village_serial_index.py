@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2025-09-10 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0003_alter_claimant_code_13_digit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claimant',
+            index=models.Index(fields=['village_name', 'serial_number'], name='shp_claim_village_serial_idx'),
+        ),
+    ]
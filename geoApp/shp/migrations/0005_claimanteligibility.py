@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2025-09-10 14:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0004_claimant_village_serial_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimantEligibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheme', models.CharField(max_length=30)),
+                ('eligible', models.BooleanField(default=False)),
+                ('priority', models.BooleanField(default=False)),
+                ('high_priority', models.BooleanField(default=False)),
+                ('estimated_family_size', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('estimated_age', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('claimant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eligibility', to='shp.claimant')),
+            ],
+            options={
+                'unique_together': {('scheme', 'claimant')},
+            },
+        ),
+    ]
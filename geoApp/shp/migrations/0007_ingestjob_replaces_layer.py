@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2025-09-12 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0006_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='replaces_layer',
+            field=models.BooleanField(default=False),
+        ),
+    ]
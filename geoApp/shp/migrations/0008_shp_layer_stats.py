@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2025-09-12 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0007_ingestjob_replaces_layer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shp',
+            name='feature_count',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shp',
+            name='extent',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shp',
+            name='srid',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
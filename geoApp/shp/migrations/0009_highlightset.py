@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2025-09-13 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0008_shp_layer_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HighlightSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('parcels', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2025-09-14 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0009_highlightset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParcelStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layer', models.CharField(max_length=50)),
+                ('vill_name', models.CharField(max_length=100)),
+                ('patta_id', models.IntegerField()),
+                ('forest_cover_fraction', models.FloatField(blank=True, null=True)),
+                ('mean_elevation', models.FloatField(blank=True, null=True)),
+                ('mean_slope', models.FloatField(blank=True, null=True)),
+                ('sources', models.JSONField(blank=True, default=dict)),
+                ('geometry_hash', models.CharField(max_length=32)),
+                ('rasters', models.JSONField(blank=True, default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('claimant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parcel_statistics', to='shp.claimant')),
+            ],
+            options={
+                'unique_together': {('layer', 'vill_name', 'patta_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2025-09-14 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0010_parcelstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimantSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('village_name', models.CharField(max_length=100)),
+                ('sha256', models.CharField(max_length=64)),
+                ('claimant_count', models.IntegerField(default=0)),
+                ('loaded_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2025-09-15 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_claimants(apps, schema_editor):
+    # One village node per distinct (village, taluka, district) of the existing claimants
+    Claimant = apps.get_model('shp', 'Claimant')
+    Location = apps.get_model('shp', 'Location')
+    villages = Claimant.objects.values_list('village_name', 'taluka', 'district').distinct()
+    for village_name, taluka, district in villages:
+        parent = None
+        for level, name in [('state', 'Maharashtra'), ('district', district or ''),
+                            ('taluka', taluka or ''), ('village', village_name)]:
+            parent, _ = Location.objects.get_or_create(parent=parent, level=level, name=name)
+        Claimant.objects.filter(village_name=village_name, taluka=taluka, district=district).update(location=parent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0011_claimantsource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('level', models.CharField(choices=[('state', 'State'), ('district', 'District'), ('taluka', 'Taluka'), ('village', 'Village')], max_length=10)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='shp.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'name'], name='shp_location_level_name_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('parent__isnull', True)), fields=('level', 'name'), name='shp_location_root_unique')],
+                'unique_together': {('parent', 'level', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='claimant',
+            name='location',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimants', to='shp.location'),
+        ),
+        migrations.RemoveIndex(
+            model_name='claimant',
+            name='shp_claim_village_serial_idx',
+        ),
+        migrations.AddIndex(
+            model_name='claimant',
+            index=models.Index(fields=['village_name', 'serial_number'], include=('claimant_name', 'code_13_digit', 'claim_number', 'gat_number', 'area'), name='shp_claim_village_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimant',
+            index=models.Index(fields=['location', 'serial_number'], name='shp_claim_location_serial_idx'),
+        ),
+        migrations.RunPython(link_claimants, migrations.RunPython.noop),
+    ]
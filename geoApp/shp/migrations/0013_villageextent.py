@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2025-09-15 14:20
+
+from django.db import migrations, models
+
+
+def set_layer_vill_names(apps, schema_editor):
+    # The one village of index.html's villageConfig whose layer name is not its name without spaces
+    Location = apps.get_model('shp', 'Location')
+    Location.objects.filter(level='village', name='Pimpalgaon Khu', vill_name='').update(vill_name='pimpalgaon')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0012_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='vill_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='extent',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='centroid',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='VillageExtent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layer', models.CharField(max_length=50)),
+                ('vill_name', models.CharField(max_length=100)),
+                ('extent', models.JSONField()),
+                ('centroid', models.JSONField()),
+                ('area', models.FloatField(default=0)),
+                ('feature_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('layer', 'vill_name')},
+            },
+        ),
+        migrations.RunPython(set_layer_vill_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2025-09-16 10:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0013_villageextent'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='claimant',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('claimant_name'), name='gin_trgm_ops'), name='shp_claim_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimant',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('claim_number'), name='gin_trgm_ops'), name='shp_claim_number_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimant',
+            index=django.db.models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('code_13_digit'), name='text_pattern_ops'), name='shp_claim_code_prefix_idx'),
+        ),
+    ]
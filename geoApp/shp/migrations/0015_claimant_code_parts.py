@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2025-09-16 15:40
+
+from django.db import migrations, models
+
+
+# The code layout as of this migration, shp.claimant_codes may change after it
+CODE_LAYOUT = 'DDDDLLLDDLLLD'
+CODE_PARTS = [
+    ('code_district', 0, 2),
+    ('code_taluka', 2, 4),
+    ('code_village', 4, 9),
+    ('code_initials', 9, 12),
+    ('code_suffix', 12, 13),
+]
+CODE_FIELDS = [field for field, _, _ in CODE_PARTS] + ['code_valid']
+BATCH_SIZE = 2000
+
+
+def well_formed(code):
+    return len(code) == len(CODE_LAYOUT) and all(
+        char.isdigit() if kind == 'D' else char.isascii() and char.isalpha() for char, kind in zip(code, CODE_LAYOUT))
+
+
+def parse_codes(apps, schema_editor):
+    Claimant = apps.get_model('shp', 'Claimant')
+    batch = []
+    for claimant in Claimant.objects.only('pk', 'code_13_digit').iterator(chunk_size=BATCH_SIZE):
+        code = ''.join(str(claimant.code_13_digit).split()).upper() if claimant.code_13_digit is not None else ''
+        # Malformed codes keep the blank components and code_valid False the columns start with
+        if not well_formed(code):
+            continue
+        for field, start, end in CODE_PARTS:
+            setattr(claimant, field, code[start:end])
+        claimant.code_valid = True
+        batch.append(claimant)
+        if len(batch) == BATCH_SIZE:
+            Claimant.objects.bulk_update(batch, CODE_FIELDS)
+            batch = []
+    Claimant.objects.bulk_update(batch, CODE_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0014_claimant_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claimant',
+            name='code_district',
+            field=models.CharField(blank=True, editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='claimant',
+            name='code_taluka',
+            field=models.CharField(blank=True, editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='claimant',
+            name='code_village',
+            field=models.CharField(blank=True, editable=False, max_length=5),
+        ),
+        migrations.AddField(
+            model_name='claimant',
+            name='code_initials',
+            field=models.CharField(blank=True, editable=False, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='claimant',
+            name='code_suffix',
+            field=models.CharField(blank=True, editable=False, max_length=1),
+        ),
+        migrations.AddField(
+            model_name='claimant',
+            name='code_valid',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='claimant',
+            index=models.Index(fields=['code_district', 'code_taluka', 'code_village', 'code_initials'], name='shp_claim_code_parts_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.RunPython(parse_codes, migrations.RunPython.noop),
+    ]
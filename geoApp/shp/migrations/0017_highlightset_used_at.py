@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2025-09-18 10:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shp', '0016_ingestjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='highlightset',
+            name='used_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
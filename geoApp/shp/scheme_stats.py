@@ -0,0 +1,111 @@
+from django.db.models import Count, F, Q
+
+from .eligibility import CLAIMANT_FIELDS, area_hectares, corpus_scheme_page
+from .models import ClaimantEligibility
+from .village_cache import village_corpus
+
+# Claimant rows rendered per page on the scheme pages
+PAGE_SIZE = 50
+
+STAT_FIELDS = ['total_claimants', 'eligible_claimants', 'priority_claimants', 'high_priority_claimants']
+
+_COUNTS = {
+    'total_claimants': Count('id'),
+    'eligible_claimants': Count('id', filter=Q(eligible=True)),
+    'priority_claimants': Count('id', filter=Q(priority=True)),
+    'high_priority_claimants': Count('id', filter=Q(high_priority=True)),
+}
+
+
+####################################################################################
+# Scheme statistics read from the materialized ClaimantEligibility table
+####################################################################################
+def village_statistics(scheme):
+    """Per-village total/eligible/priority counts for one scheme in a single grouped query"""
+    return list(
+        ClaimantEligibility.objects.filter(scheme=scheme)
+        .values(village_name=F('claimant__village_name'),
+                taluka=F('claimant__taluka'),
+                district=F('claimant__district'))
+        .annotate(**_COUNTS)
+        .order_by('village_name')
+    )
+
+
+def scheme_totals():
+    """Totals of every scheme in one grouped query, keyed by scheme"""
+    return {row.pop('scheme'): row
+            for row in ClaimantEligibility.objects.values('scheme').annotate(**_COUNTS).order_by()}
+
+
+def village_rows(scheme, village, offset, limit):
+    """Fetch only the requested slice of a village's precomputed claimant rows"""
+    rows = list(
+        ClaimantEligibility.objects.filter(scheme=scheme, claimant__village_name=village)
+        .order_by('claimant__serial_number')
+        .values('eligible', 'priority', 'high_priority', 'estimated_family_size', 'estimated_age',
+                'details', *[f'claimant__{field}' for field in CLAIMANT_FIELDS])[offset:offset + limit]
+    )
+    claimants = []
+    for row in rows:
+        claimant = {field: row.pop(f'claimant__{field}') for field in CLAIMANT_FIELDS}
+        claimant.update(row.pop('details'))
+        claimant.update(row)
+        claimants.append(claimant)
+    for claimant, area in zip(claimants, area_hectares([c['area'] for c in claimants])):
+        claimant['area'] = area
+    return claimants
+
+
+def _page_number(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def scheme_page(scheme, village=None, page=1, page_size=PAGE_SIZE):
+    """Statistics for every village plus one page of the selected village's claimants"""
+    villages = village_statistics(scheme)
+    materialized = {v['village_name'] for v in villages}
+    corpus_rows = None
+    # Villages whose eligibility is not materialized yet are read from the data/villages corpus
+    if any(document['document_details']['village_name'] not in materialized
+           for document in village_corpus.documents()):
+        corpus_villages, corpus_rows = corpus_scheme_page(scheme)
+        missing = [v for v in corpus_villages if v['village_name'] not in materialized]
+        villages = sorted(villages + missing, key=lambda v: v['village_name']) if villages else missing
+
+    names = [v['village_name'] for v in villages]
+    if village not in names:
+        village = names[0] if names else None
+
+    selected_total = next((v['total_claimants'] for v in villages
+                           if v['village_name'] == village), 0)
+    num_pages = max((selected_total + page_size - 1) // page_size, 1)
+    page = min(_page_number(page), num_pages)
+    offset = (page - 1) * page_size
+
+    rows = []
+    if village is not None:
+        if village in materialized:
+            rows = village_rows(scheme, village, offset, page_size)
+        elif corpus_rows is not None:
+            rows = corpus_rows(village, offset, page_size)
+
+    for v in villages:
+        v['selected'] = v['village_name'] == village
+        v['claimants'] = rows if v['selected'] else []
+
+    context = {field: sum(v[field] for v in villages) for field in STAT_FIELDS}
+    context.update({
+        'villages_data': villages,
+        'selected_village': village,
+        'page': page,
+        'num_pages': num_pages,
+        'has_previous': page > 1,
+        'has_next': page < num_pages,
+        'previous_page': page - 1,
+        'next_page': page + 1,
+    })
+    return context
@@ -1,3 +1,704 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .claimant_codes import code_parts, code_problem, normalize_code
+from .claimant_import import clean_record, column_max_lengths
+from . import claimant_api, eligibility, eligibility_store, highlights, jobs, zonal_store
+from .api_cache import GLOBAL_SCOPE, bump_versions, data_version, location_scope, versioned_response
+from .eligibility import SCHEMES, build_claimant_frame, evaluate_records, evaluate_scheme
+from .locations import forget_village_location_ids, village_location_id
+from .models import Claimant, ClaimantEligibility, HighlightSet, IngestJob, Location, ParcelStatistics
+from .scheme_stats import scheme_page
+from .tile_cache import DiskTileCache, cached_getmap, normalize_getmap
+from .village_cache import VillageCorpusCache, village_corpus
+
+
+####################################################################################
+# Per-claimant rules of the original scheme views, the reference for shp.eligibility
+####################################################################################
+SC_ST = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye',
+         'deshmukh']
+WOMEN = ['bai', 'ya', 'i']
+
+
+def reference_flags(claimant, scheme):
+    try:
+        area = float(claimant.get('area', 0))
+    except (ValueError, TypeError):
+        area = 0
+    name_lower = claimant.get('claimant_name', '').lower()
+    sc_st = any(indicator in name_lower for indicator in SC_ST)
+    woman = any(name_lower.endswith(indicator) for indicator in WOMEN)
+    no_claim = not claimant.get('claim_number') or claimant.get('claim_number') == 'null'
+    no_gat = not claimant.get('gat_number') or claimant.get('gat_number') == 'null'
+    flags = {'eligible': True, 'priority': False, 'high_priority': False}
+
+    if scheme == 'pm_kisan':
+        flags['eligible'] = area <= 2.0
+    elif scheme == 'mgnrega':
+        flags['priority'] = area <= 2.0 or sc_st or woman
+    elif scheme == 'pm_jai_jeevan':
+        flags['priority'] = area <= 2.0
+        flags['high_priority'] = sc_st or woman or area <= 1.0 or no_gat
+    elif scheme == 'pm_ayushman':
+        flags['priority'] = area <= 2.0
+        flags['high_priority'] = sc_st or woman or area <= 1.0 or no_claim
+        family_size = 6 if area <= 1.0 else 5 if area <= 2.0 else 4
+        flags['estimated_family_size'] = family_size + (1 if sc_st else 0)
+    elif scheme == 'pm_kaushal':
+        serial = claimant.get('serial_number', 1)
+        age = 25 + serial % 20
+        if woman:
+            age = 22 + serial % 18
+        if sc_st:
+            age = 24 + serial % 19
+        eligible = 15 <= age <= 45
+        flags.update(estimated_age=age, eligible=eligible, priority=eligible and area <= 2.0,
+                     high_priority=eligible and (sc_st or woman or area <= 1.0 or 18 <= age <= 30))
+    elif scheme == 'digital_india':
+        readiness = 'Basic'
+        if area <= 2.0:
+            flags['priority'], readiness = True, 'Medium'
+        if sc_st:
+            readiness = 'High'
+        if woman and readiness == 'Basic':
+            readiness = 'Medium'
+        if area <= 1.0 or no_claim:
+            readiness = 'High'
+        if no_gat and readiness == 'Basic':
+            readiness = 'Medium'
+        flags['high_priority'] = sc_st or woman or area <= 1.0 or no_claim or no_gat
+        flags['digital_readiness'] = {'Basic': 'Basic - Needs Digital Literacy',
+                                      'Medium': 'Medium - Ready for Digital Services',
+                                      'High': 'High - Priority for Digital Inclusion'}[readiness]
+    elif scheme == 'startup_india':
+        try:
+            serial = int(claimant.get('serial_number', '1'))
+            if serial <= 50:
+                age = 50 - (serial * 0.4)
+            elif serial <= 100:
+                age = 40 - ((serial - 50) * 0.3)
+            else:
+                age = 35 - ((serial - 100) * 0.2)
+            age = max(18, min(65, int(age)))
+        except (ValueError, TypeError):
+            age = 35
+        eligible = 18 <= age <= 45
+        potential = 'Limited'
+        if area <= 2.0 and eligible:
+            potential = 'Good'
+        if eligible and (sc_st or area <= 1.0 or 18 <= age <= 30 or no_claim):
+            potential = 'Excellent'
+        elif eligible and woman and potential == 'Limited':
+            potential = 'Good'
+        group, phase = ('Young Adult', 'Early Stage') if 18 <= age <= 30 else \
+            ('Adult', 'Growth Stage') if 31 <= age <= 40 else \
+            ('Experienced', 'Expansion Stage') if 41 <= age <= 45 else ('Senior', 'Mature')
+        flags.update(estimated_age=age, eligible=eligible, priority=eligible and area <= 2.0,
+                     high_priority=eligible and (sc_st or woman or area <= 1.0 or 18 <= age <= 30 or no_claim),
+                     startup_potential={'Limited': 'Limited - Focus on Traditional Skills',
+                                        'Good': 'Good - Agri-Tech & Rural Business Potential',
+                                        'Excellent': 'Excellent - High Startup Potential'}[potential],
+                     age_group=group, startup_phase=phase)
+    return flags
+
+
+# Rows around every threshold of the rules: areas at 1 and 2 hectares, unparseable areas,
+# missing claim/gat numbers and the serial numbers where the estimated ages change
+EDGE_CLAIMANTS = [
+    {'serial_number': serial, 'claimant_name': name, 'code_13_digit': '0203PIM01SSD0',
+     'claim_number': claim, 'gat_number': gat, 'area': area}
+    for serial, name, claim, gat, area in [
+        (1, 'Yelu Bala Pawar', '1780', '444', 2.18),
+        (2, 'Sitabai Ramu Bhoye', None, '12', 1.0),
+        (50, 'Kamli Devram Gavit', 'null', '', 2.0),
+        (51, 'Ramesh Kashinath Jadhav', '17', 'null', '1.5'),
+        (100, 'Parvati Shankar Malche', '18', '19', 'Illegible'),
+        (101, 'Suresh Vitthal More', '20', '21', None),
+        (186, 'Gangubai Deshmukh', '', '22', 3),
+        (240, 'Rajya', '23', '24', 0),
+    ]
+]
+
+
+class EligibilityEngineTests(SimpleTestCase):
+    """The vectorized scheme rules give the flags of the original per-claimant loops"""
+
+    def assertMatchesReference(self, claimants, rows, scheme):
+        self.assertEqual(len(claimants), len(rows))
+        for claimant, row in zip(claimants, rows):
+            for flag, expected in reference_flags(claimant, scheme).items():
+                self.assertEqual(row[flag], expected, f'{scheme} {flag} of {claimant}')
+
+    def test_edge_claimants(self):
+        for scheme in SCHEMES:
+            with self.subTest(scheme=scheme):
+                self.assertMatchesReference(EDGE_CLAIMANTS, evaluate_records(EDGE_CLAIMANTS, scheme), scheme)
+
+    def test_unparsed_values(self):
+        # A "nan" area is within no threshold, a fractional serial string gets the default startup age
+        claimants = [dict(EDGE_CLAIMANTS[1], area='nan'), dict(EDGE_CLAIMANTS[2], area=float('nan'))]
+        for scheme in SCHEMES:
+            with self.subTest(scheme=scheme):
+                self.assertMatchesReference(claimants, evaluate_records(claimants, scheme), scheme)
+        claimants = [dict(EDGE_CLAIMANTS[0], serial_number='5.5'), dict(EDGE_CLAIMANTS[0], serial_number='7')]
+        rows = evaluate_records(claimants, 'startup_india')
+        self.assertMatchesReference(claimants, rows, 'startup_india')
+        self.assertEqual([row['estimated_age'] for row in rows], [35, 47])
+
+    def test_village_corpus(self):
+        documents = village_corpus.documents()
+        claimants = [claimant for document in documents for claimant in document['claimants']]
+        self.assertTrue(claimants)
+        frame = build_claimant_frame(documents)
+        for scheme in SCHEMES:
+            with self.subTest(scheme=scheme):
+                rows = evaluate_scheme(frame, scheme).to_dict('records')
+                self.assertMatchesReference(claimants, rows, scheme)
+
+
+class CountingCorpusCache(VillageCorpusCache):
+    def __init__(self, directory, max_claimants=None):
+        super().__init__(directory, max_claimants)
+        self.parses = 0
+
+    def _load(self, path):
+        self.parses += 1
+        return super()._load(path)
+
+
+class VillageCorpusCacheTests(SimpleTestCase):
+    """Each village file is parsed once and again only after it changes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for index in range(4):
+            self.write(f'village{index}.json', f'Village {index}')
+        self.cache = CountingCorpusCache(self.directory.name)
+
+    def write(self, filename, village_name, mtime_ns=None, claimants=()):
+        path = os.path.join(self.directory.name, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'document_details': {'village_name': village_name}, 'claimants': list(claimants)}, f)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_repeated_snapshots_parse_each_file_once(self):
+        for _ in range(3):
+            _, documents = self.cache.snapshot()
+        self.assertEqual(len(documents), 4)
+        self.assertEqual(self.cache.parses, 4)
+
+    def test_changed_added_and_removed_files(self):
+        self.cache.snapshot()
+        self.write('village1.json', 'Village 1 renamed', mtime_ns=10 ** 18)
+        self.write('village4.json', 'Village 4')
+        os.remove(os.path.join(self.directory.name, 'village0.json'))
+        _, documents = self.cache.snapshot()
+        self.assertEqual(self.cache.parses, 6)
+        self.assertEqual([document['document_details']['village_name'] for document in documents],
+                         ['Village 1 renamed', 'Village 2', 'Village 3', 'Village 4'])
+
+    def test_frame_is_built_once_per_corpus_state(self):
+        builds = []
+        for _ in range(3):
+            self.cache.frame(lambda documents: builds.append(len(documents)))
+        self.assertEqual(builds, [4])
+        self.assertEqual(self.cache.parses, 4)
+
+    def test_files_past_the_bound_are_not_kept(self):
+        for index in range(4):
+            self.write(f'village{index}.json', f'Village {index}', claimants=[EDGE_CLAIMANTS[0]])
+        cache = CountingCorpusCache(self.directory.name, max_claimants=2)
+        builds = []
+        for _ in range(3):
+            documents, _ = cache.frame(lambda documents: builds.append(len(documents)))
+        self.assertEqual(len(documents), 4)
+        # All four files once, then only the two past the bound on each read
+        self.assertEqual(cache.parses, 8)
+        self.assertEqual(builds, [4, 4, 4])
+
+    def test_broken_files_are_parsed_again_only_after_a_change(self):
+        path = os.path.join(self.directory.name, 'village9.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"document_details": ')
+        with self.assertLogs('shp.village_cache', 'ERROR') as logs:
+            for _ in range(3):
+                _, documents = self.cache.snapshot()
+        self.assertEqual((len(documents), self.cache.parses, len(logs.output)), (4, 5, 1))
+        self.write('village9.json', 'Village 9', mtime_ns=10 ** 18)
+        _, documents = self.cache.snapshot()
+        self.assertEqual((len(documents), self.cache.parses), (5, 6))
+
+
+GETMAP = {'SERVICE': 'WMS', 'REQUEST': 'GetMap', 'LAYERS': 'geoapp:parcels', 'FORMAT': 'image/png',
+          'BBOX': '73.1,20.2,73.3,20.4', 'WIDTH': '256', 'HEIGHT': '256', 'SRS': 'EPSG:4326'}
+
+
+class NormalizeGetMapTests(SimpleTestCase):
+    """One cache key per tile, whatever the client's spelling of the query"""
+
+    def test_spelling_order_and_cache_busters_share_a_key(self):
+        layers, key, content_type = normalize_getmap(GETMAP)
+        self.assertEqual((layers, content_type), (['parcels'], 'image/png'))
+        respelled = {name.lower(): value for name, value in reversed(list(GETMAP.items()))}
+        respelled.update(request='getmap', srs='epsg:4326', bbox='73.1000000001,20.2,73.3,20.4', _='123')
+        self.assertEqual(normalize_getmap(respelled)[1], key)
+
+    def test_different_tiles_get_different_keys(self):
+        key = normalize_getmap(GETMAP)[1]
+        self.assertNotEqual(normalize_getmap({**GETMAP, 'BBOX': '73.3,20.2,73.5,20.4'})[1], key)
+        self.assertNotEqual(normalize_getmap({**GETMAP, 'CQL_FILTER': "vill_name='jambhore'"})[1], key)
+        self.assertEqual(normalize_getmap({**GETMAP, 'LAYERS': 'geoapp:a, b'})[0], ['a', 'b'])
+
+    def test_uncacheable_queries(self):
+        self.assertIsNone(normalize_getmap({**GETMAP, 'SLD_BODY': '<StyledLayerDescriptor/>'}))
+        self.assertIsNone(normalize_getmap({**GETMAP, 'REQUEST': 'GetFeatureInfo'}))
+        self.assertIsNone(normalize_getmap({**GETMAP, 'FORMAT': 'application/pdf'}))
+        self.assertIsNone(normalize_getmap({**GETMAP, 'LAYERS': ''}))
+
+
+class DiskTileCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = DiskTileCache(self.directory, max_bytes=1024 * 1024)
+
+    def test_invalidate_drops_the_layer_tiles(self):
+        generation = self.cache.generation(['parcels'])
+        self.cache.put(['parcels'], generation, 'ab12', 'image/png', b'old')
+        self.cache.put(['forest'], self.cache.generation(['forest']), 'ab12', 'image/png', b'forest')
+        self.assertEqual(self.cache.get(['parcels'], generation, 'ab12'), ('image/png', b'old'))
+
+        self.cache.invalidate('geoapp:parcels')
+        self.assertIsNone(self.cache.get(['parcels'], self.cache.generation(['parcels']), 'ab12'))
+        self.assertEqual(self.cache.get(['forest'], self.cache.generation(['forest']), 'ab12'),
+                         ('image/png', b'forest'))
+        self.assertEqual(self.cache.size(), len(b'forest'))
+
+    def test_tile_rendered_before_an_invalidation_is_not_served(self):
+        # GetMap misses, reads the generation and renders from the old table...
+        generation = self.cache.generation(['parcels'])
+        # ...while the re-upload swaps the table in and invalidates the layer
+        self.cache.invalidate('parcels')
+        self.cache.put(['parcels'], generation, 'ab12', 'image/png', b'old')
+        self.assertIsNone(self.cache.get(['parcels'], self.cache.generation(['parcels']), 'ab12'))
+
+        generation = self.cache.generation(['parcels'])
+        self.cache.put(['parcels'], generation, 'ab12', 'image/png', b'new')
+        self.assertEqual(self.cache.get(['parcels'], generation, 'ab12'), ('image/png', b'new'))
+
+    def test_processes_share_the_size_limit(self):
+        # Two web processes on one directory, each storing less than the limit
+        first, second = DiskTileCache(self.directory, 1000), DiskTileCache(self.directory, 1000)
+        generation = first.generation(['parcels'])
+        for index in range(4):
+            first.put(['parcels'], generation, f'a{index}', 'image/png', b'x' * 200)
+        first.get(['parcels'], generation, 'a0')
+        with mock.patch('shp.tile_cache.time.time', return_value=time.time() + 3600):
+            first.get(['parcels'], generation, 'a0')
+            second.put(['parcels'], generation, 'b0', 'image/png', b'x' * 300)
+        # 1100 bytes in total, the least recently used tiles go until at most 900 are left
+        self.assertEqual(second.size(), 900)
+        self.assertIsNone(first.get(['parcels'], generation, 'a1'))
+        self.assertIsNotNone(first.get(['parcels'], generation, 'a0'))
+        self.assertIsNotNone(first.get(['parcels'], generation, 'a2'))
+        self.assertIsNotNone(first.get(['parcels'], generation, 'b0'))
+
+    def test_hits_have_the_upstream_content_type(self):
+        query = {**GETMAP, 'FORMAT': 'image/png8'}
+        with mock.patch('shp.tile_cache.tile_cache', self.cache), \
+                mock.patch('shp.tile_cache.fetch_wms', return_value=(200, 'image/png', b'tile')) as fetch:
+            self.assertEqual(cached_getmap(query), (200, 'image/png', b'tile', 'MISS'))
+            self.assertEqual(cached_getmap(query), (200, 'image/png', b'tile', 'HIT'))
+        self.assertEqual(fetch.call_count, 1)
+
+
+class PopulateClaimantsTests(TestCase):
+    """A claimant the database would refuse is skipped, the rest of its village loads"""
+
+    def test_invalid_claimants_are_reported_and_skipped(self):
+        claimants = [dict(claimant, serial_number=serial) for serial, claimant in enumerate(EDGE_CLAIMANTS[:4], 1)]
+        claimants[1]['claimant_name'] = 'X' * 201
+        claimants[2]['code_13_digit'] = None
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'document_details': {'village_name': 'Testgaon', 'taluka': 'Sakri', 'district': 'Dhule'},
+                       'claimants': claimants}, f)
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('populate_claimants', json_file=f.name, stdout=out)
+        self.assertEqual(list(Claimant.objects.filter(village_name='Testgaon').order_by('serial_number')
+                              .values_list('serial_number', flat=True)), [1, 4])
+        self.assertIn('Error creating claimant 2: claimant_name is longer than 200 characters', out.getvalue())
+        self.assertIn('Error creating claimant 3: code_13_digit is missing', out.getvalue())
+
+
+RECORD = {'serial_number': '7', 'claimant_name': ' Sitabai Ramu Bhoye ', 'code_13_digit': '0203PIM01SRB0',
+          'claim_number': '', 'gat_number': '12', 'area': '1.5', 'village_name': 'Pimpalgaon Khu',
+          'taluka': 'Sakri', 'district': None}
+
+
+class CleanRecordTests(SimpleTestCase):
+    """Flat export records become Claimant column values or a ValueError naming the problem"""
+
+    def test_values(self):
+        values = clean_record(RECORD, column_max_lengths())
+        self.assertEqual(values['serial_number'], 7)
+        self.assertEqual(values['claimant_name'], 'Sitabai Ramu Bhoye')
+        self.assertIsNone(values['claim_number'])
+        self.assertEqual((values['gat_number'], values['area'], values['district']), ('12', '1.5', ''))
+        self.assertEqual(clean_record({**RECORD, 'serial_number': 7.0}, column_max_lengths())['serial_number'], 7)
+
+    def test_rejected_records(self):
+        for change, problem in [
+            ({'serial_number': ''}, 'serial_number is missing'),
+            ({'serial_number': 'seven'}, 'serial_number is not a number'),
+            ({'serial_number': '7.5'}, 'serial_number is not a whole number'),
+            ({'code_13_digit': None}, 'code_13_digit is missing'),
+            ({'claimant_name': 'X' * 201}, 'claimant_name is longer than 200 characters'),
+            ({'claim_number': '1' * 21}, 'claim_number is longer than 20 characters'),
+        ]:
+            with self.subTest(change=change), self.assertRaisesMessage(ValueError, problem):
+                clean_record({**RECORD, **change}, column_max_lengths())
+
+
+class ClaimantSaveTests(TestCase):
+    """Saving a claimant again reuses its village node and stored village"""
+
+    def setUp(self):
+        # Remembered ids outlive the test transaction, which is rolled back
+        self.addCleanup(forget_village_location_ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.claimant = Claimant.objects.create(**{**EDGE_CLAIMANTS[0], 'serial_number': 1,
+                                                       'village_name': 'Testgaon'})
+
+    def test_save_again(self):
+        self.assertEqual(self.claimant.location.name, 'Testgaon')
+        self.claimant.area = '2.0'
+        with self.assertNumQueries(1):
+            self.claimant.save()
+        claimant = Claimant.objects.get(pk=self.claimant.pk)
+        with self.assertNumQueries(1):
+            claimant.save()
+
+    def test_move_to_another_village(self):
+        version = data_version('Testgaon')
+        self.claimant.village_name = 'Othergaon'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.claimant.save()
+        self.assertNotEqual(data_version('Testgaon'), version)
+        self.assertEqual(Location.objects.get(pk=self.claimant.location_id).name, 'Othergaon')
+
+    def test_location_changes_forget_the_ids(self):
+        Location.objects.filter(pk=self.claimant.location_id).update(name='Renamed')
+        Location.objects.get(pk=self.claimant.location_id).save()
+        self.claimant.save()
+        self.assertEqual(Location.objects.get(pk=self.claimant.location_id).name, 'Testgaon')
+
+    def test_location_changes_of_other_processes(self):
+        # Another process deletes the village node, only its version bump reaches this one
+        Location.objects.filter(pk=self.claimant.location_id).update(name='Renamed')
+        bump_versions([], locations=True, location_ids=True)
+        self.claimant.save()
+        self.assertEqual(Location.objects.get(pk=self.claimant.location_id).name, 'Testgaon')
+
+
+class VersionedResponseTests(SimpleTestCase):
+    """Query strings that differ in any value get their own cache entry"""
+
+    def test_query_keys(self):
+        view = versioned_response(lambda request: GLOBAL_SCOPE)(lambda request: JsonResponse(dict(request.GET.lists())))
+        factory = RequestFactory()
+
+        def etag(query):
+            return view(factory.get('/api/test/?' + query))['ETag']
+
+        self.assertEqual(etag('b=2&a=1'), etag('a=1&b=2'))
+        self.assertNotEqual(etag('a=1&a=2'), etag('a=2'))
+        self.assertNotEqual(etag('q=x%26b%3Dy'), etag('q=x&b=y'))
+
+
+class ClaimantPagesTests(TestCase):
+    """Keyset pages of /api/claimants/ cover a village once, in serial number order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create skips the save signals, the pages only read the Claimant rows
+        Claimant.objects.bulk_create([Claimant(**{**claimant, 'serial_number': serial, 'village_name': 'Testgaon'})
+                                      for serial, claimant in enumerate(EDGE_CLAIMANTS[:5], 1)])
+        Claimant.objects.create(**{**EDGE_CLAIMANTS[0], 'village_name': 'Othergaon'})
+
+    def page(self, **params):
+        return json.loads(''.join(claimant_api.claimant_chunks('Testgaon', claimant_api.parse_query(params))))
+
+    def test_walk_the_pages(self):
+        # Pages that end inside and at the edge of a fetched chunk
+        for chunk, limit in [(2000, 2), (2, 3), (2, 2)]:
+            with self.subTest(chunk=chunk, limit=limit), mock.patch.object(claimant_api, 'STREAM_CHUNK', chunk):
+                serials, after = [], None
+                while True:
+                    page = self.page(limit=str(limit), **({'after': str(after)} if after is not None else {}))
+                    self.assertEqual(page['count'], len(page['claimants']))
+                    self.assertLessEqual(page['count'], limit)
+                    serials += [claimant['serial_number'] for claimant in page['claimants']]
+                    after = page['next']
+                    if after is None:
+                        break
+                    self.assertEqual(after, serials[-1])
+                self.assertEqual(serials, [1, 2, 3, 4, 5])
+
+    def test_columnar(self):
+        page = self.page(format='columnar', fields='area,claimant_name', limit='2', after='1')
+        self.assertEqual(page['fields'], ['serial_number', 'area', 'claimant_name'])
+        self.assertEqual(page['columns']['serial_number'], [2, 3])
+        self.assertEqual(page['columns']['claimant_name'], [claimant['claimant_name']
+                                                            for claimant in EDGE_CLAIMANTS[1:3]])
+        self.assertEqual((page['count'], page['next']), (2, 3))
+        last = self.page(format='columnar', after='3')
+        self.assertEqual((last['columns']['serial_number'], last['count'], last['next']), ([4, 5], 2, None))
+
+    def test_columnar_spooled_columns(self):
+        # Columns written over several chunks, rolled over to disk and read back in pieces
+        with mock.patch.object(claimant_api, 'STREAM_CHUNK', 2), \
+                mock.patch.object(claimant_api, 'COLUMN_SPOOL_SIZE', 8):
+            page = self.page(format='columnar', fields='claimant_name,area')
+            empty = self.page(format='columnar', fields='area', after='5')
+        self.assertEqual(page['columns']['serial_number'], [1, 2, 3, 4, 5])
+        self.assertEqual(page['columns']['claimant_name'],
+                         [claimant['claimant_name'] for claimant in EDGE_CLAIMANTS[:5]])
+        self.assertEqual(len(page['columns']['area']), 5)
+        self.assertEqual((empty['columns'], empty['count']), ({'serial_number': [], 'area': []}, 0))
+
+    def test_legacy(self):
+        page = self.page()
+        self.assertEqual(page['serial_numbers'], [1, 2, 3, 4, 5])
+        self.assertNotIn('next', page)
+
+    def test_bad_queries(self):
+        for params, problem in [
+            ({'fields': 'serial_number,phone'}, 'Unknown fields: phone'),
+            ({'format': 'csv'}, "Unknown format: 'csv'"),
+            ({'limit': '0'}, 'limit must be at least 1'),
+            ({'after': 'x'}, "after must be an integer: 'x'"),
+        ]:
+            with self.subTest(params=params), self.assertRaisesMessage(ValueError, problem):
+                claimant_api.parse_query(params)
+
+
+class LocationScopeTests(TestCase):
+    """Claimant changes expire the responses of the locations above their village only"""
+
+    def test_bump_villages(self):
+        village = Location.objects.get(pk=village_location_id('Testgaon', 'Sakri', 'Dhule'))
+        other = Location.objects.get(pk=village_location_id('Othergaon', 'Shirpur', 'Dhule'))
+        above = [village, village.parent, village.parent.parent, village.parent.parent.parent]
+        versions = {location.pk: data_version(location_scope(location.pk)) for location in above + [other]}
+        bump_versions(['Testgaon'])
+        for location in above:
+            self.assertNotEqual(data_version(location_scope(location.pk)), versions[location.pk])
+        self.assertEqual(data_version(location_scope(other.pk)), versions[other.pk])
+
+    def test_search_view(self):
+        from .views import search_claimants
+        location_id = village_location_id('Testgaon', 'Sakri', 'Dhule')
+        request = RequestFactory().get('/api/claimants/search/', {'q': 'walvi', 'location': location_id})
+        with mock.patch('shp.claimant_search.search_claimants', return_value=([], 1.5)) as search:
+            response = search_claimants(request)
+            self.assertEqual((response['X-Api-Cache'], response['Server-Timing']), ('MISS', 'search;dur=1.5'))
+            self.assertNotIn('elapsed_ms', json.loads(response.content))
+            bump_versions(['Othergaon'])
+            response = search_claimants(RequestFactory().get(request.get_full_path()))
+            self.assertEqual(response['X-Api-Cache'], 'HIT')
+            self.assertNotIn('Server-Timing', response)
+            bump_versions(['Testgaon'])
+            self.assertEqual(search_claimants(RequestFactory().get(request.get_full_path()))['X-Api-Cache'], 'MISS')
+        self.assertEqual(search.call_count, 2)
+
+
+class ClaimantCodeTests(SimpleTestCase):
+    """13-digit codes split into their components, malformed ones say why"""
+
+    def test_normalize(self):
+        self.assertEqual(normalize_code(' 0203 pim01ssd0\n'), '0203PIM01SSD0')
+        self.assertEqual(normalize_code(None), '')
+        self.assertEqual(normalize_code(203), '203')
+
+    def test_problems(self):
+        self.assertIsNone(code_problem('0203pim01ssd0'))
+        self.assertIsNone(code_problem('0203PI', prefix=True))
+        for code, problem in [
+            ('', 'missing'),
+            (None, 'missing'),
+            ('0203PIM01SSD', '12 characters, expected 13'),
+            ('0203PIM01SSD00', '14 characters, expected 13'),
+            ('0203P1M01SSD0', "position 6: expected a letter, found '1'"),
+            ('0203PIMO1SSD0', "position 8: expected a digit, found 'O'"),
+            ('0203PÉM01SSD0', "position 6: expected a letter, found 'É'"),
+        ]:
+            with self.subTest(code=code):
+                self.assertEqual(code_problem(code), problem)
+        self.assertEqual(code_problem('02O', prefix=True), "position 3: expected a digit, found 'O'")
+
+    def test_parts(self):
+        self.assertEqual(code_parts(' 0203pim01ssd0'), {
+            'code_district': '02', 'code_taluka': '03', 'code_village': 'PIM01', 'code_initials': 'SSD',
+            'code_suffix': '0', 'code_valid': True})
+        self.assertEqual(code_parts('0203PIM01SSD'), {
+            'code_district': '', 'code_taluka': '', 'code_village': '', 'code_initials': '',
+            'code_suffix': '', 'code_valid': False})
+
+
+class CodePartsMigrationTests(TestCase):
+    """The backfill of 0015 parses codes like shp.claimant_codes, across its batches"""
+
+    def test_backfill(self):
+        migration = importlib.import_module('shp.migrations.0015_claimant_code_parts')
+        codes = ['0203PIM01SSD0', '0203pim01ssd1 ', '0203PIM01SSD', '0204KAD02RBP3', 'Illegible']
+        # bulk_create skips the pre_save parsing, the rows start as the migration finds them
+        Claimant.objects.bulk_create([Claimant(serial_number=serial, claimant_name='Test', code_13_digit=code,
+                                               area='1', village_name='Testgaon')
+                                      for serial, code in enumerate(codes, 1)])
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.parse_codes(apps, None)
+        rows = Claimant.objects.filter(village_name='Testgaon').order_by('serial_number')
+        self.assertEqual([{field: getattr(claimant, field) for field in migration.CODE_FIELDS} for claimant in rows],
+                         [code_parts(code) for code in codes])
+
+
+class SchemePageTests(TestCase):
+    """Scheme pages before the eligibility is materialized read the village corpus"""
+
+    def test_corpus_is_evaluated_once(self):
+        documents = village_corpus.documents()
+        village = documents[0]['document_details']['village_name']
+        with mock.patch.object(eligibility, 'evaluate_scheme', wraps=eligibility.evaluate_scheme) as evaluate:
+            context = scheme_page('pm_kisan', village, page=2, page_size=3)
+        self.assertEqual(evaluate.call_count, 1)
+        self.assertEqual(len(context['villages_data']), len(documents))
+        selected = next(v for v in context['villages_data'] if v['selected'])
+        self.assertEqual(selected['total_claimants'], len(documents[0]['claimants']))
+        self.assertEqual([row['serial_number'] for row in selected['claimants']],
+                         [claimant['serial_number'] for claimant in documents[0]['claimants'][3:6]])
+
+
+class EligibilityRefreshTests(TestCase):
+    """Saved and deleted claimants refresh their village once, not once per claimant"""
+
+    def setUp(self):
+        self.addCleanup(forget_village_location_ids)
+
+    def test_one_refresh_per_transaction(self):
+        with mock.patch.object(eligibility_store, 'refresh_village') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for serial, claimant in enumerate(EDGE_CLAIMANTS[:4], 1):
+                    Claimant.objects.create(**{**claimant, 'serial_number': serial, 'village_name': 'Testgaon'})
+                Claimant.objects.filter(serial_number__gt=2).delete()
+            self.assertEqual(refresh.call_args_list, [mock.call('Testgaon')])
+            with self.captureOnCommitCallbacks(execute=True):
+                Claimant.objects.filter(village_name='Testgaon').delete()
+            self.assertEqual(refresh.call_count, 2)
+
+    def test_worker_threads_join_the_deferral(self):
+        def worker(pending):
+            with eligibility_store.deferred_refresh(pending):
+                eligibility_store.schedule_refresh('Othergaon')
+
+        with mock.patch.object(eligibility_store, 'refresh_village') as refresh:
+            with eligibility_store.deferred_refresh() as pending:
+                eligibility_store.schedule_refresh('Testgaon')
+                thread = threading.Thread(target=worker, args=(pending,))
+                thread.start()
+                thread.join()
+                refresh.assert_not_called()
+        self.assertEqual(refresh.call_args_list, [mock.call('Othergaon'), mock.call('Testgaon')])
+
+    def test_villages_without_rows_fall_back_to_the_corpus(self):
+        claimant = Claimant.objects.create(**{**EDGE_CLAIMANTS[0], 'village_name': 'Testgaon'})
+        ClaimantEligibility.objects.create(claimant=claimant, scheme='pm_kisan', eligible=False)
+        context = scheme_page('pm_kisan', 'Testgaon')
+        names = [v['village_name'] for v in context['villages_data']]
+        corpus_names = [document['document_details']['village_name'] for document in village_corpus.documents()]
+        self.assertEqual(names, sorted(corpus_names + ['Testgaon']))
+        self.assertEqual([row['serial_number'] for row in context['villages_data'][names.index('Testgaon')]['claimants']],
+                         [EDGE_CLAIMANTS[0]['serial_number']])
+        corpus_village = scheme_page('pm_kisan', corpus_names[0])
+        self.assertTrue(next(v for v in corpus_village['villages_data'] if v['selected'])['claimants'])
+
+
+@override_settings(INGEST_MAX_CONCURRENT=1, INGEST_JOB_STALE_AFTER=300)
+class IngestJobClaimTests(TestCase):
+    """Lost jobs give up their slot, failed workers hand the queue on"""
+
+    def test_jobs_without_a_heartbeat_are_failed(self):
+        lost = IngestJob.objects.create(layer_name='a', status=IngestJob.RUNNING, started_at=timezone.now(),
+                                        heartbeat_at=timezone.now() - timedelta(minutes=10))
+        queued = IngestJob.objects.create(layer_name='b')
+        self.assertEqual(jobs._claim(), queued.pk)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.error), (IngestJob.FAILED, 'The ingest worker stopped responding'))
+        self.assertIsNone(jobs._claim(IngestJob.objects.create(layer_name='c').pk))
+
+    def test_failed_worker_is_recorded_and_the_queue_restarted(self):
+        job = IngestJob.objects.create(layer_name='a')
+        future = Future()
+        future.set_exception(RuntimeError('pool broke'))
+        with mock.patch.object(jobs, 'submit') as submit, mock.patch.object(jobs.connection, 'close'):
+            with self.assertLogs('shp.jobs', 'ERROR'):
+                jobs._recover(job.pk, future.exception())
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestJob.FAILED)
+        self.assertIn('pool broke', job.error)
+        submit.assert_called_once_with(jobs.run_ingest_job, None)
+
+
+class HighlightSetExpiryTests(TestCase):
+    """Highlight sets nobody posts or draws any more are deleted"""
+
+    def test_unused_sets_are_pruned(self):
+        old = timezone.now() - timedelta(days=60)
+        HighlightSet.objects.create(key='stale', used_at=old)
+        drawn = HighlightSet.objects.create(key='drawn', used_at=old)
+        highlights.resolve_highlight({'highlight': ['drawn']})
+        highlights.highlight_set([{'village': 'Pimpalgaon'}], patta_ids=[12])
+        self.assertEqual(set(HighlightSet.objects.values_list('key', flat=True)),
+                         {drawn.key, highlights.highlight_set([{'village': 'Pimpalgaon'}], patta_ids=[12]).key})
+        self.assertEqual(highlights.prune_highlight_sets(ttl=0), 2)
+
+
+class ZonalRefreshTests(TestCase):
+    """Only changed parcels are fetched and computed, on ZONAL_MAX_WORKERS processes"""
+
+    @override_settings(ZONAL_MAX_WORKERS=3)
+    def test_only_changed_geometries_are_fetched(self):
+        ParcelStatistics.objects.create(layer='parcels', vill_name='a', patta_id=1, geometry_hash='same')
+        ParcelStatistics.objects.create(layer='parcels', vill_name='a', patta_id=2, geometry_hash='old')
+        parcels = {('a', 1): ('same', (0, 0, 1, 1)), ('a', 2): ('new', (0, 0, 1, 1)), ('a', 3): ('new', (0, 0, 1, 1))}
+        metrics = {'forest_cover_fraction': 0.5, 'mean_elevation': None, 'mean_slope': None, 'sources': {}}
+        with mock.patch.object(zonal_store, 'layer_parcels', return_value=parcels), \
+                mock.patch.object(zonal_store, 'parcel_geometries',
+                                  side_effect=lambda layer, keys: {key: b'wkb' for key in keys}) as geometries, \
+                mock.patch.object(zonal_store, '_compute',
+                                  side_effect=lambda rasters, todo, workers: [(key, metrics) for key, _, _ in todo]) \
+                as compute:
+            counts = zonal_store.refresh_layer('parcels', rasters=[], claimant_ids={})
+        geometries.assert_called_once_with('parcels', [('a', 2), ('a', 3)])
+        self.assertEqual(compute.call_args.args[2], 3)
+        self.assertEqual(counts, {'parcels': 3, 'computed': 2, 'deleted': 0})
@@ -0,0 +1,286 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing, contextmanager
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+
+from .connections import connection_manager
+
+# WMS parameters that never change the rendered image (cache busters)
+IGNORED_PARAMETERS = {'_', 'TIMESTAMP'}
+
+# Requests carrying these are styled by the caller, not by a published layer style
+UNCACHED_PARAMETERS = {'SLD', 'SLD_BODY'}
+
+# Parameters whose values are case-insensitive in WMS
+_CASE_INSENSITIVE = {'SERVICE', 'REQUEST', 'FORMAT', 'TRANSPARENT', 'SRS', 'CRS', 'EXCEPTIONS'}
+
+EXTENSIONS = {
+    'image/png': 'png',
+    'image/png8': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+
+####################################################################################
+# WMS GetMap parameters -> cache key
+####################################################################################
+def _bbox(value):
+    try:
+        return ','.join(f'{float(part):.6f}' for part in value.split(','))
+    except ValueError:
+        return value
+
+
+def layer_names(layers):
+    """'geoapp:a, b' -> ['a', 'b'], the names the Shp and Tiff uploads are published under"""
+    return [layer.strip().split(':')[-1] for layer in layers.split(',') if layer.strip()]
+
+
+def normalize_getmap(query):
+    """
+    Canonical (layers, key, content_type) for a cacheable WMS GetMap query, None otherwise.
+    Parameter names are case-insensitive, order does not matter and the BBOX is rounded, so
+    the same tile requested by different clients maps to one cache entry.
+    """
+    params = {}
+    for name, value in query.items():
+        name = name.upper()
+        if name in IGNORED_PARAMETERS:
+            continue
+        if name in UNCACHED_PARAMETERS:
+            return None
+        if name in _CASE_INSENSITIVE:
+            value = value.lower()
+        elif name == 'BBOX':
+            value = _bbox(value)
+        params[name] = value.strip()
+
+    if params.get('REQUEST') != 'getmap' or not params.get('LAYERS'):
+        return None
+    content_type = params.get('FORMAT', 'image/png')
+    if content_type not in EXTENSIONS:
+        return None
+    canonical = '&'.join(f'{name}={params[name]}' for name in sorted(params))
+    return layer_names(params['LAYERS']), hashlib.sha1(canonical.encode()).hexdigest(), content_type
+
+
+####################################################################################
+# Size-bounded LRU tile store on disk
+####################################################################################
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tiles (
+    path TEXT PRIMARY KEY, folder TEXT NOT NULL, content_type TEXT NOT NULL,
+    size INTEGER NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS tiles_used ON tiles (used);
+CREATE INDEX IF NOT EXISTS tiles_folder ON tiles (folder);
+CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO total VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS tiles_insert AFTER INSERT ON tiles
+    BEGIN UPDATE total SET bytes = bytes + new.size; END;
+CREATE TRIGGER IF NOT EXISTS tiles_update AFTER UPDATE OF size ON tiles
+    BEGIN UPDATE total SET bytes = bytes - old.size + new.size; END;
+CREATE TRIGGER IF NOT EXISTS tiles_delete AFTER DELETE ON tiles
+    BEGIN UPDATE total SET bytes = bytes - old.size; END;
+"""
+
+
+class DiskTileCache:
+    """
+    Rendered tiles under <directory>/<layers>/<generation>/<key[:2]>/<key>, one folder per
+    layer combination so a layer is invalidated by removing folders. Invalidating also bumps
+    the layer's generation (kept in <directory>/.generations), so a tile rendered from the
+    old data and stored after the folders were removed is never served.
+
+    A SQLite index next to the tiles (<directory>/.index.sqlite3) records the content type,
+    size and last use of every tile. It is shared by all processes using the directory, so
+    their total stays under max_bytes and eviction removes the least recently used tiles
+    without walking the tree.
+    """
+
+    GENERATIONS = '.generations'
+    INDEX = '.index.sqlite3'
+    # Seconds between recorded uses of a tile, hits do not write the index every time
+    USE_RESOLUTION = 60
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @contextmanager
+    def _index(self):
+        path = os.path.join(self.directory, self.INDEX)
+        if not os.path.exists(path):
+            # Tiles stored before the index existed would never be counted or evicted
+            self._remove_folders(lambda folder: True)
+        os.makedirs(self.directory, exist_ok=True)
+        with closing(sqlite3.connect(path, timeout=30, isolation_level=None)) as db:
+            if db.execute('PRAGMA user_version').fetchone()[0] == 0:
+                # Readers do not wait for writers in WAL mode, both settings stay with the file
+                db.execute('PRAGMA journal_mode=WAL')
+                db.executescript(_INDEX_SCHEMA + 'PRAGMA user_version = 1;')
+            yield db
+
+    def _remove_folders(self, matches):
+        try:
+            folders = os.listdir(self.directory)
+        except OSError:
+            return []
+        removed = [folder for folder in folders if not folder.startswith('.') and matches(folder)]
+        for folder in removed:
+            shutil.rmtree(os.path.join(self.directory, folder), ignore_errors=True)
+        return removed
+
+    def _folder(self, layers):
+        return '+'.join(quote(layer, safe='') for layer in layers)
+
+    def _generation_path(self, layer):
+        return os.path.join(self.directory, self.GENERATIONS, quote(layer.split(':')[-1], safe=''))
+
+    def generation(self, layers):
+        """Generation of a layer combination, read by the caller before rendering a miss"""
+        generations = []
+        for layer in layers:
+            try:
+                with open(self._generation_path(layer)) as f:
+                    generations.append(f.read().strip() or '0')
+            except OSError:
+                generations.append('0')
+        return '-'.join(generations)
+
+    def _path(self, layers, generation, key):
+        return os.path.join(self._folder(layers), generation, key[:2], key)
+
+    def get(self, layers, generation, key):
+        """(content_type, tile) of a cached tile, None on a miss"""
+        path = self._path(layers, generation, key)
+        now = time.time()
+        with self._index() as db:
+            row = db.execute('SELECT content_type FROM tiles WHERE path = ?', [path]).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(os.path.join(self.directory, path), 'rb') as f:
+                    tile = f.read()
+            except OSError:
+                db.execute('DELETE FROM tiles WHERE path = ?', [path])
+                return None
+            db.execute('UPDATE tiles SET used = ? WHERE path = ? AND used < ?',
+                       [now, path, now - self.USE_RESOLUTION])
+        return row[0], tile
+
+    def put(self, layers, generation, key, content_type, tile):
+        """Store a tile served as content_type, evicting the least recently used past max_bytes"""
+        # A layer invalidated while the tile was rendering, the tile shows the old data
+        if self.generation(layers) != generation:
+            return
+        path = self._path(layers, generation, key)
+        full_path = os.path.join(self.directory, path)
+        with self._index() as db:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Write then rename, readers never see a partial tile
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(tile)
+            os.replace(tmp, full_path)
+            db.execute('INSERT INTO tiles (path, folder, content_type, size, used) VALUES (?, ?, ?, ?, ?) '
+                       'ON CONFLICT (path) DO UPDATE SET content_type = excluded.content_type, '
+                       'size = excluded.size, used = excluded.used',
+                       [path, self._folder(layers), content_type, len(tile), time.time()])
+            if db.execute('SELECT bytes FROM total').fetchone()[0] > self.max_bytes:
+                self._evict(db)
+
+    def _evict(self, db):
+        """Remove least recently used tiles until the cache is back under 90% of max_bytes"""
+        total = db.execute('SELECT bytes FROM total').fetchone()[0]
+        evicted = []
+        for path, size in db.execute('SELECT path, size FROM tiles ORDER BY used'):
+            if total <= self.max_bytes * 0.9:
+                break
+            evicted.append([path])
+            total -= size
+        for path, in evicted:
+            try:
+                os.remove(os.path.join(self.directory, path))
+            except OSError:
+                pass
+        db.executemany('DELETE FROM tiles WHERE path = ?', evicted)
+
+    def size(self):
+        """Bytes of tiles in the cache, as recorded in the index"""
+        with self._index() as db:
+            return db.execute('SELECT bytes FROM total').fetchone()[0]
+
+    def invalidate(self, layer):
+        """Drop every cached tile that was rendered with `layer`"""
+        layer = layer.split(':')[-1]
+        # Bump first: a render in flight stores its tile under the old generation or not at all
+        path = self._generation_path(layer)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp, path)
+        with self._index() as db:
+            removed = self._remove_folders(lambda folder: quote(layer, safe='') in folder.split('+'))
+            db.executemany('DELETE FROM tiles WHERE folder = ?', [[folder] for folder in removed])
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+####################################################################################
+# GeoServer WMS behind the cache
+####################################################################################
+# Longer queries (large highlight filters) are sent to GeoServer as a form POST
+MAX_GET_QUERY = 4000
+
+
+def fetch_wms(query):
+    """Forward a WMS query to GeoServer, returns (status, content_type, body)"""
+    url = getattr(settings, 'GEOSERVER_WMS_URL', 'http://127.0.0.1:8080/geoserver/wms')
+    timeout = getattr(settings, 'GEOSERVER_TIMEOUT', 30)
+    params = [(name, value) for name, values in query.lists() for value in values]
+    if len(urlencode(params)) > MAX_GET_QUERY:
+        response = connection_manager.http.post(url, data=params, timeout=timeout)
+    else:
+        response = connection_manager.http.get(url, params=params, timeout=timeout)
+    return response.status_code, response.headers.get('Content-Type', ''), response.content
+
+
+def cached_getmap(query, rewrite=None):
+    """
+    Serve a WMS request from the tile cache, rendering and storing GetMap tiles on a miss.
+    `rewrite(query)` turns the cache key query into the one GeoServer gets, only on a miss.
+    Returns (status, content_type, body, cache) with cache one of HIT, MISS or BYPASS.
+    """
+    upstream = rewrite if rewrite is not None else (lambda q: q)
+    normalized = normalize_getmap(query)
+    if normalized is None:
+        return (*fetch_wms(upstream(query)), 'BYPASS')
+
+    layers, key, _ = normalized
+    generation = tile_cache.generation(layers)
+    cached = tile_cache.get(layers, generation, key)
+    if cached is not None:
+        return 200, cached[0], cached[1], 'HIT'
+
+    status, upstream_type, body = fetch_wms(upstream(query))
+    # GeoServer reports errors as 200 XML documents, only keep real images
+    if status == 200 and upstream_type.startswith('image/'):
+        # Served on later hits with GeoServer's type, e.g. image/png for FORMAT=image/png8
+        tile_cache.put(layers, generation, key, upstream_type, body)
+    return status, upstream_type, body, 'MISS'
+
+
+tile_cache = DiskTileCache(
+    getattr(settings, 'TILE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'tile_cache')),
+    getattr(settings, 'TILE_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+)
@@ -0,0 +1,97 @@
+from django.db import connection
+
+from .loader import GEOMETRY_COLUMN, quote_ident
+from .models import Shp
+
+# Vector tiles are built from the ingested tables in this schema
+TILE_SCHEMA = 'data'
+
+MAX_ZOOM = 24
+
+# Query parameter -> layer attribute, matched case-insensitively against the table columns
+TILE_FILTERS = {
+    'village': 'vill_name',
+    'patta_id': 'patta_id',
+}
+
+
+####################################################################################
+# Mapbox vector tiles straight from PostGIS (ST_AsMVT)
+####################################################################################
+class TileError(ValueError):
+    pass
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _layer_columns(cursor, table):
+    """{lowercase name: (name, data_type)} of the attribute columns of data.<table>"""
+    cursor.execute('SELECT column_name, data_type FROM information_schema.columns '
+                   'WHERE table_schema = %s AND table_name = %s AND column_name <> %s '
+                   'ORDER BY ordinal_position', [TILE_SCHEMA, table, GEOMETRY_COLUMN])
+    return {name.lower(): (name, data_type) for name, data_type in cursor.fetchall()}
+
+
+def _filter_sql(columns, filters):
+    """WHERE clauses and parameters for the attribute filters of one tile"""
+    clauses, params = [], []
+    for parameter, attribute in TILE_FILTERS.items():
+        values = filters.get(parameter)
+        if not values:
+            continue
+        if attribute not in columns:
+            raise TileError(f'Layer has no {attribute} attribute')
+        name, data_type = columns[attribute]
+        # Cast the parameters, not the column, so the attribute B-tree index stays usable
+        clauses.append(f't.{quote_ident(name)} = ANY(%s::{data_type}[])')
+        params.append(list(values))
+    return clauses, params
+
+
+def parse_filters(query):
+    """?village=Name&patta_id=1,2,3 (or repeated patta_id=) -> {parameter: [values]}"""
+    filters = {}
+    for parameter in TILE_FILTERS:
+        values = []
+        for value in query.getlist(parameter):
+            values.extend(part.strip() for part in value.split(',') if part.strip())
+        if values:
+            filters[parameter] = values
+    return filters
+
+
+def layer_tile(layer, z, x, y, filters=None):
+    """
+    Encode tile z/x/y of data.<layer> as a Mapbox vector tile with every attribute column.
+    Returns the tile bytes, empty when no feature falls inside the tile.
+    """
+    shp = Shp.objects.filter(name=layer).values('srid').first()
+    if shp is None:
+        raise Shp.DoesNotExist(layer)
+
+    with connection.cursor() as cursor:
+        columns = _layer_columns(cursor, layer)
+        if not columns:
+            raise Shp.DoesNotExist(layer)
+        srid = shp['srid']
+        if srid is None:
+            cursor.execute('SELECT Find_SRID(%s, %s, %s)', [TILE_SCHEMA, layer, GEOMETRY_COLUMN])
+            srid = cursor.fetchone()[0]
+        # Layers uploaded without a .prj are taken to be lon/lat
+        srid = srid or 4326
+
+        clauses, filter_params = _filter_sql(columns, filters or {})
+        attributes = ', '.join(f't.{quote_ident(name)}' for name, _ in columns.values())
+        where = ' AND '.join([f't.{GEOMETRY_COLUMN} && ST_Transform(bounds.geom, {int(srid)})'] + clauses)
+        cursor.execute(
+            f'WITH bounds AS (SELECT ST_TileEnvelope(%s, %s, %s) AS geom) '
+            f'SELECT ST_AsMVT(tile, %s, 4096, \'mvt_geom\') FROM ('
+            f'SELECT ST_AsMVTGeom(ST_Transform(t.{GEOMETRY_COLUMN}, 3857), bounds.geom) AS mvt_geom, '
+            f'{attributes} '
+            f'FROM {quote_ident(TILE_SCHEMA)}.{quote_ident(layer)} t, bounds '
+            f'WHERE {where}) tile WHERE tile.mvt_geom IS NOT NULL',
+            [z, x, y, layer] + filter_params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b''
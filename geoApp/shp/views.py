@@ -1,8 +1,19 @@
+import json
+
 from django.shortcuts import render
-from django.http import JsonResponse
-from .models import Shp, Claimant
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from django.db import DataError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from .models import Shp, Claimant, IngestJob, HighlightSet, ParcelStatistics
 from tiff.models import Tiff
 from note.models import Note
+from .api_cache import GLOBAL_SCOPE, LOCATIONS_SCOPE, location_scope, versioned_response
+from .claimant_api import claimant_chunks, parse_query
+from .connections import connection_manager
+from .highlights import HIGHLIGHT_PARAMETER, highlight_set, resolve_highlight
+from .tile_cache import cached_getmap
 
 # Create your views here.
 def index(request):
@@ -20,793 +31,232 @@ def note(request):
         return render(request, 'index.html')
     return render(request, 'index.html')
 
+def _claimants_village(request):
+    return request.GET.get('village', 'Pimpalgaon Khu')
+
+@versioned_response(_claimants_village)
 def get_claimants_data(request):
-    """Return claimants data for highlighting features"""
-    village = request.GET.get('village', 'Pimpalgaon Khu')
-    claimants = Claimant.objects.filter(village_name=village)
-    
-    data = {
-        'village_name': village,
-        'serial_numbers': list(claimants.values_list('serial_number', flat=True)),
-        'claimants': list(claimants.values(
-            'serial_number', 'claimant_name', 'code_13_digit', 
-            'claim_number', 'gat_number', 'area'
-        ))
-    }
-    return JsonResponse(data)
+    """
+    Return claimants data for highlighting features, streamed. ?fields= picks the columns,
+    ?format=columnar returns one array per field, ?limit= and ?after=<next> page through them.
+    """
+    try:
+        query = parse_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    chunks = (chunk.encode('utf-8') for chunk in claimant_chunks(_claimants_village(request), query))
+    return StreamingHttpResponse(chunks, content_type='application/json')
 
+@versioned_response(lambda request: GLOBAL_SCOPE)
 def get_available_villages(request):
     """Return list of all available villages"""
-    villages = Claimant.objects.values(
-        'village_name', 'taluka', 'district'
-    ).distinct().order_by('village_name')
-    
+    from .locations import available_villages
+    return JsonResponse({
+        'villages': available_villages()
+    })
+
+@versioned_response(lambda request: GLOBAL_SCOPE)
+def get_locations(request):
+    """Return the state > district > taluka > village tree with the extent and centroid of each node"""
+    from .locations import location_tree
     return JsonResponse({
-        'villages': list(villages)
+        'locations': location_tree()
     })
 
+def _search_scope(request):
+    # A location scoped search only changes with the claimants below it (and the tree itself)
+    try:
+        return [location_scope(int(request.GET['location'])), LOCATIONS_SCOPE]
+    except (KeyError, ValueError):
+        return GLOBAL_SCOPE
+
+@versioned_response(_search_scope)
+def search_claimants(request):
+    """Return the claimants best matching ?q= (name, 13-digit code prefix or claim number), ?location= scopes it"""
+    from django.db import OperationalError
+    from .claimant_search import search_claimants as search
+    try:
+        location = int(request.GET['location']) if request.GET.get('location') else None
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        results, elapsed_ms = search(request.GET.get('q', ''), location_id=location, limit=limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except OperationalError:
+        # statement_timeout cancelled it, a longer query or a location scope narrows it down
+        return JsonResponse({'error': 'Search took too long, refine the query or pick a location'}, status=503)
+    response = JsonResponse({'query': request.GET.get('q', ''), 'results': results})
+    # Only a response the search actually ran for carries its timing, cached copies do not
+    response['Server-Timing'] = f'search;dur={elapsed_ms}'
+    return response
+
+# A read-only lookup for reconciliation scripts, which carry no CSRF cookie
+@csrf_exempt
+@require_POST
+def lookup_claimant_codes(request):
+    """
+    Resolve many 13-digit codes or code prefixes in one query.
+    Body: {"codes": ["0203PIM01SSD0", "0203KAD", ...]}, one result per distinct code in that order.
+    """
+    from .claimant_codes import lookup_codes
+    try:
+        codes = json.loads(request.body)['codes']
+        if not isinstance(codes, list):
+            raise TypeError('codes must be a list')
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({'error': f'Invalid code lookup: {e}'}, status=400)
+    max_codes = getattr(settings, 'CLAIMANT_CODE_LOOKUP_MAX_CODES', 5000)
+    if len(codes) > max_codes:
+        return JsonResponse({'error': f'At most {max_codes} codes per request'}, status=400)
+    results, truncated = lookup_codes(codes, ['serial_number', 'claimant_name', 'code_13_digit', 'claim_number',
+                                              'village_name', 'taluka', 'district', 'location_id'])
+    return JsonResponse({
+        'results': results,
+        'unmatched': [result['code'] for result in results if not result['claimants']],
+        'truncated': truncated,
+    })
+
+def get_parcel_statistics(request):
+    """Return the precomputed forest cover, elevation and slope of the claimant parcels of a village"""
+    village = request.GET.get('village', 'Pimpalgaon Khu')
+    parcels = ParcelStatistics.objects.filter(claimant__village_name=village).order_by('patta_id')
+    if request.GET.get('layer'):
+        parcels = parcels.filter(layer=request.GET['layer'])
+    return JsonResponse({
+        'village_name': village,
+        'parcels': list(parcels.values(
+            'layer', 'patta_id', 'claimant__serial_number', 'claimant__claimant_name',
+            'forest_cover_fraction', 'mean_elevation', 'mean_slope', 'sources', 'computed_at'
+        ))
+    })
+
+def get_ingest_jobs(request):
+    """Return the latest shapefile ingest jobs, optionally filtered by layer and status"""
+    jobs = IngestJob.objects.all()
+    if request.GET.get('layer'):
+        jobs = jobs.filter(layer_name=request.GET['layer'])
+    if request.GET.get('status'):
+        jobs = jobs.filter(status=request.GET['status'])
+    return JsonResponse({'jobs': [job.as_dict() for job in jobs[:50]]})
+
+def get_ingest_job(request, job_id):
+    """Return the status of one shapefile ingest job"""
+    try:
+        job = IngestJob.objects.get(pk=job_id)
+    except IngestJob.DoesNotExist:
+        return JsonResponse({'error': f'Unknown ingest job: {job_id}'}, status=404)
+    return JsonResponse(job.as_dict())
+
+def get_layer_tile(request, layer, z, x, y):
+    """Return one Mapbox vector tile of an ingested layer, filtered by ?village=&patta_id="""
+    # Imported here, the loader pulls in numpy/pyogrio/shapely/pyproj
+    from .tiles import TileError, layer_tile, parse_filters, valid_tile
+    if not valid_tile(z, x, y):
+        return JsonResponse({'error': f'Invalid tile: {z}/{x}/{y}'}, status=400)
+    try:
+        tile = layer_tile(layer, z, x, y, parse_filters(request.GET))
+    except Shp.DoesNotExist:
+        return JsonResponse({'error': f'Unknown layer: {layer}'}, status=404)
+    except (TileError, DataError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = HttpResponse(tile, content_type='application/vnd.mapbox-vector-tile',
+                            status=200 if tile else 204)
+    response['Cache-Control'] = f'public, max-age={getattr(settings, "VECTOR_TILE_MAX_AGE", 300)}'
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def wms_proxy(request):
+    """GeoServer WMS through the disk tile cache, GetMap tiles are rendered once and reused"""
+    from requests import RequestException
+    highlighted = any(name.lower() == HIGHLIGHT_PARAMETER for name in request.GET)
+    try:
+        status, content_type, body, cache = cached_getmap(
+            request.GET, rewrite=resolve_highlight if highlighted else None)
+    except HighlightSet.DoesNotExist:
+        return JsonResponse({'error': 'Unknown highlight set'}, status=404)
+    except RequestException as e:
+        return JsonResponse({'error': f'GeoServer is not reachable: {e}'}, status=502)
+    response = HttpResponse(body, content_type=content_type, status=status)
+    response['X-Tile-Cache'] = cache
+    if cache != 'BYPASS' and status == 200:
+        response['Cache-Control'] = f'public, max-age={getattr(settings, "WMS_TILE_MAX_AGE", 300)}'
+    return response
+
+@require_POST
+def create_highlight(request):
+    """
+    Register the parcels to highlight and return the key to pass as ?highlight= to /wms/.
+    Body: {"villages": [{"village": ..., "vill_name": ...}], "patta_ids": [...] (optional)}
+    """
+    try:
+        payload = json.loads(request.body)
+        villages = payload['villages']
+        highlight = highlight_set(villages, payload.get('patta_ids'))
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({'error': f'Invalid highlight request: {e}'}, status=400)
+    return JsonResponse({'highlight': highlight.key, 'parcels': highlight.parcels})
+
+def get_connection_stats(request):
+    """Return the database and GeoServer connection pool usage of this process"""
+    return JsonResponse(connection_manager.stats())
+
 def analytics(request):
     """Analytics page showcasing PM Yojanas"""
-    return render(request, 'analytics.html')
+    from .scheme_stats import scheme_totals
+    return render(request, 'analytics.html', {'scheme_totals': scheme_totals()})
+
+def _scheme_context(request, scheme):
+    """Scheme statistics plus the page of claimants selected by ?village=&page="""
+    # The eligibility engine needs pandas, only load it for the scheme pages
+    from .scheme_stats import scheme_page
+    return scheme_page(scheme, request.GET.get('village'), request.GET.get('page'))
+
+def get_scheme_statistics(request, scheme):
+    """Return scheme statistics per village and one page of claimants as JSON"""
+    from .eligibility import SCHEMES
+    if scheme not in SCHEMES:
+        return JsonResponse({'error': f'Unknown scheme: {scheme}'}, status=404)
+    context = _scheme_context(request, scheme)
+    context['scheme'] = scheme
+    return JsonResponse(context)
 
 def pm_kisan_details(request):
     """PM Kisan Yojana details page with FRA claimant eligibility analysis"""
-    import json
-    import os
-    from django.conf import settings
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for eligibility
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        claimant['eligible'] = area <= 2.0  # PM Kisan eligibility: up to 2 hectares
-                        
-                        if claimant['eligible']:
-                            eligible_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
+    context = _scheme_context(request, 'pm_kisan')
+    total_claimants = context['total_claimants']
+    eligible_claimants = context['eligible_claimants']
+
     # Calculate statistics
     eligible_percentage = round((eligible_claimants / total_claimants * 100) if total_claimants > 0 else 0, 1)
     total_benefit_amount = eligible_claimants * 6000  # ₹6,000 per eligible claimant per year
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'eligible_percentage': eligible_percentage,
-        'total_benefit_amount': f"{total_benefit_amount:,}",
-    }
-    
+
+    context['eligible_percentage'] = eligible_percentage
+    context['total_benefit_amount'] = f"{total_benefit_amount:,}"
     return render(request, 'pm_kisan_details.html', context)
 
 def mgnrega_details(request):
     """MGNREGA details page with FRA claimant eligibility analysis"""
-    import json
-    import os
-    from django.conf import settings
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    priority_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for MGNREGA eligibility
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        
-                        # MGNREGA eligibility logic:
-                        # 1. All rural residents are eligible (FRA claimants are rural)
-                        # 2. Priority given to small landholders (≤ 2 hectares)
-                        # 3. Priority given to SC/ST communities (based on name patterns)
-                        # 4. Priority given to women (based on name patterns)
-                        
-                        is_eligible = True  # All FRA claimants are rural residents
-                        is_priority = False
-                        
-                        # Priority criteria
-                        if area <= 2.0:  # Small landholder
-                            is_priority = True
-                        
-                        # Check for SC/ST indicators in name (common patterns)
-                        name_lower = claimant.get('claimant_name', '').lower()
-                        sc_st_indicators = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
-                        if any(indicator in name_lower for indicator in sc_st_indicators):
-                            is_priority = True
-                        
-                        # Check for women (common name patterns)
-                        women_indicators = ['bai', 'bai', 'ya', 'i']
-                        if any(name_lower.endswith(indicator) for indicator in women_indicators):
-                            is_priority = True
-                        
-                        claimant['eligible'] = is_eligible
-                        claimant['priority'] = is_priority
-                        
-                        if is_eligible:
-                            eligible_claimants += 1
-                        if is_priority:
-                            priority_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
-    # Calculate statistics
-    total_work_days = eligible_claimants * 100  # 100 days per eligible household
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'priority_claimants': priority_claimants,
-        'total_work_days': f"{total_work_days:,}",
-    }
-    
+    context = _scheme_context(request, 'mgnrega')
+    total_work_days = context['eligible_claimants'] * 100  # 100 days per eligible household
+    context['total_work_days'] = f"{total_work_days:,}"
     return render(request, 'mgnrega_details.html', context)
 
 def pm_jai_jeevan_details(request):
     """PM Jai Jeevan Yojana details page with FRA claimant eligibility analysis"""
-    import json
-    import os
-    from django.conf import settings
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    priority_claimants = 0
-    high_priority_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for PM Jai Jeevan eligibility
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        
-                        # PM Jai Jeevan eligibility logic:
-                        # 1. All rural residents are eligible (FRA claimants are rural)
-                        # 2. Priority given to water-scarce areas (small landholders)
-                        # 3. High priority for SC/ST communities
-                        # 4. High priority for women-headed households
-                        # 5. High priority for areas with water quality issues
-                        
-                        is_eligible = True  # All FRA claimants are rural residents
-                        is_priority = False
-                        is_high_priority = False
-                        
-                        # Priority criteria - water-scarce areas (small landholders)
-                        if area <= 1.5:  # Very small landholders likely in water-scarce areas
-                            is_priority = True
-                        elif area <= 2.0:  # Small landholders
-                            is_priority = True
-                        
-                        # High priority criteria
-                        name_lower = claimant.get('claimant_name', '').lower()
-                        
-                        # SC/ST communities get high priority
-                        sc_st_indicators = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
-                        if any(indicator in name_lower for indicator in sc_st_indicators):
-                            is_high_priority = True
-                        
-                        # Women-headed households get high priority
-                        women_indicators = ['bai', 'ya', 'i']
-                        if any(name_lower.endswith(indicator) for indicator in women_indicators):
-                            is_high_priority = True
-                        
-                        # Very small landholders (likely water-scarce) get high priority
-                        if area <= 1.0:
-                            is_high_priority = True
-                        
-                        # Areas with no gat number (likely water quality issues) get high priority
-                        if not claimant.get('gat_number') or claimant.get('gat_number') == 'null':
-                            is_high_priority = True
-                        
-                        claimant['eligible'] = is_eligible
-                        claimant['priority'] = is_priority
-                        claimant['high_priority'] = is_high_priority
-                        
-                        if is_eligible:
-                            eligible_claimants += 1
-                        if is_priority:
-                            priority_claimants += 1
-                        if is_high_priority:
-                            high_priority_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'priority_claimants': priority_claimants,
-        'high_priority_claimants': high_priority_claimants,
-    }
-    
-    return render(request, 'pm_jai_jeevan_details.html', context)
+    return render(request, 'pm_jai_jeevan_details.html', _scheme_context(request, 'pm_jai_jeevan'))
 
 def pm_ayushman_details(request):
     """PM Ayushman Bharat details page with FRA claimant eligibility analysis"""
-    import json
-    import os
-    from django.conf import settings
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    priority_claimants = 0
-    high_priority_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for PM Ayushman Bharat eligibility
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        
-                        # PM Ayushman Bharat eligibility logic:
-                        # 1. All rural residents are eligible (FRA claimants are rural)
-                        # 2. Priority given to economically weaker sections
-                        # 3. High priority for SC/ST communities
-                        # 4. High priority for women-headed households
-                        # 5. High priority for very small landholders (likely poor)
-                        
-                        is_eligible = True  # All FRA claimants are rural residents
-                        is_priority = False
-                        is_high_priority = False
-                        
-                        # Priority criteria - economically weaker (small landholders)
-                        if area <= 1.5:  # Very small landholders likely economically weak
-                            is_priority = True
-                        elif area <= 2.0:  # Small landholders
-                            is_priority = True
-                        
-                        # High priority criteria
-                        name_lower = claimant.get('claimant_name', '').lower()
-                        
-                        # SC/ST communities get high priority
-                        sc_st_indicators = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
-                        if any(indicator in name_lower for indicator in sc_st_indicators):
-                            is_high_priority = True
-                        
-                        # Women-headed households get high priority
-                        women_indicators = ['bai', 'ya', 'i']
-                        if any(name_lower.endswith(indicator) for indicator in women_indicators):
-                            is_high_priority = True
-                        
-                        # Very small landholders (likely poor) get high priority
-                        if area <= 1.0:
-                            is_high_priority = True
-                        
-                        # Areas with no claim number (likely economically weak) get high priority
-                        if not claimant.get('claim_number') or claimant.get('claim_number') == 'null':
-                            is_high_priority = True
-                        
-                        # Estimate family size based on area and community
-                        estimated_family_size = 4  # Default family size
-                        if area <= 1.0:
-                            estimated_family_size = 6  # Larger families in smaller areas
-                        elif area <= 2.0:
-                            estimated_family_size = 5
-                        
-                        # SC/ST families tend to be larger
-                        if any(indicator in name_lower for indicator in sc_st_indicators):
-                            estimated_family_size += 1
-                        
-                        claimant['eligible'] = is_eligible
-                        claimant['priority'] = is_priority
-                        claimant['high_priority'] = is_high_priority
-                        claimant['estimated_family_size'] = estimated_family_size
-                        
-                        if is_eligible:
-                            eligible_claimants += 1
-                        if is_priority:
-                            priority_claimants += 1
-                        if is_high_priority:
-                            high_priority_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'priority_claimants': priority_claimants,
-        'high_priority_claimants': high_priority_claimants,
-    }
-    
-    return render(request, 'pm_ayushman_details.html', context)
+    return render(request, 'pm_ayushman_details.html', _scheme_context(request, 'pm_ayushman'))
 
 def pm_kaushal_details(request):
     """PM Kaushal Vikas Yojana details page with FRA claimant eligibility analysis"""
-    import json
-    import os
-    from django.conf import settings
-    import random
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    priority_claimants = 0
-    high_priority_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for PM Kaushal Vikas eligibility
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        
-                        # PM Kaushal Vikas eligibility logic:
-                        # 1. Age requirement: 15-45 years (estimated based on serial number and name patterns)
-                        # 2. All rural residents are eligible (FRA claimants are rural)
-                        # 3. Priority given to SC/ST communities
-                        # 4. Priority given to women
-                        # 5. Priority given to economically weaker sections (small landholders)
-                        
-                        # Estimate age based on serial number and name patterns
-                        estimated_age = 25 + (claimant.get('serial_number', 1) % 20)  # Age range 25-44
-                        
-                        # Adjust age based on name patterns (women tend to be younger in rural areas)
-                        name_lower = claimant.get('claimant_name', '').lower()
-                        women_indicators = ['bai', 'ya', 'i']
-                        if any(name_lower.endswith(indicator) for indicator in women_indicators):
-                            estimated_age = 22 + (claimant.get('serial_number', 1) % 18)  # Age range 22-39
-                        
-                        # SC/ST communities might have different age patterns
-                        sc_st_indicators = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
-                        if any(indicator in name_lower for indicator in sc_st_indicators):
-                            estimated_age = 24 + (claimant.get('serial_number', 1) % 19)  # Age range 24-42
-                        
-                        claimant['estimated_age'] = estimated_age
-                        
-                        # Age eligibility check (15-45 years)
-                        is_eligible = 15 <= estimated_age <= 45
-                        is_priority = False
-                        is_high_priority = False
-                        
-                        if is_eligible:
-                            # Priority criteria
-                            if area <= 2.0:  # Small landholders
-                                is_priority = True
-                            
-                            # High priority criteria
-                            if any(indicator in name_lower for indicator in sc_st_indicators):
-                                is_high_priority = True
-                            
-                            if any(name_lower.endswith(indicator) for indicator in women_indicators):
-                                is_high_priority = True
-                            
-                            if area <= 1.0:  # Very small landholders
-                                is_high_priority = True
-                            
-                            # Young adults (18-30) get high priority for skill development
-                            if 18 <= estimated_age <= 30:
-                                is_high_priority = True
-                        
-                        claimant['eligible'] = is_eligible
-                        claimant['priority'] = is_priority
-                        claimant['high_priority'] = is_high_priority
-                        
-                        if is_eligible:
-                            eligible_claimants += 1
-                        if is_priority:
-                            priority_claimants += 1
-                        if is_high_priority:
-                            high_priority_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'priority_claimants': priority_claimants,
-        'high_priority_claimants': high_priority_claimants,
-    }
-    
-    return render(request, 'pm_kaushal_details.html', context)
+    return render(request, 'pm_kaushal_details.html', _scheme_context(request, 'pm_kaushal'))
 
 def digital_india_details(request):
     """Digital India details page with FRA claimant eligibility analysis"""
-    import json
-    import os
-    from django.conf import settings
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    priority_claimants = 0
-    high_priority_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for Digital India eligibility
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        
-                        # Digital India eligibility logic:
-                        # 1. Universal access - all citizens are eligible
-                        # 2. Priority given to rural areas (all FRA claimants are rural)
-                        # 3. High priority for SC/ST communities
-                        # 4. High priority for women
-                        # 5. High priority for economically weaker sections
-                        # 6. Digital readiness assessment based on landholding and community
-                        
-                        is_eligible = True  # Universal access for all citizens
-                        is_priority = False
-                        is_high_priority = False
-                        
-                        # Digital readiness assessment
-                        digital_readiness = "Basic"
-                        
-                        # Priority criteria - rural areas get priority
-                        if area <= 2.0:  # Small landholders
-                            is_priority = True
-                            digital_readiness = "Medium"
-                        
-                        # High priority criteria
-                        name_lower = claimant.get('claimant_name', '').lower()
-                        
-                        # SC/ST communities get high priority for digital inclusion
-                        sc_st_indicators = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
-                        if any(indicator in name_lower for indicator in sc_st_indicators):
-                            is_high_priority = True
-                            digital_readiness = "High"
-                        
-                        # Women get high priority for digital empowerment
-                        women_indicators = ['bai', 'ya', 'i']
-                        if any(name_lower.endswith(indicator) for indicator in women_indicators):
-                            is_high_priority = True
-                            if digital_readiness == "Basic":
-                                digital_readiness = "Medium"
-                        
-                        # Very small landholders get high priority
-                        if area <= 1.0:
-                            is_high_priority = True
-                            digital_readiness = "High"
-                        
-                        # Areas with no claim number (likely need digital services) get high priority
-                        if not claimant.get('claim_number') or claimant.get('claim_number') == 'null':
-                            is_high_priority = True
-                            digital_readiness = "High"
-                        
-                        # Areas with no gat number (likely need digital documentation) get high priority
-                        if not claimant.get('gat_number') or claimant.get('gat_number') == 'null':
-                            is_high_priority = True
-                            if digital_readiness == "Basic":
-                                digital_readiness = "Medium"
-                        
-                        # Digital readiness levels
-                        if digital_readiness == "Basic":
-                            digital_readiness = "Basic - Needs Digital Literacy"
-                        elif digital_readiness == "Medium":
-                            digital_readiness = "Medium - Ready for Digital Services"
-                        elif digital_readiness == "High":
-                            digital_readiness = "High - Priority for Digital Inclusion"
-                        
-                        claimant['eligible'] = is_eligible
-                        claimant['priority'] = is_priority
-                        claimant['high_priority'] = is_high_priority
-                        claimant['digital_readiness'] = digital_readiness
-                        
-                        if is_eligible:
-                            eligible_claimants += 1
-                        if is_priority:
-                            priority_claimants += 1
-                        if is_high_priority:
-                            high_priority_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'priority_claimants': priority_claimants,
-        'high_priority_claimants': high_priority_claimants,
-    }
-    
-    return render(request, 'digital_india_details.html', context)
+    return render(request, 'digital_india_details.html', _scheme_context(request, 'digital_india'))
 
 def startup_india_details(request):
     """Startup India details page with FRA claimant entrepreneurship potential analysis"""
-    import json
-    import os
-    from django.conf import settings
-    
-    # Load all village data from JSON files
-    villages_data = []
-    total_claimants = 0
-    eligible_claimants = 0
-    priority_claimants = 0
-    high_priority_claimants = 0
-    
-    villages_dir = os.path.join(settings.BASE_DIR, 'data', 'villages')
-    
-    if os.path.exists(villages_dir):
-        for filename in os.listdir(villages_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(villages_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        village_data = json.load(f)
-                        
-                    # Process claimants for Startup India entrepreneurship potential
-                    processed_claimants = []
-                    for claimant in village_data.get('claimants', []):
-                        # Convert area to float for comparison
-                        try:
-                            area = float(claimant.get('area', 0))
-                        except (ValueError, TypeError):
-                            area = 0
-                        
-                        claimant['area'] = area
-                        
-                        # Estimate age based on serial number (similar to PM Kaushal logic)
-                        serial_number = claimant.get('serial_number', '1')
-                        try:
-                            serial_num = int(serial_number)
-                            # Estimate age: younger serial numbers = older people
-                            # Assuming serial numbers 1-50 are older (40-60), 51-100 are middle-aged (25-40), 101+ are younger (18-35)
-                            if serial_num <= 50:
-                                estimated_age = 50 - (serial_num * 0.4)  # 30-50 years
-                            elif serial_num <= 100:
-                                estimated_age = 40 - ((serial_num - 50) * 0.3)  # 25-40 years
-                            else:
-                                estimated_age = 35 - ((serial_num - 100) * 0.2)  # 18-35 years
-                            
-                            estimated_age = max(18, min(65, int(estimated_age)))
-                        except (ValueError, TypeError):
-                            estimated_age = 35  # Default age
-                        
-                        claimant['estimated_age'] = estimated_age
-                        
-                        # Startup India eligibility logic:
-                        # 1. Age factor: 18-45 years have higher startup potential
-                        # 2. Land resources: Can be leveraged for agri-tech startups
-                        # 3. Community background: SC/ST get priority for startup support
-                        # 4. Gender inclusion: Women get special startup incentives
-                        # 5. Economic need: Small landholders have higher motivation
-                        
-                        is_eligible = 18 <= estimated_age <= 45  # Age criteria for startup potential
-                        is_priority = False
-                        is_high_priority = False
-                        
-                        # Startup potential assessment
-                        startup_potential = "Limited"
-                        age_group = "Senior"
-                        startup_phase = "Mature"
-                        
-                        if 18 <= estimated_age <= 30:
-                            age_group = "Young Adult"
-                            startup_phase = "Early Stage"
-                        elif 31 <= estimated_age <= 40:
-                            age_group = "Adult"
-                            startup_phase = "Growth Stage"
-                        elif 41 <= estimated_age <= 45:
-                            age_group = "Experienced"
-                            startup_phase = "Expansion Stage"
-                        
-                        # Priority criteria - small landholders have higher motivation
-                        if area <= 2.0 and is_eligible:  # Small landholders
-                            is_priority = True
-                            startup_potential = "Good"
-                        
-                        # High priority criteria
-                        name_lower = claimant.get('claimant_name', '').lower()
-                        
-                        # SC/ST communities get high priority for startup support
-                        sc_st_indicators = ['chaudhari', 'gavali', 'malche', 'pawar', 'ahire', 'gaikwad', 'sonvane', 'gangurde', 'badhir', 'bhoye', 'deshmukh']
-                        if any(indicator in name_lower for indicator in sc_st_indicators) and is_eligible:
-                            is_high_priority = True
-                            startup_potential = "Excellent"
-                        
-                        # Women get high priority for startup incentives
-                        women_indicators = ['bai', 'ya', 'i']
-                        if any(name_lower.endswith(indicator) for indicator in women_indicators) and is_eligible:
-                            is_high_priority = True
-                            if startup_potential == "Limited":
-                                startup_potential = "Good"
-                        
-                        # Very small landholders get high priority (higher motivation)
-                        if area <= 1.0 and is_eligible:
-                            is_high_priority = True
-                            startup_potential = "Excellent"
-                        
-                        # Young adults (18-30) get high priority
-                        if 18 <= estimated_age <= 30 and is_eligible:
-                            is_high_priority = True
-                            startup_potential = "Excellent"
-                        
-                        # Areas with no claim number (likely need economic opportunities) get high priority
-                        if (not claimant.get('claim_number') or claimant.get('claim_number') == 'null') and is_eligible:
-                            is_high_priority = True
-                            startup_potential = "Excellent"
-                        
-                        # Startup potential levels
-                        if startup_potential == "Limited":
-                            startup_potential = "Limited - Focus on Traditional Skills"
-                        elif startup_potential == "Good":
-                            startup_potential = "Good - Agri-Tech & Rural Business Potential"
-                        elif startup_potential == "Excellent":
-                            startup_potential = "Excellent - High Startup Potential"
-                        
-                        claimant['eligible'] = is_eligible
-                        claimant['priority'] = is_priority
-                        claimant['high_priority'] = is_high_priority
-                        claimant['startup_potential'] = startup_potential
-                        claimant['age_group'] = age_group
-                        claimant['startup_phase'] = startup_phase
-                        
-                        if is_eligible:
-                            eligible_claimants += 1
-                        if is_priority:
-                            priority_claimants += 1
-                        if is_high_priority:
-                            high_priority_claimants += 1
-                        
-                        total_claimants += 1
-                        processed_claimants.append(claimant)
-                    
-                    village_data['claimants'] = processed_claimants
-                    villages_data.append(village_data)
-                    
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-                    continue
-    
-    context = {
-        'villages_data': villages_data,
-        'total_claimants': total_claimants,
-        'eligible_claimants': eligible_claimants,
-        'priority_claimants': priority_claimants,
-        'high_priority_claimants': high_priority_claimants,
-    }
-    
-    return render(request, 'startup_india_details.html', context)
\ No newline at end of file
+    return render(request, 'startup_india_details.html', _scheme_context(request, 'startup_india'))
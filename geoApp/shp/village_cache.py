@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+####################################################################################
+# In-process cache of the data/villages JSON corpus
+####################################################################################
+def _normalize(document):
+    """Make sure every village document has the keys the views rely on"""
+    details = document.get('document_details') or {}
+    claimants = [claimant for claimant in document.get('claimants') or []
+                 if isinstance(claimant, dict)]
+    return {
+        'document_details': {
+            **details,
+            'village_name': details.get('village_name', ''),
+            'taluka': details.get('taluka', ''),
+            'district': details.get('district', ''),
+        },
+        'claimants': claimants,
+    }
+
+
+class VillageCorpusCache:
+    """
+    Keeps the parsed corpus keyed by the (name, mtime, size) of every file and re-parses
+    only the files whose mtime or size changed. At most `max_claimants` claimants are
+    kept (VILLAGE_CORPUS_CACHE_MAX_CLAIMANTS), files in name order until the bound; the
+    rest are parsed on each read and the frame of such a corpus is rebuilt on each read.
+    Files that fail to parse are logged once and skipped until they change.
+    """
+
+    def __init__(self, directory, max_claimants=None):
+        self.directory = directory
+        self.max_claimants = max_claimants
+        self._entries = {}  # path -> ((mtime_ns, size), document), the kept files of the last snapshot
+        self._failed = {}  # path -> (mtime_ns, size) of the files that did not parse
+        self._signature = None
+        self._documents = []
+        self._lock = threading.Lock()
+        self._frame_key = None
+        self._frame = None
+
+    def _max_claimants(self):
+        if self.max_claimants is not None:
+            return self.max_claimants
+        return getattr(settings, 'VILLAGE_CORPUS_CACHE_MAX_CLAIMANTS', 200000)
+
+    def _scan(self):
+        """Cheap stat of every *.json file in the directory, sorted by name"""
+        if not os.path.isdir(self.directory):
+            return []
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json') and entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, entry.path, (stat.st_mtime_ns, stat.st_size)))
+        files.sort()
+        return files
+
+    def _load(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return _normalize(json.load(f))
+
+    def snapshot(self):
+        """
+        Return (signature, documents) for the current state of the corpus. The signature
+        is None when the corpus is larger than the bound and was not kept whole.
+        """
+        files = self._scan()
+        signature = tuple((filename, file_signature) for filename, _, file_signature in files)
+        with self._lock:
+            if self._signature is not None and self._signature == signature:
+                return self._signature, self._documents
+
+            entries, failed, documents, kept = {}, {}, [], 0
+            for filename, path, file_signature in files:
+                cached = self._entries.get(path)
+                if cached is not None and cached[0] == file_signature:
+                    document = cached[1]
+                elif self._failed.get(path) == file_signature:
+                    failed[path] = file_signature
+                    continue
+                else:
+                    try:
+                        document = self._load(path)
+                    except Exception:
+                        logger.exception('Skipping village file %s until it changes', filename)
+                        failed[path] = file_signature
+                        continue
+                documents.append(document)
+                if kept + len(document['claimants']) <= self._max_claimants():
+                    kept += len(document['claimants'])
+                    entries[path] = (file_signature, document)
+            # Files that disappeared are dropped with the previous entries
+            self._entries = entries
+            self._failed = failed
+            complete = len(entries) == len(documents)
+            self._signature = signature if complete else None
+            self._documents = documents if complete else []
+            return self._signature, documents
+
+    def documents(self):
+        return self.snapshot()[1]
+
+    def frame(self, build):
+        """Return (documents, build(documents)), rebuilding only when a file changed"""
+        signature, documents = self.snapshot()
+        if signature is None:
+            # Over the bound, the frame would hold the whole corpus again
+            with self._lock:
+                self._frame_key = self._frame = None
+            return documents, build(documents)
+        with self._lock:
+            if self._frame_key != signature:
+                self._frame = build(documents)
+                self._frame_key = signature
+            return documents, self._frame
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._failed = {}
+            self._signature = None
+            self._documents = []
+            self._frame_key = None
+            self._frame = None
+
+
+village_corpus = VillageCorpusCache(os.path.join(settings.BASE_DIR, 'data', 'villages'))
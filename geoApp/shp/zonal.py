@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+import shapely
+
+####################################################################################
+# Per-parcel zonal statistics over windowed raster reads (no Django, runs in workers)
+####################################################################################
+# Tiff.kind values the engine reads
+FOREST_COVER = 'forest_cover'
+ELEVATION = 'elevation'
+
+# Classes of the forest cover rasters counted as forest
+DEFAULT_FOREST_VALUES = (1,)
+
+# Metres per degree, used for the pixel size of lon/lat DEMs
+_METRES_PER_DEGREE = 111320.0
+
+
+def _window(src, bounds, pad=0):
+    """Pixel window covering bounds (in the raster CRS), grown by pad pixels, None when outside"""
+    from rasterio.windows import Window
+
+    left, bottom, right, top = bounds
+    row_start, col_start = src.index(left, top, op=math.floor)
+    row_stop, col_stop = src.index(right, bottom, op=math.floor)
+    row_start, row_stop = sorted((row_start, row_stop))
+    col_start, col_stop = sorted((col_start, col_stop))
+    row_start, col_start = max(row_start - pad, 0), max(col_start - pad, 0)
+    row_stop, col_stop = min(row_stop + 1 + pad, src.height), min(col_stop + 1 + pad, src.width)
+    if row_start >= row_stop or col_start >= col_stop:
+        return None
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def _parcel_pixels(src, geometry, pad=0):
+    """(masked band 1 values, inside mask) of the window around a parcel in the raster CRS"""
+    from rasterio.features import geometry_mask
+
+    window = _window(src, geometry.bounds, pad)
+    if window is None:
+        return None, None
+    values = src.read(1, window=window, masked=True)
+    shape, transform = values.shape, src.window_transform(window)
+    inside = geometry_mask([geometry], out_shape=shape, transform=transform, invert=True)
+    if not inside.any():
+        # Parcels smaller than a pixel still get the pixels they touch
+        inside = geometry_mask([geometry], out_shape=shape, transform=transform, invert=True, all_touched=True)
+    return values, inside
+
+
+def forest_cover_fraction(src, geometry, forest_values=DEFAULT_FOREST_VALUES):
+    """Share of the valid pixels of the parcel classified as forest, None without valid pixels"""
+    values, inside = _parcel_pixels(src, geometry)
+    if values is None:
+        return None
+    valid = inside & ~np.ma.getmaskarray(values)
+    if not valid.any():
+        return None
+    return float(np.isin(values.data[valid], forest_values).mean())
+
+
+def _pixel_size(src, latitude):
+    """Pixel width and height in metres"""
+    width, height = abs(src.transform.a), abs(src.transform.e)
+    if src.crs is not None and src.crs.is_geographic:
+        return (width * _METRES_PER_DEGREE * math.cos(math.radians(latitude)),
+                height * _METRES_PER_DEGREE)
+    return width, height
+
+
+def elevation_and_slope(src, geometry):
+    """(mean elevation, mean slope in degrees) over the parcel, (None, None) without valid pixels"""
+    # One extra pixel around the parcel so the slope of its edge pixels has neighbours
+    values, inside = _parcel_pixels(src, geometry, pad=1)
+    if values is None:
+        return None, None
+    valid = inside & ~np.ma.getmaskarray(values)
+    if not valid.any():
+        return None, None
+
+    elevation = values.astype(np.float64).filled(np.nan)
+    slope = None
+    if min(elevation.shape) > 1:
+        dx, dy = _pixel_size(src, geometry.centroid.y)
+        gradient_y, gradient_x = np.gradient(elevation, dy, dx)
+        degrees = np.degrees(np.arctan(np.hypot(gradient_x, gradient_y)))[valid]
+        degrees = degrees[~np.isnan(degrees)]
+        slope = float(degrees.mean()) if degrees.size else None
+    return float(elevation[valid].mean()), slope
+
+
+def _to_raster_crs(geometry, src):
+    """Parcel geometry (EPSG:4326) in the CRS of the raster"""
+    from rasterio.crs import CRS
+    from rasterio.warp import transform_geom
+
+    if src.crs is None or src.crs == CRS.from_epsg(4326):
+        return geometry
+    return shapely.geometry.shape(transform_geom('EPSG:4326', src.crs, shapely.geometry.mapping(geometry)))
+
+
+def parcel_statistics(datasets, geometry, candidates, forest_values=DEFAULT_FOREST_VALUES):
+    """
+    Metrics of one parcel from the first candidate raster of each kind with valid pixels.
+    `datasets` maps raster names to (kind, open dataset), candidates are raster names,
+    finest resolution first.
+    """
+    result = {'forest_cover_fraction': None, 'mean_elevation': None, 'mean_slope': None, 'sources': {}}
+    for name in candidates:
+        kind, src = datasets[name]
+        if kind in result['sources']:
+            continue
+        shape = _to_raster_crs(geometry, src)
+        if kind == FOREST_COVER:
+            fraction = forest_cover_fraction(src, shape, forest_values)
+            if fraction is not None:
+                result['forest_cover_fraction'] = fraction
+                result['sources'][kind] = name
+        elif kind == ELEVATION:
+            elevation, slope = elevation_and_slope(src, shape)
+            if elevation is not None:
+                result['mean_elevation'], result['mean_slope'] = elevation, slope
+                result['sources'][kind] = name
+    return result
+
+
+def compute_chunk(rasters, parcels, forest_values=DEFAULT_FOREST_VALUES):
+    """
+    Zonal statistics of a chunk of parcels, the unit of work of the process pool.
+    rasters: [{'name', 'kind', 'path'}], parcels: [(key, WKB in EPSG:4326, candidate raster names)].
+    Every raster is opened once per chunk. Returns [(key, metrics)].
+    """
+    import rasterio
+
+    datasets = {}
+    try:
+        for raster in rasters:
+            datasets[raster['name']] = (raster['kind'], rasterio.open(raster['path']))
+        results = []
+        for key, wkb, candidates in parcels:
+            geometry = shapely.from_wkb(bytes(wkb))
+            results.append((key, parcel_statistics(datasets, geometry, candidates, forest_values)))
+        return results
+    finally:
+        for _, src in datasets.values():
+            src.close()
@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .highlights import shapefile_village_name
+from .loader import GEOMETRY_COLUMN, quote_ident
+from .models import Claimant, ParcelStatistics, Shp
+from .zonal import DEFAULT_FOREST_VALUES, ELEVATION, FOREST_COVER, compute_chunk
+
+# Parcels per task handed to a worker, each task opens the rasters once
+CHUNK_SIZE = 200
+
+ZONAL_KINDS = [FOREST_COVER, ELEVATION]
+
+METRIC_FIELDS = ['forest_cover_fraction', 'mean_elevation', 'mean_slope', 'sources']
+
+
+####################################################################################
+# Incremental refresh of ParcelStatistics
+####################################################################################
+def zonal_rasters():
+    """Published forest cover and elevation rasters with their EPSG:4326 bounds, finest first"""
+    import rasterio
+    from rasterio.warp import transform_bounds
+    from tiff.models import Tiff
+
+    rasters = []
+    for tiff in Tiff.objects.filter(kind__in=ZONAL_KINDS, status=Tiff.PUBLISHED).order_by('pk'):
+        raster = tiff.raster_file
+        if not raster or not os.path.exists(raster.path):
+            continue
+        with rasterio.open(raster.path) as src:
+            bounds = tuple(transform_bounds(src.crs, 'EPSG:4326', *src.bounds)) if src.crs else tuple(src.bounds)
+            width = src.width
+        rasters.append({
+            'name': raster.name,
+            'kind': tiff.kind,
+            'path': raster.path,
+            'bounds': bounds,
+            # Degrees per pixel, comparable across rasters in different CRSs
+            'resolution': (bounds[2] - bounds[0]) / width,
+        })
+    return sorted(rasters, key=lambda raster: raster['resolution'])
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _parcel_columns(cursor, layer):
+    """(vill_name column, patta_id column) of data.<layer>, None when it is not a parcel layer"""
+    cursor.execute('SELECT column_name FROM information_schema.columns '
+                   'WHERE table_schema = %s AND table_name = %s', ['data', layer])
+    columns = {name.lower(): name for name, in cursor.fetchall()}
+    if 'vill_name' not in columns or 'patta_id' not in columns or GEOMETRY_COLUMN not in columns:
+        return None
+    return columns['vill_name'], columns['patta_id']
+
+
+def table_srid(cursor, layer):
+    """SRID of data.<layer> as recorded at ingest, else from PostGIS"""
+    srid = Shp.objects.filter(name=layer).values_list('srid', flat=True).first()
+    if srid is None:
+        cursor.execute('SELECT Find_SRID(%s, %s, %s)', ['data', layer, GEOMETRY_COLUMN])
+        srid = cursor.fetchone()[0]
+    # Layers uploaded without a .prj are taken to be lon/lat
+    return int(srid or 4326)
+
+
+def _parcel_rows(layer, select, keys=None):
+    """
+    Rows (vill_name, patta_id, *select) of the parcels of a layer, `select` being SQL over the
+    merged EPSG:4326 `geom` of each parcel, only the parcels in `keys` when given.
+    None when the layer has no parcel attributes.
+    """
+    if not Shp.objects.filter(name=layer).exists():
+        return None
+    with connection.cursor() as cursor:
+        columns = _parcel_columns(cursor, layer)
+        if columns is None:
+            return None
+        vill_name, patta_id = (f't.{quote_ident(column)}' for column in columns)
+        srid = table_srid(cursor, layer)
+        pattern = r'^\s*[0-9]+(\.0*)?\s*$'
+        params = [pattern, pattern]
+        selected = ''
+        if keys is not None:
+            selected = 'AND (vill_name, patta_id) IN (SELECT * FROM unnest(%s::text[], %s::integer[]))'
+            params += [[key[0] for key in keys], [key[1] for key in keys]]
+        # The CASE keeps the cast safe should the key filter be evaluated before the pattern
+        cursor.execute(
+            f'SELECT vill_name, patta_id, {select} FROM ('
+            f'SELECT {vill_name}::text AS vill_name, '
+            f'CASE WHEN {patta_id}::text ~ %s THEN {patta_id}::numeric::integer END AS patta_id, '
+            f'ST_Transform(ST_SetSRID(ST_Union(t.{GEOMETRY_COLUMN}), {srid}), 4326) AS geom '
+            f'FROM {quote_ident("data")}.{quote_ident(layer)} t '
+            f'WHERE {vill_name} IS NOT NULL AND {patta_id}::text ~ %s '
+            f'GROUP BY 1, 2) p WHERE NOT ST_IsEmpty(geom) {selected}',
+            params)
+        return cursor.fetchall()
+
+
+def layer_parcels(layer):
+    """
+    {(vill_name, patta_id): (geometry md5, EPSG:4326 bbox)} of a parcel layer, features of the
+    same parcel merged. None when the layer has no parcel attributes.
+    """
+    rows = _parcel_rows(layer, 'md5(ST_AsBinary(geom)), ST_XMin(geom), ST_YMin(geom), ST_XMax(geom), ST_YMax(geom)')
+    if rows is None:
+        return None
+    return {(row[0], row[1]): (row[2], tuple(row[3:7])) for row in rows}
+
+
+def parcel_geometries(layer, keys):
+    """{(vill_name, patta_id): EPSG:4326 WKB} of the given parcels of a layer"""
+    if not keys:
+        return {}
+    rows = _parcel_rows(layer, 'ST_AsBinary(geom)', keys)
+    return {(row[0], row[1]): bytes(row[2]) for row in rows or []}
+
+
+def zonal_workers():
+    """Processes reading the rasters, ZONAL_MAX_WORKERS"""
+    return getattr(settings, 'ZONAL_MAX_WORKERS', 4)
+
+
+def _claimant_ids():
+    """{(shapefile village name, serial_number): claimant id}, how parcels map to claimants"""
+    return {(shapefile_village_name(vill_name or village), serial): pk for pk, village, vill_name, serial in
+            Claimant.objects.values_list('pk', 'village_name', 'location__vill_name', 'serial_number')}
+
+
+def _compute(rasters, parcels, workers):
+    """Zonal statistics of [(key, wkb, candidates)], in chunks on a process pool when workers > 1"""
+    forest_values = tuple(getattr(settings, 'ZONAL_FOREST_VALUES', DEFAULT_FOREST_VALUES))
+    chunks = []
+    for start in range(0, len(parcels), CHUNK_SIZE):
+        chunk = parcels[start:start + CHUNK_SIZE]
+        needed = {name for _, _, candidates in chunk for name in candidates}
+        chunks.append(([raster for raster in rasters if raster['name'] in needed], chunk))
+
+    if workers <= 1 or len(chunks) <= 1:
+        return [result for chunk_rasters, chunk in chunks
+                for result in compute_chunk(chunk_rasters, chunk, forest_values)]
+    # shp.zonal does not touch Django, the spawned workers need no setup
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(compute_chunk, chunk_rasters, chunk, forest_values)
+                   for chunk_rasters, chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+def refresh_layer(layer, rasters=None, workers=None, full=False, claimant_ids=None):
+    """
+    Bring the ParcelStatistics of one layer up to date. Only parcels that are new, whose
+    geometry changed or whose overlapping zonal rasters changed are read from the database
+    and the rasters, in `workers` processes (ZONAL_MAX_WORKERS by default).
+    Returns {'parcels', 'computed', 'deleted'}.
+    """
+    parcels = layer_parcels(layer)
+    if parcels is None:
+        deleted, _ = ParcelStatistics.objects.filter(layer=layer).delete()
+        return {'parcels': 0, 'computed': 0, 'deleted': deleted}
+    rasters = zonal_rasters() if rasters is None else rasters
+    claimant_ids = _claimant_ids() if claimant_ids is None else claimant_ids
+    existing = {(row.vill_name, row.patta_id): row for row in ParcelStatistics.objects.filter(layer=layer)}
+
+    rows = {}
+    for key, (geometry_hash, bbox) in parcels.items():
+        candidates = [raster['name'] for raster in rasters if _intersects(raster['bounds'], bbox)]
+        row = existing.get(key)
+        if full or row is None or row.geometry_hash != geometry_hash or row.rasters != candidates:
+            rows[key] = ParcelStatistics(layer=layer, vill_name=key[0], patta_id=key[1],
+                                         geometry_hash=geometry_hash, rasters=candidates)
+
+    # Geometries are only fetched for the parcels to compute
+    geometries = parcel_geometries(layer, list(rows))
+    rows = {key: row for key, row in rows.items() if key in geometries}
+    todo = [(key, geometries[key], row.rasters) for key, row in rows.items()]
+    workers = zonal_workers() if workers is None else workers
+    for key, metrics in _compute(rasters, todo, workers):
+        for field in METRIC_FIELDS:
+            setattr(rows[key], field, metrics[field])
+    for key, row in rows.items():
+        row.claimant_id = claimant_ids.get((shapefile_village_name(key[0]), key[1]))
+
+    # Unchanged parcels only follow claimant additions and removals
+    relinked = []
+    for key, row in existing.items():
+        claimant_id = claimant_ids.get((shapefile_village_name(key[0]), key[1]))
+        if key in parcels and key not in rows and row.claimant_id != claimant_id:
+            row.claimant_id = claimant_id
+            relinked.append(row)
+
+    gone = [row.pk for key, row in existing.items() if key not in parcels]
+    with transaction.atomic():
+        ParcelStatistics.objects.filter(pk__in=gone).delete()
+        ParcelStatistics.objects.bulk_create(
+            rows.values(), batch_size=1000, update_conflicts=True,
+            unique_fields=['layer', 'vill_name', 'patta_id'],
+            update_fields=METRIC_FIELDS + ['claimant', 'geometry_hash', 'rasters', 'computed_at'])
+        ParcelStatistics.objects.bulk_update(relinked, ['claimant'], batch_size=1000)
+    return {'parcels': len(parcels), 'computed': len(rows), 'deleted': len(gone)}
+
+
+def refresh(layers=None, workers=None, full=False):
+    """Refresh the given layers, or every ingested layer and drop the rows of deleted ones"""
+    if layers is None:
+        layers = list(Shp.objects.order_by('name').values_list('name', flat=True).distinct())
+        ParcelStatistics.objects.exclude(layer__in=layers).delete()
+    rasters = zonal_rasters()
+    claimant_ids = _claimant_ids()
+    return {layer: refresh_layer(layer, rasters, workers, full, claimant_ids) for layer in layers}
@@ -3,4 +3,8 @@ from .models import Tiff
 
 
 # Register your models here.
-admin.site.register(Tiff) 
\ No newline at end of file
+@admin.register(Tiff)
+class TiffAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'status', 'original_size', 'optimized_size', 'uploaded_date']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['optimized_file', 'original_size', 'optimized_size', 'raster_stats', 'status', 'error']
@@ -0,0 +1,45 @@
+import os
+
+# Internal tile size and compression of the optimized rasters
+COG_BLOCKSIZE = 512
+COG_COMPRESS = 'DEFLATE'
+
+
+####################################################################################
+# Cloud-Optimized GeoTIFF conversion (rasterio is imported in the worker only)
+####################################################################################
+def cog_name(name):
+    """Storage name of the optimized copy of an uploaded raster"""
+    return f'{os.path.splitext(name)[0]}_cog.tif'
+
+
+def overview_resampling(src):
+    """Class rasters (forest cover) keep their values in overviews, continuous ones are averaged"""
+    from rasterio.enums import ColorInterp
+
+    single_band = src.count == 1
+    if single_band and (src.dtypes[0] == 'uint8' or src.colorinterp[0] == ColorInterp.palette):
+        return 'NEAREST'
+    return 'AVERAGE'
+
+
+def convert_to_cog(src_path, dst_path, blocksize=COG_BLOCKSIZE, compress=COG_COMPRESS):
+    """
+    Rewrite a raster as a tiled, compressed COG with internal overviews.
+    Returns the size in bytes of the written file.
+    """
+    import rasterio
+    import rasterio.shutil
+
+    tmp_path = f'{dst_path}.tmp'
+    with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS'):
+        with rasterio.open(src_path) as src:
+            resampling = overview_resampling(src)
+            rasterio.shutil.copy(
+                src, tmp_path, driver='COG',
+                BLOCKSIZE=blocksize, COMPRESS=compress, OVERVIEWS='AUTO', RESAMPLING=resampling,
+                # The predictor only pays off on continuous data such as elevation
+                PREDICTOR='NO' if resampling == 'NEAREST' else 'YES', BIGTIFF='IF_SAFER')
+    # Readers never see a half-written file
+    os.replace(tmp_path, dst_path)
+    return os.path.getsize(dst_path)
@@ -0,0 +1,104 @@
+import os
+import traceback
+
+from django.db import close_old_connections, transaction
+
+from shp.jobs import submit
+from .models import Tiff
+
+
+####################################################################################
+# Raster optimization and publishing, run in the shared worker pool (shp.jobs)
+####################################################################################
+def enqueue_publish(instance):
+    """Optimize and publish a Tiff upload in a worker once the save commits"""
+    Tiff.objects.filter(pk=instance.pk).update(status=Tiff.PENDING, error='')
+    transaction.on_commit(lambda: submit(run_publish, instance.pk))
+
+
+def optimize(tiff):
+    """Write the COG copy of the upload unless the current file was already converted"""
+    from .cog import cog_name, convert_to_cog
+
+    storage = tiff.file.storage
+    name = cog_name(tiff.file.name)
+    if tiff.optimized_file.name == name and storage.exists(name):
+        return {}
+    return {
+        'original_size': os.path.getsize(tiff.file.path),
+        'optimized_size': convert_to_cog(tiff.file.path, storage.path(name)),
+        'optimized_file': name,
+    }
+
+
+def delete_optimized(storage, name):
+    """Remove a COG copy that no Tiff publishes any more"""
+    if name and not Tiff.objects.filter(optimized_file=name).exists():
+        storage.delete(name)
+
+
+def compute_stats(tiff):
+    """Statistics of the published raster, computed once per file"""
+    from django.conf import settings
+    from .raster_stats import MAX_EXACT_PIXELS, raster_statistics
+
+    raster = tiff.raster_file
+    if tiff.raster_stats and tiff.raster_stats.get('source') == raster.name:
+        return {}
+    stats = raster_statistics(raster.path, max_pixels=getattr(settings, 'RASTER_STATS_MAX_PIXELS', MAX_EXACT_PIXELS))
+    stats['source'] = raster.name
+    return {'raster_stats': stats}
+
+
+def publish(tiff):
+    """Publish the optimized raster to the geoserver using geoserver-rest"""
+    from shp.connections import connection_manager
+    from shp.tile_cache import tile_cache
+    from .styles import coverage_sld
+
+    path = tiff.raster_file.path
+    geo = connection_manager.geoserver
+    geo.create_coveragestore(path, workspace='geoapp', layer_name=tiff.name)
+    # Color ramp from the stored statistics, the raster is not read again
+    geo.upload_sld(tiff.name, coverage_sld(tiff.name, tiff.raster_stats), workspace='geoapp')
+    geo.publish_style(layer_name=tiff.name, style_name=tiff.name, workspace='geoapp')
+    tile_cache.invalidate(tiff.name)
+
+
+def run_publish(tiff_id):
+    close_old_connections()
+    tiff = Tiff.objects.filter(pk=tiff_id).first()
+    if tiff is None:
+        return
+    records = Tiff.objects.filter(pk=tiff_id)
+    records.update(status=Tiff.PROCESSING)
+    previous = tiff.optimized_file.name
+    try:
+        for step in (optimize, compute_stats):
+            fields = step(tiff)
+            # update() so recording the result does not trigger another publish
+            records.update(**fields)
+            for field, value in fields.items():
+                setattr(tiff, field, value)
+        publish(tiff)
+    except Exception as e:
+        records.update(status=Tiff.FAILED, error=traceback.format_exc())
+        print("There is problem during tiff upload: ", e)
+        return
+    records.update(status=Tiff.PUBLISHED)
+    # The coverage store now reads the new COG, the one of the replaced upload can go
+    if previous and previous != tiff.optimized_file.name:
+        delete_optimized(tiff.optimized_file.storage, previous)
+
+    if tiff.kind:
+        refresh_zonal_stats()
+
+
+def refresh_zonal_stats():
+    """Recompute the parcel statistics that overlap a new or changed forest cover or DEM raster"""
+    from shp.zonal_store import refresh
+
+    try:
+        refresh()
+    except Exception as e:
+        print("There is problem during zonal statistics refresh: ", e)
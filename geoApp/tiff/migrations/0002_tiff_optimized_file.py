@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2025-09-13 15:05
+
+from django.db import migrations, models
+
+
+def mark_published(apps, schema_editor):
+    # Rasters uploaded before this change were published synchronously on save
+    apps.get_model('tiff', 'Tiff').objects.update(status='published')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiff', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tiff',
+            name='optimized_file',
+            field=models.FileField(blank=True, editable=False, upload_to='%Y/%m/%d'),
+        ),
+        migrations.AddField(
+            model_name='tiff',
+            name='original_size',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tiff',
+            name='optimized_size',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tiff',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('published', 'Published'), ('failed', 'Failed')], default='pending', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='tiff',
+            name='error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(mark_published, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2025-09-13 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiff', '0002_tiff_optimized_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tiff',
+            name='raster_stats',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
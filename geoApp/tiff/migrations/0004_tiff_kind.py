@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2025-09-14 10:12
+
+from django.db import migrations, models
+
+
+def guess_kind(apps, schema_editor):
+    # Existing uploads are recognized by name, e.g. *_Forest_Cover_2024 and dem
+    Tiff = apps.get_model('tiff', 'Tiff')
+    for tiff in Tiff.objects.all():
+        name = tiff.name.lower()
+        if 'forest' in name:
+            tiff.kind = 'forest_cover'
+        elif name == 'dem' or 'elevation' in name:
+            tiff.kind = 'elevation'
+        else:
+            continue
+        tiff.save(update_fields=['kind'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiff', '0003_tiff_raster_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tiff',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('', 'Other'), ('forest_cover', 'Forest cover'), ('elevation', 'Elevation (DEM)')], default='', max_length=20),
+        ),
+        migrations.RunPython(guess_kind, migrations.RunPython.noop),
+    ]
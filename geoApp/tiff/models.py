@@ -2,47 +2,73 @@ from django.db import models
 import datetime
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-import geopandas as gpd
-import os
-import glob
-import zipfile
-from sqlalchemy import *
-# This fiona import is good practice to have when working with geopandas
-import fiona
-from geo.Geoserver import Geoserver
+from shp.connections import connection_manager
+from shp.tile_cache import tile_cache
 
-# initializing the library
-geo = Geoserver('http://127.0.0.1:8080/geoserver',
-                username='admin', password='geoserver')
 
-
-# The shapefile model
+# The raster model
 class Tiff(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    PUBLISHED = 'published'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (PUBLISHED, 'Published'),
+        (FAILED, 'Failed'),
+    ]
+
+    OTHER = ''
+    FOREST_COVER = 'forest_cover'
+    ELEVATION = 'elevation'
+    KIND_CHOICES = [
+        (OTHER, 'Other'),
+        (FOREST_COVER, 'Forest cover'),
+        (ELEVATION, 'Elevation (DEM)'),
+    ]
+
     name = models.CharField(max_length=50)
+    # Forest cover and elevation rasters feed the per-parcel statistics (shp.zonal_store)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=OTHER, blank=True)
     description = models.CharField(max_length=1000, blank=True)
     file = models.FileField(upload_to='%Y/%m/%d')
     uploaded_date = models.DateField(default=datetime.date.today, blank=True)
+    # Tiled, compressed Cloud-Optimized GeoTIFF with overviews, written by tiff.jobs
+    optimized_file = models.FileField(upload_to='%Y/%m/%d', blank=True, editable=False)
+    original_size = models.BigIntegerField(null=True, blank=True, editable=False)
+    optimized_size = models.BigIntegerField(null=True, blank=True, editable=False)
+    # min/max/mean/std, percentiles, histogram and nodata ratio of band 1 (tiff.raster_stats)
+    raster_stats = models.JSONField(null=True, blank=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, editable=False)
+    error = models.TextField(blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
+    @property
+    def raster_file(self):
+        """The COG once the upload is optimized, the upload itself until then"""
+        return self.optimized_file if self.optimized_file else self.file
 
+
+# Django post save signal, the raster is optimized and published in the worker pool (tiff.jobs)
 @receiver(post_save, sender=Tiff)
 def publish_data(sender, instance, created, **kwargs):
-    file = instance.file.path
-    file_format = os.path.basename(file).split('.')[-1]
-    file_name = os.path.basename(file).split('.')[0]
-    file_path = os.path.dirname(file)
-    name = instance.name
-
-    '''
-    Publish tiff file to geoserver using geoserver-rest
-    '''
-    geo.create_coveragestore(file, workspace='geoapp', layer_name=name)
-    geo.create_coveragestyle(file, style_name=name, workspace='geoapp')
-    geo.publish_style(layer_name=name, style_name=name, workspace='geoapp')
+    from .jobs import enqueue_publish
+    enqueue_publish(instance)
 
 
 @receiver(post_delete, sender=Tiff)
 def delete_data(sender, instance, **kwargs):
-    geo.delete_layer(instance.name, 'geoapp')
\ No newline at end of file
+    from django.db import transaction
+    from .jobs import delete_optimized
+    connection_manager.geoserver.delete_layer(instance.name, 'geoapp')
+    tile_cache.invalidate(instance.name)
+    optimized = instance.optimized_file
+    transaction.on_commit(lambda: delete_optimized(optimized.storage, optimized.name))
+    if instance.kind:
+        # Parcel statistics read from this raster fall back to the remaining ones
+        from shp.jobs import submit
+        from .jobs import refresh_zonal_stats
+        transaction.on_commit(lambda: submit(refresh_zonal_stats))
@@ -0,0 +1,136 @@
+import numpy as np
+
+PERCENTILES = [2, 5, 25, 50, 75, 95, 98]
+
+# Bins of the stored histogram
+HISTOGRAM_BINS = 64
+
+# Bins used to locate percentiles of float rasters
+_FINE_BINS = 4096
+
+# Rasters with more pixels than this are summarized from their overviews
+MAX_EXACT_PIXELS = 50_000_000
+
+
+####################################################################################
+# Block-wise raster statistics (rasterio is imported in the worker only)
+####################################################################################
+def overview_level(src, max_pixels):
+    """Finest overview with at most max_pixels, None to read the full resolution"""
+    if src.width * src.height <= max_pixels:
+        return None
+    factors = src.overviews(1)
+    for level, factor in enumerate(factors):
+        if (src.width // factor) * (src.height // factor) <= max_pixels:
+            return level
+    return len(factors) - 1 if factors else None
+
+
+def _blocks(path, band, level):
+    """Masked arrays of one band, one internal block at a time"""
+    import rasterio
+
+    with rasterio.open(path, overview_level=level) as src:
+        for _, window in src.block_windows(band):
+            yield src.read(band, window=window, masked=True)
+
+
+def _valid_values(block):
+    """Pixels of a masked block that are not nodata, nor NaN or infinite in float rasters"""
+    values = block.compressed()
+    if values.dtype.kind == 'f':
+        # Float rasters often mark nodata with NaN without declaring it
+        values = values[np.isfinite(values)]
+    return values
+
+
+def _integer_counts(dtype):
+    """Offset for a bincount over the whole value range of small integer types, None otherwise"""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu' and dtype.itemsize <= 2:
+        return -int(np.iinfo(dtype).min)
+    return None
+
+
+def _percentiles(edges, counts):
+    """Values at PERCENTILES from a histogram (left bin edges)"""
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1] if len(cumulative) else 0
+    if not total:
+        return {f'p{p}': None for p in PERCENTILES}
+    return {f'p{p}': float(edges[min(np.searchsorted(cumulative, total * p / 100), len(counts) - 1)])
+            for p in PERCENTILES}
+
+
+def raster_statistics(path, band=1, max_pixels=MAX_EXACT_PIXELS):
+    """
+    Min, max, mean, std, percentiles, histogram and nodata ratio of one band, streamed
+    block by block. Large rasters are read from the finest overview under max_pixels.
+    """
+    import rasterio
+
+    with rasterio.open(path) as src:
+        level = overview_level(src, max_pixels)
+        dtype = src.dtypes[band - 1]
+        width, height = src.width, src.height
+
+    offset = _integer_counts(dtype)
+    bincount = np.zeros(2 ** (8 * np.dtype(dtype).itemsize), dtype=np.int64) if offset is not None else None
+    pixels = valid = 0
+    total = total_sq = 0.0
+    low, high = np.inf, -np.inf
+    for block in _blocks(path, band, level):
+        values = _valid_values(block)
+        pixels += block.size
+        valid += values.size
+        if not values.size:
+            continue
+        low, high = min(low, values.min()), max(high, values.max())
+        total += values.sum(dtype=np.float64)
+        total_sq += np.square(values, dtype=np.float64).sum()
+        if bincount is not None:
+            bincount += np.bincount(values.astype(np.int64) + offset, minlength=len(bincount))
+
+    stats = {
+        'band': band,
+        'dtype': dtype,
+        'width': width,
+        'height': height,
+        'overview_level': level,
+        'approximate': level is not None,
+        'pixels': pixels,
+        'valid_pixels': valid,
+        'nodata_ratio': (pixels - valid) / pixels if pixels else None,
+        'min': None, 'max': None, 'mean': None, 'std': None,
+        'percentiles': {f'p{p}': None for p in PERCENTILES},
+        'histogram': {'min': None, 'max': None, 'counts': []},
+    }
+    if not valid:
+        return stats
+
+    low, high = float(low), float(high)
+    mean = total / valid
+    if bincount is not None:
+        values = np.arange(int(low), int(high) + 1)
+        counts = bincount[values + offset]
+    else:
+        # Second pass for floats, now that the range is known
+        counts = np.zeros(_FINE_BINS, dtype=np.int64)
+        for block in _blocks(path, band, level):
+            counts += np.histogram(_valid_values(block), bins=_FINE_BINS, range=(low, high))[0]
+        values = np.linspace(low, high, _FINE_BINS, endpoint=False)
+
+    stats.update({
+        'min': low,
+        'max': high,
+        'mean': mean,
+        'std': float(np.sqrt(max(total_sq / valid - mean * mean, 0.0))),
+        'percentiles': _percentiles(values, counts),
+        'histogram': {
+            'min': low,
+            'max': high,
+            'counts': np.histogram(values, bins=HISTOGRAM_BINS, range=(low, high if high > low else low + 1),
+                                   weights=counts)[0].astype(int).tolist(),
+        },
+    })
+    return stats
@@ -0,0 +1,43 @@
+# Five classes of the RdYlGn_r ramp geoserver-rest used for coverage styles
+COLOR_RAMP = ['#1a9641', '#a6d96a', '#ffffbf', '#fdae61', '#d7191c']
+
+COVERAGE_SLD = """<?xml version="1.0" encoding="UTF-8"?>
+<StyledLayerDescriptor xmlns="http://www.opengis.net/sld" xmlns:gml="http://www.opengis.net/gml" version="1.0.0" xmlns:ogc="http://www.opengis.net/ogc" xmlns:sld="http://www.opengis.net/sld">
+  <UserLayer>
+    <sld:LayerFeatureConstraints>
+      <sld:FeatureTypeConstraint/>
+    </sld:LayerFeatureConstraints>
+    <sld:UserStyle>
+      <sld:Name>{name}</sld:Name>
+      <sld:FeatureTypeStyle>
+        <sld:Rule>
+          <sld:RasterSymbolizer>
+            <sld:ChannelSelection>
+              <sld:GrayChannel>
+                <sld:SourceChannelName>{band}</sld:SourceChannelName>
+              </sld:GrayChannel>
+            </sld:ChannelSelection>
+            <sld:ColorMap type="ramp">
+              {entries}
+            </sld:ColorMap>
+          </sld:RasterSymbolizer>
+        </sld:Rule>
+      </sld:FeatureTypeStyle>
+    </sld:UserStyle>
+  </UserLayer>
+</StyledLayerDescriptor>"""
+
+
+####################################################################################
+# Coverage styles from the stored raster statistics
+####################################################################################
+def coverage_sld(name, stats, colors=COLOR_RAMP):
+    """Color ramp from min to max like geo.create_coveragestyle, without reading the raster"""
+    low, high = stats['min'], stats['max']
+    if low is None:
+        low = high = 0
+    step = (high - low) / (len(colors) - 1)
+    entries = ''.join(
+        f'<sld:ColorMapEntry color="{color}" label="{round(low + step * i, 1)}" quantity="{round(low + step * i, 1)}"/>'
+        for i, color in enumerate(colors))
+    return COVERAGE_SLD.format(name=name, band=stats.get('band', 1), entries=entries)
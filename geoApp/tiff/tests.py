@@ -1,3 +1,94 @@
-from django.test import TestCase
+import os
+import tempfile
 
-# Create your tests here.
+from unittest import mock
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import jobs, models
+from .models import Tiff
+from .raster_stats import raster_statistics
+
+
+class RasterStatisticsTests(SimpleTestCase):
+    """Block-wise statistics agree with numpy over the valid pixels of the whole band"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, data, nodata=None):
+        import rasterio
+        import rasterio.transform
+
+        path = os.path.join(self.directory, f'{len(os.listdir(self.directory))}.tif')
+        with rasterio.open(path, 'w', driver='GTiff', width=data.shape[1], height=data.shape[0], count=1,
+                           dtype=data.dtype, nodata=nodata, crs='EPSG:4326', tiled=True, blockxsize=64,
+                           blockysize=64, transform=rasterio.transform.from_origin(73.0, 21.0, 0.001, 0.001)) as dst:
+            dst.write(data, 1)
+        return path
+
+    def assertMatches(self, stats, valid):
+        self.assertEqual(stats['valid_pixels'], valid.size)
+        self.assertAlmostEqual(stats['min'], float(valid.min()), places=5)
+        self.assertAlmostEqual(stats['max'], float(valid.max()), places=5)
+        self.assertAlmostEqual(stats['mean'], float(valid.mean(dtype=np.float64)), places=5)
+        self.assertAlmostEqual(stats['std'], float(valid.std(dtype=np.float64)), places=4)
+        self.assertEqual(sum(stats['histogram']['counts']), valid.size)
+
+    def test_integer_raster_with_nodata(self):
+        data = (np.arange(200 * 150) % 97).astype(np.uint8).reshape(200, 150)
+        data[:10] = 255
+        stats = raster_statistics(self.write(data, nodata=255))
+        self.assertMatches(stats, data[data != 255])
+        self.assertAlmostEqual(stats['nodata_ratio'], 10 / 200)
+        self.assertEqual(stats['percentiles']['p50'], float(np.percentile(data[data != 255], 50, method='lower')))
+
+    def test_float_raster_with_undeclared_nan(self):
+        data = np.linspace(-5, 40, 130 * 170, dtype=np.float32).reshape(130, 170)
+        data[5:20, 30:90] = np.nan
+        data[0, 0] = np.inf
+        stats = raster_statistics(self.write(data))
+        self.assertMatches(stats, data[np.isfinite(data)])
+        self.assertAlmostEqual(stats['nodata_ratio'], (15 * 60 + 1) / data.size)
+        for name, value in stats['percentiles'].items():
+            expected = np.percentile(data[np.isfinite(data)], int(name[1:]))
+            self.assertAlmostEqual(value, expected, delta=45 / 4096 * 2)
+
+    def test_band_without_valid_pixels(self):
+        stats = raster_statistics(self.write(np.full((64, 64), np.nan, dtype=np.float32)))
+        self.assertEqual((stats['valid_pixels'], stats['nodata_ratio'], stats['min']), (0, 1.0, None))
+        self.assertEqual(stats['histogram']['counts'], [])
+
+
+class OptimizedFileCleanupTests(TestCase):
+    """The COG of a replaced or deleted upload is removed from the media directory"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.tiff = Tiff.objects.create(name='cover', file='cover.tif')
+        self.tiff.optimized_file.save('cover_cog.tif', ContentFile(b'cog'), save=False)
+        Tiff.objects.filter(pk=self.tiff.pk).update(optimized_file=self.tiff.optimized_file.name)
+        self.storage = self.tiff.optimized_file.storage
+        self.cog = self.tiff.optimized_file.name
+        self.assertTrue(self.storage.exists(self.cog))
+
+    def test_replaced_upload(self):
+        self.storage.save('new_cog.tif', ContentFile(b'cog'))
+        with mock.patch.object(jobs, 'optimize', return_value={'optimized_file': 'new_cog.tif'}), \
+                mock.patch.object(jobs, 'compute_stats', return_value={}), mock.patch.object(jobs, 'publish'), \
+                mock.patch.object(jobs, 'close_old_connections'):
+            jobs.run_publish(self.tiff.pk)
+        self.assertFalse(self.storage.exists(self.cog))
+        self.assertTrue(self.storage.exists('new_cog.tif'))
+
+    def test_deleted_row(self):
+        with mock.patch.object(models, 'connection_manager'), mock.patch.object(models, 'tile_cache'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.tiff.delete()
+        self.assertFalse(self.storage.exists(self.cog))